@@ -0,0 +1,102 @@
+"""
+Compares cache lookups with a fresh Redis client per call and a GET followed by an EXPIRE (the
+old lib.cache path) to the pooled lib.cache.Cache client that refreshes the TTL with GETEX, and with the in-process
+tier (CACHE_LOCAL_MAX_ENTRIES) in front of it.
+Then compares looking up and storing a batch one message at a time with Cache.get_many and
+Cache.set_many, for each of --batch-sizes. Runs against --redis-url, or an in-process fakeredis
+TCP server when none is given (pip install fakeredis). The fake server answers a pipeline of more
+than one command only after a ~40 ms delayed ACK, so use --redis-url for the batch comparison.
+
+    python extra/cache_benchmark.py --lookups 2000 --hit-ratio 0.8 --batch-sizes 1,10,100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import redis
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def start_fake_server() -> str:
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    # Connection handlers would otherwise keep the process alive while the pool holds connections open.
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}/0"
+
+
+def lookup_per_call_client(redis_url: str, key: str, ttl: int):
+    client = redis.Redis.from_url(redis_url)
+    try:
+        cached_result = client.get(key)
+        if cached_result is not None:
+            client.expire(key, ttl)
+            return json.loads(cached_result)
+        return None
+    finally:
+        client.close()
+
+
+def run(label: str, lookup, keys) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28}: {len(keys) / elapsed:8.0f} lookups/s ({elapsed / len(keys) * 1e6:6.0f} us each)")
+    return elapsed
+
+
+def run_batches(batch_size: int, hashes) -> None:
+    from lib.cache import Cache
+    batches = [hashes[i:i + batch_size] for i in range(0, len(hashes) - batch_size + 1, batch_size)]
+    timings = {}
+    for label, lookup, store in (
+        ("per message", lambda batch: [Cache.get_cached_result(h) for h in batch], lambda batch: [Cache.set_cached_result(h, {"hash_value": h}) for h in batch]),
+        ("get_many/set_many", Cache.get_many, lambda batch: Cache.set_many({h: {"hash_value": h} for h in batch})),
+    ):
+        start = time.perf_counter()
+        for batch in batches:
+            lookup(batch)
+            store(batch)
+        timings[label] = (time.perf_counter() - start) / len(batches) * 1000
+    print(f"{'batch of ' + str(batch_size):>28}: {timings['per message']:7.2f} ms per message, {timings['get_many/set_many']:6.2f} ms with get_many/set_many")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--hit-ratio", type=float, default=0.8)
+    parser.add_argument("--batch-sizes", default="1,10,100")
+    args = parser.parse_args()
+
+    os.environ["REDIS_URL"] = args.redis_url or start_fake_server()
+    from lib.cache import Cache, LocalCache, CACHE_PREFIX, DEFAULT_TTL, CACHE_LOCAL_MAX_BYTES, CACHE_LOCAL_TTL_SECONDS
+
+    hashes = [f"benchmark-{i}" for i in range(args.lookups)]
+    for content_hash in hashes[:int(len(hashes) * args.hit_ratio)]:
+        Cache.set_cached_result(content_hash, {"hash_value": content_hash})
+    random.shuffle(hashes)
+
+    old = run("client per call, GET+EXPIRE", lambda h: lookup_per_call_client(os.environ["REDIS_URL"], CACHE_PREFIX + h, DEFAULT_TTL), hashes)
+    new = run("pooled client, GETEX", Cache.get_cached_result, hashes)
+    print(f"{'speedup':>28}: {old / new:8.1f}x")
+    Cache._local = LocalCache(len(hashes), CACHE_LOCAL_MAX_BYTES, CACHE_LOCAL_TTL_SECONDS)
+    run("local tier, cold", Cache.get_cached_result, hashes)
+    local = run("local tier, warm", Cache.get_cached_result, hashes)
+    Cache._local = None
+    print(f"{'warm local tier vs GETEX':>28}: {new / local:8.1f}x")
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        run_batches(batch_size, hashes)
+    Cache.get_client().delete(*[CACHE_PREFIX + h for h in hashes])
+
+
+if __name__ == "__main__":
+    main()
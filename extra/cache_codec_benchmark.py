@@ -0,0 +1,52 @@
+"""
+Compares the size of cached results, and the time to encode and decode them, as bare JSON (the
+old lib.cache format) and with lib.cache_codec.CacheCodec. No Redis is needed.
+
+    python extra/cache_codec_benchmark.py --dimensions 768 --repeats 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from lib.cache_codec import CacheCodec
+
+
+def measure(repeats: int, function, value) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(value)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def compare(label: str, result, repeats: int, vector: bool = False) -> None:
+    old = json.dumps(result).encode("utf-8")
+    new = CacheCodec.encode(result, vector)
+    print(f"{label}:")
+    for name, encode, decode, encoded in (
+        ("json", lambda r: json.dumps(r).encode("utf-8"), json.loads, old),
+        ("codec", lambda r: CacheCodec.encode(r, vector), CacheCodec.decode, new),
+    ):
+        print(f"  {name:>6}: {len(encoded):7d} bytes, encode {measure(repeats, encode, result):7.1f} us, decode {measure(repeats, decode, encoded):7.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    import numpy as np
+    vector = np.random.default_rng(0).standard_normal(args.dimensions).astype(np.float32).tolist()
+    compare(f"{args.dimensions}-dimension vector", vector, args.repeats, vector=True)
+    labels = [f"label {i}" for i in range(20)]
+    classification = {"classification": [{"id": i, "labels": random.sample(labels, 3), "text": "item %d" % i} for i in range(200)]}
+    compare("200-item classification", classification, args.repeats // 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares fetching media with a fresh urllib connection per item (the old download path) to
+the pooled lib.http_client.HTTPClient, against a local stand-in for a CDN host. The stand-in
+sleeps --handshake-ms on every new connection to stand in for the TCP+TLS handshake a real
+CDN costs.
+
+    python extra/media_fetch_benchmark.py --items 200 --size-kb 256 --handshake-ms 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from lib.http_client import HTTPClient
+
+
+def make_handler(body: bytes, handshake_seconds: float):
+    class MediaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        connections = 0
+
+        def setup(self):
+            super().setup()
+            type(self).connections += 1
+            time.sleep(handshake_seconds)
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return MediaHandler
+
+
+def fetch_urllib(url: str) -> int:
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(request) as response:
+        return len(response.read())
+
+
+def fetch_pooled(url: str) -> int:
+    with HTTPClient.stream(url, headers={'User-Agent': 'Mozilla/5.0'}) as response:
+        return sum(len(chunk) for chunk in response.iter_bytes())
+
+
+def run(name, fetch, urls, threads, handler):
+    handler.connections = 0
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total = sum(executor.map(fetch, urls))
+    elapsed = time.time() - start
+    print(
+        f"{name}: items={len(urls)} threads={threads} seconds={elapsed:.3f} "
+        f"items_per_second={len(urls) / elapsed:.1f} MB_per_second={total / elapsed / 1e6:.1f} "
+        f"connections={handler.connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    handler = make_handler(os.urandom(args.size_kb * 1024), args.handshake_ms / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://localhost:{server.server_address[1]}/media/{i}.jpg" for i in range(args.items)]
+    try:
+        run("urlopen", fetch_urllib, urls, args.threads, handler)
+        run("pooled", fetch_pooled, urls, args.threads, handler)
+    finally:
+        HTTPClient.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,59 +1,426 @@
+import os
 import redis
-import json
-from typing import Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from lib.cache_codec import CacheCodec
 from lib.helpers import get_environment_setting
-from lib.telemetry import OpenTelemetryExporter
+from lib.telemetry import OPEN_TELEMETRY_EXPORTER
 
-OPEN_TELEMETRY_EXPORTER = OpenTelemetryExporter(service_name="QueueWorkerService", local_debug=False)
 REDIS_URL = get_environment_setting("REDIS_URL")
 DEFAULT_TTL = int(get_environment_setting("CACHE_DEFAULT_TTL") or 24*60*60)
+REDIS_MAX_CONNECTIONS = int(get_environment_setting("REDIS_MAX_CONNECTIONS") or 50)
+# The in-process tier in front of Redis is off unless CACHE_LOCAL_MAX_ENTRIES is set.
+CACHE_LOCAL_MAX_ENTRIES = int(get_environment_setting("CACHE_LOCAL_MAX_ENTRIES") or 0)
+CACHE_LOCAL_MAX_BYTES = int(get_environment_setting("CACHE_LOCAL_MAX_BYTES") or 64*1024*1024)
+CACHE_LOCAL_TTL_SECONDS = float(get_environment_setting("CACHE_LOCAL_TTL_SECONDS") or 60)
 CACHE_PREFIX = "presto_media_cache:"
+# Sorted set per namespace of its keys, scored by last use, for namespaces with max_entries.
+CACHE_INDEX_PREFIX = "presto_media_cache_index:"
+# Also look up misses under presto_media_cache:<content hash>, the key used before namespaces,
+# and copy what is found into the namespace. Only needed until the old keys have expired, one
+# CACHE_DEFAULT_TTL after the deploy that introduced namespaces.
+CACHE_LEGACY_FALLBACK = (get_environment_setting("CACHE_LEGACY_FALLBACK") or "false").lower() == "true"
+
+class LocalCache:
+    """
+    In-process LRU of encoded cache entries, bounded by entry count and total bytes. Entries
+    expire after ttl_seconds, which bounds how long a result deleted or replaced in Redis by
+    another process can still be served from here. Entries are kept encoded, so callers never
+    share a mutable result.
+    """
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.size = 0
+        # Bumped by every delete, so a read-through fill that started before the delete is dropped.
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def set(self, key: str, data: bytes, generation: Optional[int] = None) -> None:
+        """
+        Store data under key, evicting least recently used entries to stay within bounds. With
+        generation, the entry is only stored if nothing was deleted since generation was read.
+        """
+        evicted = 0
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            if len(data) > self.max_bytes:
+                return
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, data)
+            self.size += len(data)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_data) = self.entries.popitem(last=False)
+                self.size -= len(evicted_data)
+                evicted += 1
+        if evicted:
+            OPEN_TELEMETRY_EXPORTER.log_cache_evictions("local", evicted)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.generation += 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
 class Cache:
+    _client: Optional[redis.Redis] = None
+    _client_lock = threading.Lock()
+    _local: Optional[LocalCache] = None
+    # Cleared the first time the server rejects GETEX (Redis < 6.2).
+    _getex_supported = True
+
     @staticmethod
     def get_client() -> redis.Redis:
         """
-        Get a Redis client instance using the provided REDIS_URL.
+        Get the process-wide Redis client for REDIS_URL. Its connection pool, of up to
+        REDIS_MAX_CONNECTIONS connections, is shared by every get and set; redis-py resets it
+        in a forked child, so each worker process gets its own connections.
 
         Returns:
             redis.Redis: Redis client instance.
         """
-        return redis.Redis.from_url(REDIS_URL)
+        if Cache._client is None:
+            with Cache._client_lock:
+                if Cache._client is None:
+                    Cache._client = redis.Redis.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+        return Cache._client
+
+    @staticmethod
+    def reset_after_fork() -> None:
+        """
+        Give a forked child a fresh lock and an empty in-process tier, as another thread of the
+        parent may have held their locks at fork time.
+        """
+        Cache._client_lock = threading.Lock()
+        Cache._local = None
+
+    @staticmethod
+    def get_local() -> Optional[LocalCache]:
+        """
+        Get the process-wide in-process tier, or None when CACHE_LOCAL_MAX_ENTRIES is 0.
+        """
+        if Cache._local is None and CACHE_LOCAL_MAX_ENTRIES > 0:
+            with Cache._client_lock:
+                if Cache._local is None:
+                    Cache._local = LocalCache(CACHE_LOCAL_MAX_ENTRIES, CACHE_LOCAL_MAX_BYTES, CACHE_LOCAL_TTL_SECONDS)
+        return Cache._local
+
+    @staticmethod
+    def get_key(content_hash: str, namespace: str = "") -> str:
+        """
+        Redis key for content_hash in namespace, e.g. presto_media_cache:video__Model:1:<hash>.
+        """
+        return f"{CACHE_PREFIX}{namespace}:{content_hash}" if namespace else CACHE_PREFIX+content_hash
+
+    @staticmethod
+    def get_index_key(namespace: str) -> str:
+        return CACHE_INDEX_PREFIX+namespace
+
+    @staticmethod
+    def get_and_touch(client: redis.Redis, key: str, ttl: int) -> Optional[bytes]:
+        """
+        Read key and reset its TTL in one round trip: GETEX, or a GET+EXPIRE pipeline on
+        servers that do not have GETEX.
+        """
+        if Cache._getex_supported:
+            try:
+                return client.getex(key, ex=ttl)
+            except redis.ResponseError as e:
+                if "unknown command" not in str(e).lower():
+                    raise
+                Cache._getex_supported = False
+        pipeline = client.pipeline(transaction=False)
+        pipeline.get(key)
+        pipeline.expire(key, ttl)
+        cached_result, _ = pipeline.execute()
+        return cached_result
+
+    @staticmethod
+    def get_many_and_touch(client: redis.Redis, keys: List[str], ttl: int, index: Optional[str] = None) -> List[Optional[bytes]]:
+        """
+        Read keys and reset their TTLs in one round trip: pipelined GETEX, or pipelined
+        GET+EXPIRE on servers that do not have GETEX. With index, the keys' last-use scores
+        in that sorted set are refreshed in the same round trip.
+        """
+        if Cache._getex_supported:
+            pipeline = client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.getex(key, ex=ttl)
+            Cache.touch_index(pipeline, index, keys, ttl, only_existing=True)
+            try:
+                return pipeline.execute()[:len(keys)]
+            except redis.ResponseError as e:
+                if "unknown command" not in str(e).lower():
+                    raise
+                Cache._getex_supported = False
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.get(key)
+            pipeline.expire(key, ttl)
+        Cache.touch_index(pipeline, index, keys, ttl, only_existing=True)
+        return pipeline.execute()[:2*len(keys):2]
+
+    @staticmethod
+    def touch_index(pipeline: redis.client.Pipeline, index: Optional[str], keys: List[str], ttl: int, only_existing: bool = False) -> None:
+        """
+        Queue commands on pipeline that score keys in index by the current time, drop members
+        older than ttl (their entries have expired) and keep index itself for ttl.
+        """
+        if not index:
+            return
+        now = time.time()
+        pipeline.zadd(index, {key: now for key in keys}, xx=only_existing)
+        pipeline.zremrangebyscore(index, "-inf", now - ttl)
+        pipeline.expire(index, ttl)
+
+    @staticmethod
+    def evict(client: redis.Redis, namespace: str, count: int) -> None:
+        """
+        Delete the count least recently used entries of namespace.
+        """
+        evicted = [member.decode("utf-8") if isinstance(member, bytes) else member for member, _ in client.zpopmin(Cache.get_index_key(namespace), count)]
+        if not evicted:
+            return
+        client.delete(*evicted)
+        local = Cache.get_local()
+        if local:
+            for key in evicted:
+                local.delete(key)
+        OPEN_TELEMETRY_EXPORTER.log_cache_evictions("redis", len(evicted), namespace)
 
     @staticmethod
-    def get_cached_result(content_hash: str, reset_ttl: bool = True, ttl: int = DEFAULT_TTL) -> Optional[Any]:
+    def get_cached_result(content_hash: str, reset_ttl: bool = True, ttl: int = DEFAULT_TTL, namespace: str = "", max_entries: Optional[int] = None) -> Optional[Any]:
         """
-        Retrieve the cached result for the given content hash. By default, reset the TTL to 24 hours.
+        Retrieve the cached result for the given content hash, from the in-process tier if it
+        is enabled and holds it, else from Redis. By default, reset the Redis TTL to 24 hours;
+        hits in the in-process tier leave it alone.
 
         Args:
             content_hash (str): The key for the cached content.
             reset_ttl (bool): Whether to reset the TTL upon access. Default is True.
             ttl (int): Time-to-live for the cache in seconds. Default is 86400 seconds (24 hours).
+            namespace (str): Namespace of the key, usually "<model name>:<model cache version>".
+            max_entries (Optional[int]): Entry limit of the namespace, if it has one.
 
         Returns:
             Optional[Any]: The cached result, or None if the key does not exist.
         """
+        if max_entries or (CACHE_LEGACY_FALLBACK and namespace):
+            # Capped namespaces also refresh the key's last use, which get_many does in the same
+            # round trip; get_many also falls back to the legacy key.
+            return Cache.get_many([content_hash], reset_ttl, ttl, namespace, max_entries)[0]
         if content_hash:
-            client = Cache.get_client()
-            cached_result = client.get(CACHE_PREFIX+content_hash)
-            if cached_result is not None:
+            key = Cache.get_key(content_hash, namespace)
+            local = Cache.get_local()
+            cached_result = local.get(key) if local else None
+            if local:
+                OPEN_TELEMETRY_EXPORTER.log_cache_lookups("local", int(cached_result is not None), int(cached_result is None), namespace)
+            if cached_result is None:
+                generation = local.generation if local else None
+                client = Cache.get_client()
                 if reset_ttl:
-                    client.expire(CACHE_PREFIX+content_hash, ttl)
-                response = json.loads(cached_result)
+                    cached_result = Cache.get_and_touch(client, key, ttl)
+                else:
+                    cached_result = client.get(key)
+                OPEN_TELEMETRY_EXPORTER.log_cache_lookups("redis", int(cached_result is not None), int(cached_result is None), namespace)
+                if local and cached_result is not None:
+                    local.set(key, cached_result, generation)
+            response = CacheCodec.decode(cached_result) if cached_result is not None else None
+            if response is not None:
                 OPEN_TELEMETRY_EXPORTER.log_execution_status("cache_hit_response", "cache_hit_response")
                 return response
         return None
 
     @staticmethod
-    def set_cached_result(content_hash: str, result: Any, ttl: int = DEFAULT_TTL) -> None:
+    def set_cached_result(content_hash: str, result: Any, ttl: int = DEFAULT_TTL, namespace: str = "", max_entries: Optional[int] = None, vector: bool = False) -> None:
         """
-        Store the result in the cache with the given content hash and TTL.
+        Store the result in the cache with the given content hash and TTL, and in the
+        in-process tier if it is enabled.
 
         Args:
             content_hash (str): The key for the cached content.
             result (Any): The result to cache.
             ttl (int): Time-to-live for the cache in seconds. Default is 86400 seconds (24 hours).
+            namespace (str): Namespace of the key, usually "<model name>:<model cache version>".
+            max_entries (Optional[int]): Entry limit of the namespace, if it has one.
+            vector (bool): Whether result is an embedding vector, to be stored as CACHE_VECTOR_DTYPE.
+        """
+        if max_entries:
+            Cache.set_many({content_hash: result}, ttl, namespace, max_entries, vector)
+        elif content_hash:
+            key, data = Cache.get_key(content_hash, namespace), CacheCodec.encode(result, vector)
+            Cache.get_client().setex(key, ttl, data)
+            local = Cache.get_local()
+            if local:
+                local.set(key, data)
+            OPEN_TELEMETRY_EXPORTER.log_execution_status("cache_miss_response", "cache_miss_response")
+
+    @staticmethod
+    def get_many(content_hashes: List[Optional[str]], reset_ttl: bool = True, ttl: int = DEFAULT_TTL, namespace: str = "", max_entries: Optional[int] = None) -> List[Optional[Any]]:
+        """
+        Retrieve the cached results for a batch of content hashes. Hashes the in-process tier
+        holds are served from it; the rest are read from Redis in one round trip: MGET, or
+        pipelined GETEX when resetting TTLs.
+
+        Args:
+            content_hashes (List[Optional[str]]): The keys for the cached contents. Empty keys are not looked up.
+            reset_ttl (bool): Whether to reset the TTL upon access. Default is True.
+            ttl (int): Time-to-live for the cache in seconds. Default is 86400 seconds (24 hours).
+            namespace (str): Namespace of the keys, usually "<model name>:<model cache version>".
+            max_entries (Optional[int]): Entry limit of the namespace, if it has one. Hits then also
+                count as uses for its least-recently-used eviction.
+
+        Returns:
+            List[Optional[Any]]: The cached result for each content hash, in order, or None where there is none.
+        """
+        results = [None] * len(content_hashes)
+        positions = [idx for idx, content_hash in enumerate(content_hashes) if content_hash]
+        if not positions:
+            return results
+        keys = [Cache.get_key(content_hashes[idx], namespace) for idx in positions]
+        cached_results = [None] * len(keys)
+        local = Cache.get_local()
+        if local:
+            cached_results = [local.get(key) for key in keys]
+            hits = sum(cached_result is not None for cached_result in cached_results)
+            OPEN_TELEMETRY_EXPORTER.log_cache_lookups("local", hits, len(keys) - hits, namespace)
+        missing = [i for i, cached_result in enumerate(cached_results) if cached_result is None]
+        if missing:
+            generation = local.generation if local else None
+            client = Cache.get_client()
+            missing_keys = [keys[i] for i in missing]
+            if reset_ttl:
+                index = Cache.get_index_key(namespace) if max_entries else None
+                fetched = Cache.get_many_and_touch(client, missing_keys, ttl, index)
+            else:
+                fetched = client.mget(missing_keys)
+            hits = sum(cached_result is not None for cached_result in fetched)
+            OPEN_TELEMETRY_EXPORTER.log_cache_lookups("redis", hits, len(missing) - hits, namespace)
+            for i, cached_result in zip(missing, fetched):
+                cached_results[i] = cached_result
+                if local and cached_result is not None:
+                    local.set(keys[i], cached_result, generation)
+            unfound = [i for i in missing if cached_results[i] is None]
+            if CACHE_LEGACY_FALLBACK and namespace and unfound:
+                legacy = Cache.get_legacy(client, [content_hashes[positions[i]] for i in unfound], ttl, namespace, max_entries)
+                for i, cached_result in zip(unfound, legacy):
+                    cached_results[i] = cached_result
+        for idx, cached_result in zip(positions, cached_results):
+            if cached_result is not None:
+                results[idx] = CacheCodec.decode(cached_result)
+            if results[idx] is not None:
+                OPEN_TELEMETRY_EXPORTER.log_execution_status("cache_hit_response", "cache_hit_response")
+        return results
+
+    @staticmethod
+    def set_many(results: Dict[str, Any], ttl: int = DEFAULT_TTL, namespace: str = "", max_entries: Optional[int] = None, vector: bool = False) -> None:
+        """
+        Store a batch of results, keyed by content hash, with pipelined SETEX in one round trip,
+        and in the in-process tier if it is enabled. If this takes the namespace over
+        max_entries, its least recently used entries are evicted with a second round trip.
+
+        Args:
+            results (Dict[str, Any]): The results to cache by content hash. Empty keys are skipped.
+            ttl (int): Time-to-live for the cache in seconds. Default is 86400 seconds (24 hours).
+            namespace (str): Namespace of the keys, usually "<model name>:<model cache version>".
+            max_entries (Optional[int]): Entry limit of the namespace, if it has one.
+            vector (bool): Whether the results are embedding vectors, to be stored as CACHE_VECTOR_DTYPE.
+        """
+        results = {content_hash: result for content_hash, result in results.items() if content_hash}
+        if not results:
+            return
+        encoded = {Cache.get_key(content_hash, namespace): CacheCodec.encode(result, vector) for content_hash, result in results.items()}
+        Cache.store(Cache.get_client(), encoded, ttl, namespace, max_entries)
+        for _ in results:
+            OPEN_TELEMETRY_EXPORTER.log_execution_status("cache_miss_response", "cache_miss_response")
+
+    @staticmethod
+    def store(client: redis.Redis, encoded: Dict[str, bytes], ttl: int, namespace: str = "", max_entries: Optional[int] = None) -> None:
+        """
+        Write encoded entries, by key, to Redis and the in-process tier, evicting the least
+        recently used entries of namespace if this takes it over max_entries.
+        """
+        pipeline = client.pipeline(transaction=False)
+        for key, data in encoded.items():
+            pipeline.setex(key, ttl, data)
+        if max_entries:
+            index = Cache.get_index_key(namespace)
+            Cache.touch_index(pipeline, index, list(encoded), ttl)
+            pipeline.zcard(index)
+        replies = pipeline.execute()
+        if max_entries and replies[-1] > max_entries:
+            Cache.evict(client, namespace, replies[-1] - max_entries)
+        local = Cache.get_local()
+        if local:
+            for key, data in encoded.items():
+                local.set(key, data)
+
+    @staticmethod
+    def get_legacy(client: redis.Redis, content_hashes: List[str], ttl: int, namespace: str, max_entries: Optional[int] = None) -> List[Optional[bytes]]:
+        """
+        Read content_hashes under their keys from before namespaces, with MGET so their TTLs run
+        out as before, and copy the entries found into namespace.
+        """
+        legacy = client.mget([CACHE_PREFIX+content_hash for content_hash in content_hashes])
+        hits = sum(cached_result is not None for cached_result in legacy)
+        OPEN_TELEMETRY_EXPORTER.log_cache_lookups("legacy", hits, len(legacy) - hits, namespace)
+        if hits:
+            Cache.store(client, {
+                Cache.get_key(content_hash, namespace): cached_result
+                for content_hash, cached_result in zip(content_hashes, legacy) if cached_result is not None
+            }, ttl, namespace, max_entries)
+        return legacy
+
+    @staticmethod
+    def invalidate(content_hash: str, namespace: str = "") -> None:
+        """
+        Delete the cached result for the given content hash from Redis and from this process's
+        in-process tier. Other processes may serve it from their own tier for up to
+        CACHE_LOCAL_TTL_SECONDS.
+
+        Args:
+            content_hash (str): The key for the cached content.
+            namespace (str): Namespace of the key, usually "<model name>:<model cache version>".
         """
         if content_hash:
+            key = Cache.get_key(content_hash, namespace)
+            local = Cache.get_local()
+            # Deleting on both sides of the Redis delete bumps the generation, so a concurrent
+            # read-through that fetched the old value cannot put it back afterwards.
+            if local:
+                local.delete(key)
             client = Cache.get_client()
-            client.setex(CACHE_PREFIX+content_hash, ttl, json.dumps(result))
-            OPEN_TELEMETRY_EXPORTER.log_execution_status("cache_miss_response", "cache_hit_response")
+            client.delete(key)
+            if namespace:
+                client.zrem(Cache.get_index_key(namespace), key)
+            if local:
+                local.delete(key)
+
+os.register_at_fork(after_in_child=Cache.reset_after_fork)
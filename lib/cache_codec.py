@@ -0,0 +1,100 @@
+import importlib.util
+import json
+import zlib
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from lib.helpers import get_environment_setting
+from lib.logger import logger
+
+# "float32", "float16" (half the size, about three significant digits) or "json" to keep
+# writing vectors the way readers from before this codec expect.
+CACHE_VECTOR_DTYPE = get_environment_setting("CACHE_VECTOR_DTYPE") or "float32"
+# JSON payloads at least this large are compressed; 0 turns compression off.
+CACHE_COMPRESS_MIN_BYTES = int(get_environment_setting("CACHE_COMPRESS_MIN_BYTES") or 4096)
+# zstandard is optional and not in requirements.txt, so deployments compress with zlib.
+# Installing it switches new entries to zstd, which processes without it read as misses.
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+
+# Encoded entries start with MAGIC, the format version, a codec id and a compression id.
+# JSON never starts with a NUL byte, so bare JSON entries (written before this header existed,
+# and still written for small payloads) are told apart by their first byte.
+MAGIC = b"\x00"
+FORMAT_VERSION = 1
+CODEC_JSON, CODEC_FLOAT32, CODEC_FLOAT16 = range(3)
+COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD = range(3)
+VECTOR_CODECS = {"float32": (CODEC_FLOAT32, "<f4"), "float16": (CODEC_FLOAT16, "<f2")}
+VECTOR_DTYPES = {codec: dtype for codec, dtype in VECTOR_CODECS.values()}
+
+class CacheCodec:
+    """
+    Turns cached results into the bytes stored in Redis and back. Embedding vectors, from
+    models that opt in with Model.CACHE_VECTORS, are stored as raw little-endian floats;
+    anything else is JSON, compressed with zlib (or zstd, with the zstandard package) once
+    it reaches CACHE_COMPRESS_MIN_BYTES.
+    """
+    @staticmethod
+    def header(codec: int, compression: int = COMPRESSION_NONE) -> bytes:
+        return MAGIC + bytes((FORMAT_VERSION, codec, compression))
+
+    @staticmethod
+    def is_vector(result: Any) -> bool:
+        return isinstance(result, list) and len(result) > 0 and all(type(value) is float for value in result)
+
+    @staticmethod
+    def compress(payload: bytes) -> Tuple[int, bytes]:
+        if ZSTD_AVAILABLE:
+            import zstandard
+            return COMPRESSION_ZSTD, zstandard.ZstdCompressor(level=3).compress(payload)
+        return COMPRESSION_ZLIB, zlib.compress(payload, 6)
+
+    @staticmethod
+    def decompress(compression: int, payload: bytes) -> bytes:
+        if compression == COMPRESSION_NONE:
+            return payload
+        if compression == COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if compression == COMPRESSION_ZSTD and ZSTD_AVAILABLE:
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(payload)
+        raise ValueError(f"Unsupported compression {compression}")
+
+    @staticmethod
+    def encode(result: Any, vector: bool = False) -> bytes:
+        """
+        Encode result for storage in the cache. Only when vector is set is a flat list of floats
+        stored as CACHE_VECTOR_DTYPE, which drops precision beyond that of the dtype.
+        """
+        if vector and CACHE_VECTOR_DTYPE in VECTOR_CODECS and CacheCodec.is_vector(result):
+            codec, dtype = VECTOR_CODECS[CACHE_VECTOR_DTYPE]
+            return CacheCodec.header(codec) + np.asarray(result, dtype=dtype).tobytes()
+        payload = json.dumps(result).encode("utf-8")
+        if CACHE_COMPRESS_MIN_BYTES and len(payload) >= CACHE_COMPRESS_MIN_BYTES:
+            compression, compressed = CacheCodec.compress(payload)
+            if len(compressed) < len(payload):
+                return CacheCodec.header(CODEC_JSON, compression) + compressed
+        return payload
+
+    @staticmethod
+    def decode(data: Any) -> Optional[Any]:
+        """
+        Decode a cached entry written by encode, or by the bare JSON format it replaced.
+        Entries this process cannot read (a newer format version, or zstd without the
+        zstandard package) are logged and treated as missing.
+        """
+        if not isinstance(data, bytes) or data[:1] != MAGIC:
+            return json.loads(data)
+        try:
+            version, codec, compression = data[1], data[2], data[3]
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported format version {version}")
+            payload = CacheCodec.decompress(compression, data[4:])
+            if codec in VECTOR_DTYPES:
+                return np.frombuffer(payload, dtype=VECTOR_DTYPES[codec]).tolist()
+            if codec == CODEC_JSON:
+                return json.loads(payload)
+            raise ValueError(f"Unsupported codec {codec}")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry: {e}")
+            return None
@@ -0,0 +1,223 @@
+import contextlib
+import importlib.util
+import os
+import socket
+import ssl
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+from httpcore.backends.sync import SyncBackend, SyncStream
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_DNS_CACHE_SECONDS = float(os.getenv("HTTP_DNS_CACHE_SECONDS", "300"))
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+class CachingDNSBackend(SyncBackend):
+    """
+    httpcore network backend that remembers getaddrinfo results for HTTP_DNS_CACHE_SECONDS,
+    so new connections to a host we already know skip the resolver. TLS still verifies against
+    the hostname, since httpcore passes it to start_tls separately. A failed connect drops the
+    cached addresses so the next attempt resolves again.
+    """
+    def __init__(self, ttl: float = HTTP_DNS_CACHE_SECONDS):
+        self.ttl = ttl
+        self.addresses: Dict[Tuple[str, int], Tuple[float, List[tuple]]] = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> List[tuple]:
+        key = (host, port)
+        with self.lock:
+            cached = self.addresses.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        addresses = [
+            (family, sockaddr)
+            for family, _, _, _, sockaddr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        ]
+        with self.lock:
+            self.addresses[key] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None) -> SyncStream:
+        try:
+            addresses = self.resolve(host, port)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e)) from e
+        error: Exception = httpcore.ConnectError(f"No addresses for {host}")
+        for family, sockaddr in addresses:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(timeout)
+                if local_address is not None:
+                    sock.bind((local_address, 0))
+                sock.connect(sockaddr)
+                return SyncStream(sock)
+            except socket.timeout as e:
+                sock.close()
+                error = httpcore.ConnectTimeout(str(e))
+            except OSError as e:
+                sock.close()
+                error = httpcore.ConnectError(str(e))
+        with self.lock:
+            self.addresses.pop((host, port), None)
+        raise error
+
+@contextlib.contextmanager
+def map_httpcore_errors(request: Optional[httpx.Request] = None) -> Iterator[None]:
+    """
+    Re-raise httpcore errors as the httpx errors of the same name, as httpx's own transport does.
+    """
+    try:
+        yield
+    except (httpcore.TimeoutException, httpcore.NetworkError, httpcore.ProtocolError, httpcore.ProxyError, httpcore.UnsupportedProtocol) as e:
+        error_type = next(getattr(httpx, cls.__name__) for cls in type(e).__mro__ if hasattr(httpx, cls.__name__))
+        raise error_type(str(e), request=request) from e
+
+class PooledResponseStream(httpx.SyncByteStream):
+    def __init__(self, response: httpcore.Response, request: httpx.Request):
+        self.response = response
+        self.request = request
+
+    def __iter__(self) -> Iterator[bytes]:
+        with map_httpcore_errors(self.request):
+            for part in self.response.iter_stream():
+                yield part
+
+    def close(self) -> None:
+        self.response.close()
+
+class PooledTransport(httpx.BaseTransport):
+    """
+    httpx transport over an httpcore connection pool that uses CachingDNSBackend. httpx 0.23
+    does not take a network backend, so the pool is built here and requests and responses are
+    passed between the two with public httpx and httpcore types only.
+    """
+    def __init__(
+        self,
+        limits: httpx.Limits,
+        http2: bool = False,
+        verify: Union[str, bool, ssl.SSLContext] = True,
+        cert: Optional[Union[str, Tuple[str, ...]]] = None,
+        trust_env: bool = True,
+        retries: int = 0,
+        local_address: Optional[str] = None,
+    ):
+        self.network_backend = CachingDNSBackend()
+        self.pool = httpcore.ConnectionPool(
+            ssl_context=httpx.create_ssl_context(verify=verify, cert=cert, trust_env=trust_env, http2=http2),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            retries=retries,
+            local_address=local_address,
+            network_backend=self.network_backend,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with map_httpcore_errors(request):
+            response = self.pool.handle_request(core_request)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=PooledResponseStream(response, request),
+            extensions=response.extensions,
+        )
+
+    def close(self) -> None:
+        self.pool.close()
+
+class HTTPClient:
+    """
+    Process-wide pooled HTTP client for media fetches. Connections are kept alive between
+    messages, so items from the same CDN host reuse a TCP+TLS session instead of handshaking
+    per item. HTTP/2 is used when the h2 package is installed. Each host gets at most
+    HTTP_MAX_CONNECTIONS_PER_HOST concurrent requests. A forked child builds its own client
+    rather than sharing the parent's sockets.
+    """
+    _client: Optional[httpx.Client] = None
+    _pid: Optional[int] = None
+    _host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_client() -> httpx.Client:
+        """
+        Return the process's client, creating it on first use.
+        """
+        with HTTPClient._lock:
+            if HTTPClient._client is None or HTTPClient._pid != os.getpid():
+                limits = httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+                )
+                HTTPClient._client = httpx.Client(
+                    transport=PooledTransport(limits, http2=HTTP2_AVAILABLE),
+                    follow_redirects=True
+                )
+                HTTPClient._pid = os.getpid()
+                HTTPClient._host_semaphores = {}
+            return HTTPClient._client
+
+    @staticmethod
+    def get_host_semaphore(url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with HTTPClient._lock:
+            if host not in HTTPClient._host_semaphores:
+                HTTPClient._host_semaphores[host] = threading.BoundedSemaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+            return HTTPClient._host_semaphores[host]
+
+    @staticmethod
+    @contextlib.contextmanager
+    def stream(url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> Iterator[httpx.Response]:
+        """
+        GET url and yield the streaming response, holding one of the host's connection slots
+        until the body has been read or abandoned. Raises httpx.HTTPStatusError on 4xx/5xx.
+        """
+        client = HTTPClient.get_client()
+        with HTTPClient.get_host_semaphore(url):
+            with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                response.raise_for_status()
+                yield response
+
+    @staticmethod
+    def close() -> None:
+        with HTTPClient._lock:
+            if HTTPClient._client is not None and HTTPClient._pid == os.getpid():
+                HTTPClient._client.close()
+            HTTPClient._client = None
+            HTTPClient._pid = None
+            HTTPClient._host_semaphores = {}
+
+    @staticmethod
+    def reset_after_fork() -> None:
+        """
+        Give a forked child a fresh lock and no client, as another thread of the parent may
+        have held them at fork time.
+        """
+        HTTPClient._lock = threading.Lock()
+        HTTPClient._client = None
+        HTTPClient._pid = None
+        HTTPClient._host_semaphores = {}
+
+os.register_at_fork(after_in_child=HTTPClient.reset_after_fork)
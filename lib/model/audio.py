@@ -8,6 +8,11 @@ from lib.model.model import Model
 from lib import schemas
 
 class Model(Model):
+    MEDIA_DOWNLOAD = "tempfile"
+    RESPOND_EXECUTOR = "process"
+    # Chromaprint fingerprints are expensive to recompute, so they are kept for a week.
+    CACHE_TTL = 7*24*60*60
+
     def audio_hasher(self, filename: str) -> List[int]:
         """
         Given a filename corresponding to an audio clip, generate the acoustid fingerprint.
@@ -4,9 +4,11 @@ from sentence_transformers import SentenceTransformer
 from lib.logger import logger
 from lib.model.model import Model
 from lib import schemas
-from lib.cache import Cache
 
 class GenericTransformerModel(Model):
+    # SentenceTransformer embeddings are float32, so caching them as float32 loses nothing.
+    CACHE_VECTORS = True
+
     def __init__(self, model_name: str):
         """
         Load specified model name from subclass constant as HuggingFace transformer.
@@ -49,8 +51,7 @@ class GenericTransformerModel(Model):
         docs_to_process = []
         texts_to_vectorize = []
 
-        for doc in docs:
-            cached_result = Cache.get_cached_result(doc.body.content_hash)
+        for doc, cached_result in zip(docs, self.get_cached_results(docs)):
             if cached_result:
                 doc.body.result = cached_result
             else:
@@ -67,7 +68,7 @@ class GenericTransformerModel(Model):
             vectorized = self.vectorize(texts_to_vectorize)
             for doc, vector in zip(docs_to_process, vectorized):
                 doc.body.result = vector
-                Cache.set_cached_result(doc.body.content_hash, vector)
+            self.set_cached_results(docs_to_process)
         except Exception as e:
             self.handle_fingerprinting_error(e, 500, {"texts_to_vectorize": texts_to_vectorize, "docs_to_process": [e.body.model_dump() for e in docs_to_process]})
 
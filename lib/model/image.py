@@ -1,41 +1,147 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 import io
-import urllib.request
 
 from lib.model.model import Model
 
-from pdqhashing.hasher.pdq_hasher import PDQHasher
+from pdqhashing.hasher.pdq_numpy_hasher import PDQNumpyHasher
 from lib import schemas
+from lib.helpers import get_environment_setting
 
 class Model(Model):
+    BATCH_SIZE = 10
+    MIN_BATCH_SIZE = 1
+    MEDIA_DOWNLOAD = "buffer"
+    # Hashing is CPU-bound, so with RESPOND_WORKERS > 1 messages are spread over processes.
+    RESPOND_EXECUTOR = "process"
+    # Keys of the dihedral_hash_values result, mapped to HashesAndQuality attributes.
+    DIHEDRAL_TRANSFORMS = {
+        "original": "hash",
+        "rotate90": "hashRotate90",
+        "rotate180": "hashRotate180",
+        "rotate270": "hashRotate270",
+        "flip_x": "hashFlipX",
+        "flip_y": "hashFlipY",
+        "flip_plus1": "hashFlipPlus1",
+        "flip_minus1": "hashFlipMinus1",
+    }
+
+    def __init__(self):
+        """
+        Keep a single hasher so its scratch buffers are reused across messages. PDQ_DRAFT_MODE
+        ("RGB" or "L") enables reduced-scale JPEG decoding, which is faster on large uploads but
+        can move hashes by a few bits; unset, hashes are exact.
+        """
+        super().__init__()
+        self.pdq_hasher = PDQNumpyHasher(get_environment_setting("PDQ_DRAFT_MODE") or None)
+
     def compute_pdq(self, iobytes: io.BytesIO) -> str:
         """Compute perceptual hash using ImageHash library
         :param im: Numpy.ndarray
         :returns: Imagehash.ImageHash
         """
-        pdq_hasher = PDQHasher()
-        hash_and_qual = pdq_hasher.fromBufferedImage(iobytes)
+        hash_and_qual = self.pdq_hasher.fromBufferedImage(iobytes)
         return hash_and_qual.getHash().dumpBitsFlat()
 
+    def compute_pdqs(self, iobytes_list: List[io.BytesIO]) -> List[str]:
+        """
+        Compute perceptual hashes for several images in a single vectorized pass.
+        """
+        return [hash_and_qual.getHash().dumpBitsFlat() for hash_and_qual in self.pdq_hasher.fromBufferedImages(iobytes_list)]
+
+    def compute_pdq_dihedral(self, iobytes: io.BytesIO) -> Dict[str, Any]:
+        """
+        Compute the PDQ hashes of all eight rotations and flips of an image, plus its quality,
+        from a single decode and a single DCT.
+        """
+        hashes_and_quality = self.pdq_hasher.dihedralFromBytes(iobytes)
+        return {
+            "hash_value": hashes_and_quality.hash.dumpBitsFlat(),
+            "quality": hashes_and_quality.quality,
+            "dihedral_hash_values": {
+                name: getattr(hashes_and_quality, attribute).dumpBitsFlat()
+                for name, attribute in self.DIHEDRAL_TRANSFORMS.items()
+            },
+        }
+
+    @staticmethod
+    def is_dihedral(image: schemas.Message) -> bool:
+        """
+        Whether the message opts in to dihedral hashes via parameters.dihedral.
+        """
+        return bool((image.body.parameters or {}).get("dihedral"))
+
+    def get_cache_key(self, message: schemas.Message) -> Optional[str]:
+        """
+        Dihedral results are cached separately from plain ones for the same content.
+        """
+        content_hash = super().get_cache_key(message)
+        if content_hash and self.is_dihedral(message):
+            return f"{content_hash}:dihedral"
+        return content_hash
+
     def get_iobytes_for_image(self, image: schemas.Message) -> io.BytesIO:
         """
         Read file as bytes after requesting based on URL.
         """
-        return io.BytesIO(
-            urllib.request.urlopen(
-                urllib.request.Request(
-                    image.body.url,
-                    headers={'User-Agent': 'Mozilla/5.0'}
-                )
-            ).read()
-        )
+        return self.get_buffer_for_url(image.body.url)
 
     def process(self, image: schemas.Message) -> schemas.GenericItem:
         """
         Generic function for returning the actual response.
         """
+        if self.is_dihedral(image):
+            return self.compute_pdq_dihedral(self.get_iobytes_for_image(image))
         return {"hash_value": self.compute_pdq(self.get_iobytes_for_image(image))}
 
+    def respond(self, messages: Union[List[schemas.Message], schemas.Message]) -> List[schemas.Message]:
+        """
+        With RESPOND_WORKERS > 1, messages go through the base per-message path on the respond
+        executor. Otherwise each uncached image is downloaded and decoded on its own, so a bad
+        URL or image only fails its own message, and the decoded plain images are then hashed
+        together in one vectorized pass; dihedral requests are hashed one by one.
+        """
+        if not isinstance(messages, list):
+            messages = [messages]
+        if self.get_respond_executor() is not None:
+            return super().respond(messages)
+        uncached = []
+        for message, result in zip(messages, self.get_cached_results(messages)):
+            if result:
+                message.body.result = result
+            else:
+                uncached.append(message)
+        plain, images = [], []
+        for message in uncached:
+            if self.is_dihedral(message):
+                message.body.result = self.get_uncached_response(message)
+                continue
+            try:
+                images.append(self.pdq_hasher.readImage(self.get_iobytes_for_image(message), self.pdq_hasher.draftMode))
+                plain.append(message)
+            except Exception as e:
+                message.body.result = self.get_error_response(message, e)
+        for message, result in zip(plain, self.hash_images(plain, images)):
+            message.body.result = result
+        self.set_cached_results(uncached)
+        return messages
+
+    def hash_images(self, messages: List[schemas.Message], images: List[Any]) -> List[Any]:
+        """
+        Results for decoded images, hashed in one pass; if that fails, each image is hashed on
+        its own so only the image that raised gets an error.
+        """
+        if not images:
+            return []
+        try:
+            return [{"hash_value": hash_and_qual.getHash().dumpBitsFlat()} for hash_and_qual in self.pdq_hasher.fromImages(images)]
+        except Exception:
+            results = []
+            for message, image in zip(messages, images):
+                try:
+                    results.append({"hash_value": self.pdq_hasher.fromImages([image])[0].getHash().dumpBitsFlat()})
+                except Exception as e:
+                    results.append(self.get_error_response(message, e))
+            return results
 
     @classmethod
     def validate_input(cls, data: Dict) -> None:
@@ -5,6 +5,7 @@ MODEL_NAME = 'meedan/indian-sbert'
 
 class Model(GenericTransformerModel):
     BATCH_SIZE = 100
+    MIN_BATCH_SIZE = 1
 
     def __init__(self):
         """
@@ -5,6 +5,7 @@ MODEL_NAME = 'xlm-r-bert-base-nli-stsb-mean-tokens'
 
 class Model(GenericTransformerModel):
     BATCH_SIZE = 100
+    MIN_BATCH_SIZE = 1
 
     def __init__(self):
         """
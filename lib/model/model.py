@@ -1,23 +1,196 @@
 import traceback
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Optional, BinaryIO
 from abc import ABC, abstractmethod
+import io
+import multiprocessing
 import os
 import tempfile
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import urllib.request
+import httpx
 
 from lib.helpers import get_class
 from lib import schemas
-from lib.cache import Cache
+from lib.cache import Cache, DEFAULT_TTL
+from lib.http_client import HTTPClient
+from lib.logger import logger
 from lib.sentry import capture_custom_message
 from lib.base_exception import PrestoBaseException
+from lib.telemetry import OPEN_TELEMETRY_EXPORTER
 
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", "30"))
+DOWNLOAD_MAX_SECONDS = float(os.getenv("DOWNLOAD_MAX_SECONDS", "600"))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(1024 * 1024)))
+DOWNLOAD_MAX_RESUMES = int(os.getenv("DOWNLOAD_MAX_RESUMES", "3"))
+# With RESPOND_WORKERS > 1, respond() runs get_uncached_response for a batch concurrently on the model's
+# RESPOND_EXECUTOR kind ("thread" or "process"); RESPOND_EXECUTOR in the environment overrides it.
+RESPOND_WORKERS = int(os.getenv("RESPOND_WORKERS", "1"))
+RESPOND_EXECUTOR = os.getenv("RESPOND_EXECUTOR", "")
+# Override the model's CACHE_TTL and CACHE_MAX_ENTRIES for a deployment; 0 keeps the model's own.
+CACHE_MODEL_TTL = int(os.getenv("CACHE_MODEL_TTL", "0"))
+CACHE_MODEL_MAX_ENTRIES = int(os.getenv("CACHE_MODEL_MAX_ENTRIES", "0"))
+
+_process_model = None
+
+def _init_respond_process(model_class: type, model_name: Optional[str]) -> None:
+    """
+    Build the model once per pool process, so heavy models are not pickled with every message.
+    """
+    global _process_model
+    _process_model = model_class()
+    _process_model.model_name = model_name
+
+def _get_response_in_process(message: schemas.Message, prefetched: Any = None) -> Any:
+    url = getattr(message.body, "url", None)
+    if url and prefetched is not None:
+        _process_model.prefetched[url] = prefetched
+    return _process_model.get_uncached_response(message)
 
 class Model(ABC):
     BATCH_SIZE = 1
+    # Set below BATCH_SIZE to let the worker adapt the batch size between the two to
+    # BATCH_TARGET_SECONDS; None keeps batches at BATCH_SIZE.
+    MIN_BATCH_SIZE: Optional[int] = None
+    DOWNLOAD_MAX_BYTES = DOWNLOAD_MAX_BYTES
+    # How process() fetches body.url: "buffer" (get_buffer_for_url), "tempfile"
+    # (get_tempfile_for_url) or None for models that do not download media.
+    MEDIA_DOWNLOAD: Optional[str] = None
+    # Executor respond() uses when RESPOND_WORKERS > 1: "thread" for I/O-bound models,
+    # "process" for CPU-bound ones.
+    RESPOND_EXECUTOR = "thread"
+    # Results are cached in a namespace of their own, "<model_name>:<CACHE_VERSION>"; bump
+    # CACHE_VERSION when a change to the model makes results cached by earlier versions wrong.
+    CACHE_VERSION = "1"
+    # Seconds a cached result lives after its last use; None uses CACHE_DEFAULT_TTL.
+    CACHE_TTL: Optional[int] = None
+    # Most results cached for the model, least recently used evicted first; None is unbounded.
+    CACHE_MAX_ENTRIES: Optional[int] = None
+    # Set for models whose results are float32 embedding vectors, to cache them as raw
+    # CACHE_VECTOR_DTYPE floats instead of JSON. Other float results would lose precision.
+    CACHE_VECTORS = False
 
     def __init__(self):
         self.model_name = os.environ.get("MODEL_NAME")
+        self.prefetched: Dict[str, Any] = {}
+        self.prefetched_lock = threading.Lock()
+
+    def prefetch(self, messages: List[schemas.Message], executor: Optional[Executor] = None) -> None:
+        """
+        Download the media of uncached messages ahead of process(), so the worker can fetch the
+        next batch while this one is hashed. Downloads run on executor when given. A failed
+        download is only logged: process() downloads again and reports the error per message.
+        """
+        if not self.MEDIA_DOWNLOAD:
+            return
+        urls = []
+        for message, cached_result in zip(messages, self.get_cached_results(messages)):
+            url = getattr(message.body, "url", None)
+            if url and url not in urls and url not in self.prefetched and not cached_result:
+                urls.append(url)
+        if executor:
+            list(executor.map(self.prefetch_url, urls))
+        else:
+            for url in urls:
+                self.prefetch_url(url)
+
+    def prefetch_url(self, url: str) -> None:
+        try:
+            if self.MEDIA_DOWNLOAD == "tempfile":
+                content = self.get_tempfile_for_url(url)
+            else:
+                content = self.get_buffer_for_url(url).getvalue()
+        except Exception as e:
+            logger.info(f"Prefetch of {url} failed, leaving it to process: {e}")
+            return
+        with self.prefetched_lock:
+            self.prefetched[url] = content
+
+    def pop_prefetched(self, url: str) -> Any:
+        with self.prefetched_lock:
+            return self.prefetched.pop(url, None)
+
+    def release_prefetched(self, messages: List[schemas.Message]) -> None:
+        """
+        Drop media prefetched for messages that process() never consumed, e.g. after a timeout.
+        """
+        leftovers = [self.pop_prefetched(getattr(message.body, "url", None)) for message in messages]
+        for content in leftovers:
+            if isinstance(content, str) and os.path.exists(content):
+                os.remove(content)
+
+    def download_url(self, url: str, out_file: BinaryIO) -> int:
+        """
+        Stream the media at url into out_file one chunk at a time, so memory use does not grow
+        with the size of the media. DOWNLOAD_TIMEOUT_SECONDS bounds each connect and read; the
+        whole download is bounded by DOWNLOAD_MAX_SECONDS and self.DOWNLOAD_MAX_BYTES. If the
+        connection drops part way through and the server accepts byte ranges, the download is
+        resumed where it stopped, up to DOWNLOAD_MAX_RESUMES times. Returns the number of bytes
+        written, and reports bytes/sec for the model to telemetry.
+        """
+        start_time = time.time()
+        written = 0
+        resumes = 0
+        while True:
+            headers = {'User-Agent': 'Mozilla/5.0'}
+            if written:
+                headers['Range'] = f"bytes={written}-"
+            interrupted = False
+            with HTTPClient.stream(url, headers=headers, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+                if written and response.status_code != 206:
+                    # The server ignored the range and is sending everything again.
+                    out_file.seek(0)
+                    out_file.truncate()
+                    written = 0
+                content_length = response.headers.get("Content-Length")
+                if content_length and content_length.isdigit():
+                    self.check_download_size(url, written + int(content_length))
+                accepts_ranges = response.headers.get("Accept-Ranges") == "bytes"
+                chunks = response.iter_bytes(DOWNLOAD_CHUNK_BYTES)
+                while True:
+                    try:
+                        chunk = next(chunks, b"")
+                    except httpx.TransportError:
+                        # Covers timeouts and connections closed before Content-Length bytes arrived.
+                        if not (accepts_ranges and written and resumes < DOWNLOAD_MAX_RESUMES):
+                            raise
+                        resumes += 1
+                        interrupted = True
+                        break
+                    if not chunk:
+                        break
+                    self.check_download_size(url, written + len(chunk))
+                    if time.time() - start_time > DOWNLOAD_MAX_SECONDS:
+                        raise PrestoBaseException(f"Download of {url} took longer than {DOWNLOAD_MAX_SECONDS} seconds", 504)
+                    out_file.write(chunk)
+                    written += len(chunk)
+            if not interrupted:
+                break
+        OPEN_TELEMETRY_EXPORTER.log_download(self.model_name or "", written, time.time() - start_time)
+        return written
+
+    def check_download_size(self, url: str, num_bytes: int) -> None:
+        """
+        Refuse media larger than self.DOWNLOAD_MAX_BYTES.
+        """
+        if num_bytes > self.DOWNLOAD_MAX_BYTES:
+            raise PrestoBaseException(f"Media at {url} is larger than the {self.DOWNLOAD_MAX_BYTES} byte limit", 413)
+
+    def get_buffer_for_url(self, url: str) -> io.BytesIO:
+        """
+        Loads a file based on specified URL into an in-memory buffer, positioned at its start.
+        For small media such as images; large media should go through get_tempfile_for_url.
+        """
+        prefetched = self.pop_prefetched(url)
+        if isinstance(prefetched, bytes):
+            return io.BytesIO(prefetched)
+        buffer = io.BytesIO()
+        self.download_url(url, buffer)
+        buffer.seek(0)
+        return buffer
 
     def get_tempfile_for_url(self, url: str) -> str:
         """
@@ -25,16 +198,16 @@ class Model(ABC):
         Do not allow the tempfile to be deleted- we manage that directly to 
         avoid unintended mid-process file loss.
         """
+        prefetched = self.pop_prefetched(url)
+        if isinstance(prefetched, str):
+            return prefetched
         temp_file = tempfile.NamedTemporaryFile(delete=False)
-        with open(temp_file.name, 'wb') as out_file:
-            out_file.write(
-                urllib.request.urlopen(
-                    urllib.request.Request(
-                        url,
-                        headers={'User-Agent': 'Mozilla/5.0'}
-                    )
-                ).read()
-            )
+        try:
+            with open(temp_file.name, 'wb') as out_file:
+                self.download_url(url, out_file)
+        except Exception:
+            os.remove(temp_file.name)
+            raise
         return temp_file.name
 
     def get_tempfile(self) -> Any:
@@ -59,32 +232,143 @@ class Model(ABC):
         capture_custom_message(f"Error during fingerprinting for {self.model_name}", 'error', error_context)
         return schemas.ErrorResponse(error=str(e), error_details=error_context, error_code=response_code)
 
+    def get_cache_key(self, message: schemas.Message) -> Optional[str]:
+        """
+        Key under which the result for a message is cached. Models whose output depends on
+        message parameters as well as content should extend the content hash with them.
+        """
+        return message.body.content_hash
+
+    def get_cache_namespace(self) -> str:
+        return f"{self.model_name or type(self).__module__}:{self.CACHE_VERSION}"
+
+    def get_cache_policy(self) -> Dict[str, Any]:
+        """
+        Namespace, TTL and entry limit of this model's cached results, as keyword arguments for
+        the Cache methods.
+        """
+        return {
+            "namespace": self.get_cache_namespace(),
+            "ttl": CACHE_MODEL_TTL or self.CACHE_TTL or DEFAULT_TTL,
+            "max_entries": CACHE_MODEL_MAX_ENTRIES or self.CACHE_MAX_ENTRIES,
+        }
+
+    def get_cached_results(self, messages: List[schemas.Message]) -> List[Optional[Any]]:
+        """
+        Cached result for each message, in order, or None where there is none.
+        """
+        return Cache.get_many([self.get_cache_key(message) for message in messages], **self.get_cache_policy())
+
+    def set_cached_results(self, messages: List[schemas.Message]) -> None:
+        """
+        Cache the results of messages, except errors.
+        """
+        Cache.set_many({
+            self.get_cache_key(message): message.body.result
+            for message in messages if not isinstance(message.body.result, schemas.ErrorResponse)
+        }, vector=self.CACHE_VECTORS, **self.get_cache_policy())
+
     def get_response(self, message: schemas.Message) -> schemas.GenericItem:  # TODO note: the return type is wrong here
         """
         Perform a lookup on the cache for a message, and if found, return that cached value.
         """
-        result = Cache.get_cached_result(message.body.content_hash)
+        result = Cache.get_cached_result(self.get_cache_key(message), **self.get_cache_policy())
         if not result:
-            try:
-                result = self.process(message)
-                Cache.set_cached_result(message.body.content_hash, result)
-            except Exception as e:
-                if isinstance(e, PrestoBaseException):
-                    return self.handle_fingerprinting_error(e, e.error_code, {"message_body": message.body.model_dump()})
-                else:
-                    return self.handle_fingerprinting_error(e, 500, {"message_body": message.body.model_dump()})
+            result = self.get_uncached_response(message)
+            if not isinstance(result, schemas.ErrorResponse):
+                Cache.set_cached_result(self.get_cache_key(message), result, vector=self.CACHE_VECTORS, **self.get_cache_policy())
         return result
 
+    def get_uncached_response(self, message: schemas.Message) -> schemas.GenericItem:
+        """
+        Run the model on a message, turning any failure into an ErrorResponse for that message.
+        """
+        try:
+            return self.process(message)
+        except Exception as e:
+            return self.get_error_response(message, e)
+
+    def get_error_response(self, message: schemas.Message, e: Exception) -> schemas.ErrorResponse:
+        """
+        ErrorResponse for a message whose processing raised e, with the status code of a
+        PrestoBaseException or 500 for anything else.
+        """
+        error_code = e.error_code if isinstance(e, PrestoBaseException) else 500
+        return self.handle_fingerprinting_error(e, error_code, {"message_body": message.body.model_dump()})
+
     def respond(self, messages: Union[List[schemas.Message], schemas.Message]) -> List[schemas.Message]:
         """
         Force messages as list of messages in case we get a singular item. Then, run fingerprint routine.
+        The cache is read and written once per batch rather than once per message.
         """
         if not isinstance(messages, list):
             messages = [messages]
-        for message in messages:
-            message.body.result = self.get_response(message)
+        uncached = []
+        for message, cached_result in zip(messages, self.get_cached_results(messages)):
+            if cached_result:
+                message.body.result = cached_result
+            else:
+                uncached.append(message)
+        executor = self.get_respond_executor() if len(uncached) > 1 else None
+        if executor is None:
+            for message in uncached:
+                message.body.result = self.get_uncached_response(message)
+        else:
+            futures = [self.submit_response(executor, message) for message in uncached]
+            for message, future in zip(uncached, futures):
+                try:
+                    message.body.result = future.result()
+                except Exception as e:
+                    # get_uncached_response handles model errors itself; this is the pool
+                    # failing, e.g. a worker process killed mid-message.
+                    if isinstance(e, BrokenProcessPool):
+                        self.reset_respond_executor()
+                    message.body.result = self.handle_fingerprinting_error(e, 500, {"message_body": message.body.model_dump()})
+        self.set_cached_results(uncached)
         return messages
 
+    def get_respond_executor(self) -> Optional[Executor]:
+        """
+        Executor for concurrent get_uncached_response calls, created on first use and kept for the life of
+        the process. None when RESPOND_WORKERS is 1, i.e. messages are handled one at a time.
+        Process pools are spawned rather than forked, as the worker already runs threads.
+        """
+        if RESPOND_WORKERS <= 1:
+            return None
+        if getattr(self, "respond_executor", None) is None or self.respond_executor_pid != os.getpid():
+            if (RESPOND_EXECUTOR or self.RESPOND_EXECUTOR) == "process":
+                self.respond_executor = ProcessPoolExecutor(
+                    max_workers=RESPOND_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_respond_process,
+                    initargs=(type(self), self.model_name)
+                )
+            else:
+                self.respond_executor = ThreadPoolExecutor(max_workers=RESPOND_WORKERS)
+            self.respond_executor_pid = os.getpid()
+        return self.respond_executor
+
+    def submit_response(self, executor: Executor, message: schemas.Message) -> Future:
+        """
+        Queue get_uncached_response for message. Pool processes have their own model instance, so
+        media prefetched by this one is handed over with the message.
+        """
+        try:
+            if isinstance(executor, ProcessPoolExecutor):
+                prefetched = self.pop_prefetched(getattr(message.body, "url", None)) if self.MEDIA_DOWNLOAD else None
+                return executor.submit(_get_response_in_process, message, prefetched)
+            return executor.submit(self.get_uncached_response, message)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def reset_respond_executor(self) -> None:
+        executor = getattr(self, "respond_executor", None)
+        self.respond_executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
 
     @classmethod
     def validate_input(cls, data: Dict) -> None:
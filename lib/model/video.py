@@ -13,13 +13,18 @@ from lib import schemas
 from lib.helpers import get_environment_setting
 
 class Model(Model):
+    MEDIA_DOWNLOAD = "tempfile"
+    RESPOND_EXECUTOR = "process"
+    # TMK hashes are expensive to recompute, so they are kept for a week.
+    CACHE_TTL = 7*24*60*60
+
     def __init__(self):
         """
         Set some basic constants during operation, create local folder for tmk workspace.
         """
+        super().__init__()
         self.directory = "./video_files"
         self.ffmpeg_dir = "/usr/local/bin/ffmpeg"
-        self.model_name = os.environ.get("MODEL_NAME")
         pathlib.Path(self.directory).mkdir(parents=True, exist_ok=True)
 
     def tmk_file_path(self, filename: str, create_path: bool = True) -> str:
@@ -11,6 +11,10 @@ import cld3
 import jieba
 
 class Model(Model):
+    RESPOND_EXECUTOR = "process"
+    # Keywords are cheap to extract again, so they are kept briefly and in bounded numbers.
+    CACHE_TTL = 6*60*60
+    CACHE_MAX_ENTRIES = 100000
 
     def keep_largest_overlapped_keywords(self, keywords):
         cleaned_keywords = []
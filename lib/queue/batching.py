@@ -0,0 +1,40 @@
+from typing import Optional
+
+class AdaptiveBatchSizer:
+    """
+    Picks the next batch size for a worker from how long recent batches took and how many
+    messages are waiting. A batch slower than target_seconds shrinks the size in proportion
+    to the overshoot straight away; a full, fast batch with a backlog behind it doubles the
+    size, but never past what the per-message time estimate says fits in target_seconds.
+    """
+    # Weight of the newest batch in the per-message time estimate.
+    SMOOTHING = 0.3
+
+    def __init__(self, min_size: int, max_size: int, target_seconds: float, initial_size: Optional[int] = None):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.size = self.clamp(initial_size or max_size)
+        self.seconds_per_message: Optional[float] = None
+
+    def clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+
+    def record(self, count: int, seconds: float, queue_depth: Optional[int] = None) -> int:
+        """
+        Update the size after a batch of count messages took seconds. queue_depth is the
+        approximate number of messages waiting, or None when unknown. Returns the new size.
+        """
+        if count <= 0:
+            return self.size
+        latest = seconds / count
+        if self.seconds_per_message is None:
+            self.seconds_per_message = latest
+        else:
+            self.seconds_per_message += self.SMOOTHING * (latest - self.seconds_per_message)
+        if seconds > self.target_seconds:
+            self.size = self.clamp(min(self.size, int(count * self.target_seconds / seconds)))
+        elif count >= self.size and (queue_depth is None or queue_depth >= self.size):
+            fits = int(self.target_seconds / max(self.seconds_per_message, 1e-6))
+            self.size = self.clamp(max(self.size, min(self.size * 2, fits)))
+        return self.size
@@ -0,0 +1,211 @@
+import atexit
+import multiprocessing
+import os
+import resource
+import signal
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from lib import schemas
+from lib.logger import logger
+from lib.model.model import Model
+
+# "thread" runs the model in a long-lived thread of the worker; "process" runs it in a spawned
+# child that is killed on timeout, which is the only way to stop a hung decode or hasher.
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "thread")
+# Recycle the child after this many batches / once its peak RSS passes this many MB (0 = never).
+EXECUTION_MAX_TASKS = int(os.getenv("EXECUTION_MAX_TASKS", "0"))
+EXECUTION_MAX_MEMORY_MB = int(os.getenv("EXECUTION_MAX_MEMORY_MB", "0"))
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MB (ru_maxrss is in KB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_child(model_class: type, model_name: Optional[str], connection) -> None:
+    """
+    Loop of the execution child: build the model, then respond to each batch sent over
+    connection until it receives None. The child is spawned rather than forked, as the worker
+    already runs threads that may hold locks a forked copy would inherit, so it loads the
+    model itself, the same way the RESPOND_EXECUTOR="process" pool does.
+    """
+    # Lead a process group so a kill also takes down any processes the model started.
+    os.setpgrp()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    model = model_class()
+    model.model_name = model_name
+    connection.send("ready")
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        messages, prefetched = task
+        if prefetched:
+            model.prefetched.update(prefetched)
+        try:
+            result = ("ok", model.respond(messages))
+        except Exception as e:
+            result = ("error", e)
+        if prefetched:
+            model.release_prefetched(messages)
+        try:
+            connection.send(result + (peak_rss_mb(),))
+        except Exception as e:
+            # Results or exceptions that cannot be pickled are reported by message.
+            connection.send(("error", RuntimeError(f"{type(e).__name__}: {e}"), peak_rss_mb()))
+
+class ExecutionEngine:
+    """
+    Long-lived executor for one model's respond calls, kept across batches by the worker.
+    Timeouts never block the next batch: in thread mode the stuck thread is abandoned, and in
+    process mode the child is killed and replaced on the next call.
+
+    An abandoned thread cannot be stopped: it keeps its CPU, memory and any media it holds
+    until respond returns, and a model that hangs for good leaks one thread per timeout for
+    the life of the worker. Use process mode for models that can hang.
+
+    on_process, if given, is called with the pid of each execution child as it starts and with
+    0 once it is stopped, so whoever supervises the worker can kill the child's process group.
+    """
+    def __init__(self, model: Model, mode: str = EXECUTION_MODE, max_tasks: int = EXECUTION_MAX_TASKS, max_memory_mb: int = EXECUTION_MAX_MEMORY_MB, on_process: Optional[Callable[[int], None]] = None):
+        self.model = model
+        self.mode = mode
+        self.max_tasks = max_tasks
+        self.max_memory_mb = max_memory_mb
+        self.on_process = on_process
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.process: Optional[multiprocessing.Process] = None
+        self.connection = None
+        self.tasks = 0
+        self.abandoned: List[Future] = []
+
+    def run(self, messages: List[schemas.Message], timeout_seconds: float) -> List[schemas.Message]:
+        """
+        Respond to messages, raising TimeoutError if that takes longer than timeout_seconds.
+        """
+        if self.mode == "process":
+            return self.run_in_process(messages, timeout_seconds)
+        return self.run_in_thread(messages, timeout_seconds)
+
+    def run_in_thread(self, messages: List[schemas.Message], timeout_seconds: float) -> List[schemas.Message]:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="respond")
+        future = self.executor.submit(self.model.respond, messages)
+        try:
+            return future.result(timeout=timeout_seconds)
+        except TimeoutError:
+            # A thread cannot be killed; leave it to finish on its own and use a fresh one.
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            self.abandoned.append(future)
+            raise
+
+    def abandoned_threads(self) -> int:
+        """
+        Threads abandoned on a timeout that are still running their batch.
+        """
+        self.abandoned = [future for future in self.abandoned if not future.done()]
+        return len(self.abandoned)
+
+    def run_in_process(self, messages: List[schemas.Message], timeout_seconds: float) -> List[schemas.Message]:
+        if self.process is not None and not self.process.is_alive():
+            self.stop_process(kill=True)
+        if self.process is None:
+            self.start_process()
+        prefetched = self.take_prefetched(messages)
+        try:
+            try:
+                self.connection.send((messages, prefetched))
+                finished = self.connection.poll(timeout_seconds)
+                if finished:
+                    status, result, rss_mb = self.connection.recv()
+            except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+                self.stop_process(kill=True)
+                raise RuntimeError(f"Execution process exited while responding: {e}") from e
+            if not finished:
+                logger.info(f"Killing execution process {self.process.pid} after {timeout_seconds}s")
+                self.stop_process(kill=True)
+                raise TimeoutError()
+        finally:
+            self.remove_unconsumed(prefetched)
+        self.tasks += 1
+        if (self.max_tasks and self.tasks >= self.max_tasks) or (self.max_memory_mb and rss_mb > self.max_memory_mb):
+            logger.info(f"Recycling execution process after {self.tasks} tasks at {rss_mb:.0f}MB peak RSS")
+            self.stop_process()
+        if status == "error":
+            raise result
+        return result
+
+    def take_prefetched(self, messages: List[schemas.Message]) -> Dict[str, Any]:
+        """
+        Media the worker prefetched for messages, handed to the child with the batch.
+        """
+        if not getattr(self.model, "MEDIA_DOWNLOAD", None):
+            return {}
+        prefetched = {}
+        for message in messages:
+            url = getattr(message.body, "url", None)
+            content = self.model.pop_prefetched(url)
+            if content is not None:
+                prefetched[url] = content
+        return prefetched
+
+    def remove_unconsumed(self, prefetched: Dict[str, Any]) -> None:
+        """
+        process() deletes the tempfiles it consumes; remove any a killed or failed child left.
+        """
+        for content in prefetched.values():
+            if isinstance(content, str) and os.path.exists(content):
+                os.remove(content)
+
+    def start_process(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        # Not a daemon, so the model may start processes of its own (RESPOND_EXECUTOR="process").
+        self.process = context.Process(target=run_child, args=(type(self.model), self.model.model_name, child_connection))
+        self.process.start()
+        if self.on_process is not None:
+            self.on_process(self.process.pid)
+        child_connection.close()
+        self.tasks = 0
+        atexit.unregister(self.shutdown)
+        atexit.register(self.shutdown)
+        # Wait for the model to load, so loading does not count against the first batch's timeout.
+        try:
+            self.connection.recv()
+        except EOFError as e:
+            self.stop_process(kill=True)
+            raise RuntimeError(f"Execution process exited while loading the model: {e}") from e
+
+    def stop_process(self, kill: bool = False) -> None:
+        if self.process is None:
+            return
+        if not kill:
+            try:
+                self.connection.send(None)
+                self.process.join(5)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                # Killed before it had set up its process group.
+                self.process.kill()
+            self.process.join()
+        self.connection.close()
+        self.process = None
+        self.connection = None
+        if self.on_process is not None:
+            self.on_process(0)
+
+    def shutdown(self) -> None:
+        atexit.unregister(self.shutdown)
+        self.stop_process()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -1,7 +1,10 @@
 import json
-from typing import List, Dict, Tuple
+import math
+from typing import Any, Callable, List, Dict, Tuple, Optional
 import os
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import botocore
@@ -12,9 +15,36 @@ from lib import schemas
 
 SQS_MAX_BATCH_SIZE = int(os.getenv("SQS_MAX_BATCH_SIZE", "10"))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))
+# How long to keep gathering messages with concurrent receives once the first arrive, when a
+# batch of more than SQS_MAX_BATCH_SIZE is asked for; 0 receives one SQS batch at a time.
+RECEIVE_LINGER_SECONDS = float(os.getenv("RECEIVE_LINGER_SECONDS", "1"))
+RECEIVE_MAX_CONCURRENCY = int(os.getenv("RECEIVE_MAX_CONCURRENCY", "10"))
+# SendMessageBatch takes at most 10 entries and 256 KB of message bodies per call.
+SQS_MAX_BATCH_BYTES = 262144
+# Attempts at entries a SendMessageBatch call failed on SQS's side before giving up on them.
+SEND_MAX_ATTEMPTS = int(os.getenv("SEND_MAX_ATTEMPTS", "3"))
+# Used when the queue's own VisibilityTimeout attribute cannot be read.
+DEFAULT_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("DEFAULT_VISIBILITY_TIMEOUT_SECONDS", "30"))
 
 class Queue:
     _thread_local = threading.local()
+    # Queue URLs by (endpoint, queue name), shared by every Queue in the process. Each thread
+    # builds its own handles from them, as boto3 resources are not thread-safe.
+    _queue_urls: Dict[Tuple[str, str], str] = {}
+
+    def __init__(self):
+        # Receipt handle -> time its message becomes visible to other consumers again.
+        self.visibility_deadlines: Dict[str, float] = {}
+        self.visibility_timeout: Optional[int] = None
+        self.receive_executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def reset_after_fork() -> None:
+        """
+        Make a forked child build its own boto3 resources, whose connection pools may have been
+        in use by another thread of the parent at fork time.
+        """
+        Queue._thread_local = threading.local()
 
     @staticmethod
     def get_sqs():
@@ -106,27 +136,79 @@ class Queue:
             Attributes=attributes
         )
 
+    @staticmethod
+    def get_queue_handles(sqs: boto3.resources.base.ServiceResource) -> Dict[str, boto3.resources.base.ServiceResource]:
+        """
+        This thread's queue handles on sqs, by queue name.
+        """
+        if getattr(Queue._thread_local, "queue_handles_sqs", None) is not sqs:
+            Queue._thread_local.queue_handles_sqs = sqs
+            Queue._thread_local.queue_handles = {}
+        return Queue._thread_local.queue_handles
+
     def get_or_create_queue(self, queue_name: str):
         """
-        Retrieve or create a queue with the specified name.
+        Retrieve or create a queue with the specified name. Queue URLs are kept for the life of
+        the process, so only the first lookup of a queue costs a GetQueueUrl round trip.
+        """
+        sqs = self.get_sqs()
+        handles = Queue.get_queue_handles(sqs)
+        if queue_name not in handles:
+            key = (sqs.meta.client.meta.endpoint_url, queue_name)
+            url = Queue._queue_urls.get(key)
+            if url:
+                handles[queue_name] = sqs.Queue(url)
+            else:
+                handles[queue_name] = self.lookup_queue(sqs, queue_name)
+                Queue._queue_urls[key] = handles[queue_name].url
+        return [handles[queue_name]]
+
+    def lookup_queue(self, sqs: boto3.resources.base.ServiceResource, queue_name: str) -> boto3.resources.base.ServiceResource:
+        """
+        Look up a queue by name on SQS, creating it if it does not exist.
         """
         try:
-            return [self.get_sqs().get_queue_by_name(QueueName=queue_name)]
+            return sqs.get_queue_by_name(QueueName=queue_name)
         except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == "AWS.SimpleQueueService.NonExistentQueue":
-                return [self.create_queue(queue_name)]
+            if self.is_nonexistent_queue(e):
+                return self.create_queue(queue_name)
             else:
                 raise
 
+    def forget_queue(self, queue_name: str):
+        """
+        Drop the cached handle and URL of a queue, so the next use looks it up again.
+        """
+        sqs = self.get_sqs()
+        Queue.get_queue_handles(sqs).pop(queue_name, None)
+        Queue._queue_urls.pop((sqs.meta.client.meta.endpoint_url, queue_name), None)
+
+    @staticmethod
+    def is_nonexistent_queue(error: botocore.exceptions.ClientError) -> bool:
+        return error.response.get('Error', {}).get('Code') in ("AWS.SimpleQueueService.NonExistentQueue", "QueueDoesNotExist")
+
+    def with_queue(self, queue_name: str, operation: Callable[[boto3.resources.base.ServiceResource], Any]) -> Any:
+        """
+        Run operation on the cached handle of a queue. If the queue has gone away since it was
+        cached, the handle is dropped and operation retried once on a fresh lookup.
+        """
+        try:
+            return operation(self.get_or_create_queue(queue_name)[0])
+        except botocore.exceptions.ClientError as e:
+            if not self.is_nonexistent_queue(e):
+                raise
+            logger.info(f"Queue {queue_name} no longer exists, looking it up again")
+            self.forget_queue(queue_name)
+            return operation(self.get_or_create_queue(queue_name)[0])
+
     def send_message(self, queue_name: str, message: schemas.Message):
         """
         Send a message to a specific queue.
         """
-        queue = self.get_or_create_queue(queue_name)[0]
         message_data = {"MessageBody": json.dumps(message.model_dump())}
         if queue_name.endswith('.fifo'):
             message_data["MessageGroupId"] = message.body.id
-        queue.send_message(**message_data)
+        self.with_queue(queue_name, lambda queue: queue.send_message(**message_data))
 
     def group_deletions(self, messages_with_queues: List[Tuple[schemas.Message, boto3.resources.base.ServiceResource]]) -> Dict[boto3.resources.base.ServiceResource, List[schemas.Message]]:
         """
@@ -151,10 +233,11 @@ class Queue:
         """
         Helper to delete a batch of messages from a specific queue.
         """
+        self.forget_visibility(messages)
         for i in range(0, len(messages), 10):
             batch = messages[i:i + 10]
             entries = [{"Id": str(idx), "ReceiptHandle": message.receipt_handle} for idx, message in enumerate(batch)]
-            self.get_or_create_queue(queue_name)[0].delete_messages(Entries=entries)
+            self.with_queue(queue_name, lambda queue: queue.delete_messages(Entries=entries))
 
     def delete_message_entry(self, message: schemas.Message, idx: int = 0) -> Dict[str, str]:
         """
@@ -167,30 +250,185 @@ class Queue:
 
     def receive_messages(self, batch_size: int = 1):
         """
-        Receive messages from a queue.
+        Receive messages from a queue. The first call long-polls for up to SQS_MAX_BATCH_SIZE
+        messages; larger batches are then filled by concurrent receives for up to RECEIVE_LINGER_SECONDS.
+        """
+        queue, messages = self.with_queue(self.input_queue_name, lambda queue: (
+            queue, list(queue.receive_messages(MaxNumberOfMessages=min(batch_size, SQS_MAX_BATCH_SIZE), WaitTimeSeconds=20))
+        ))
+        self.track_visibility(messages, queue)
+        if messages and len(messages) < batch_size and batch_size > SQS_MAX_BATCH_SIZE and RECEIVE_LINGER_SECONDS > 0:
+            messages += self.receive_more_messages(queue, batch_size - len(messages))
+        return [(m, self.input_queue_name) for m in messages]
+
+    def receive_more_messages(self, queue: boto3.resources.base.ServiceResource, wanted: int) -> List:
+        """
+        Gather up to wanted more messages in rounds of concurrent receives until the linger window closes.
+        """
+        if self.receive_executor is None:
+            self.receive_executor = ThreadPoolExecutor(max_workers=RECEIVE_MAX_CONCURRENCY, thread_name_prefix="receive")
+        deadline = time.time() + RECEIVE_LINGER_SECONDS
+        received = []
+        while len(received) < wanted:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            # SQS only waits whole seconds; under a second left means a short poll.
+            wait_seconds = min(int(remaining), 20)
+            missing = wanted - len(received)
+            calls = min(math.ceil(missing / SQS_MAX_BATCH_SIZE), RECEIVE_MAX_CONCURRENCY)
+            sizes = [min(SQS_MAX_BATCH_SIZE, missing - i * SQS_MAX_BATCH_SIZE) for i in range(calls)]
+            futures = [self.receive_executor.submit(self.receive_from_url, queue.url, size, wait_seconds) for size in sizes]
+            messages = [message for future in futures for message in future.result()]
+            self.track_visibility(messages, queue)
+            received += messages
+            if not messages and wait_seconds == 0:
+                break
+        return received
+
+    def receive_from_url(self, queue_url: str, max_messages: int, wait_seconds: int) -> List:
+        """
+        One ReceiveMessage call through this thread's own SQS resource, as boto3 resources are not thread-safe.
+        """
+        return list(self.get_sqs().Queue(queue_url).receive_messages(MaxNumberOfMessages=max_messages, WaitTimeSeconds=wait_seconds))
+
+    def get_visibility_timeout(self, queue: boto3.resources.base.ServiceResource) -> int:
+        if self.visibility_timeout is None:
+            try:
+                self.visibility_timeout = int(queue.attributes["VisibilityTimeout"])
+            except (botocore.exceptions.ClientError, KeyError, TypeError, ValueError):
+                self.visibility_timeout = DEFAULT_VISIBILITY_TIMEOUT_SECONDS
+        return self.visibility_timeout
+
+    def track_visibility(self, messages: List, queue: boto3.resources.base.ServiceResource):
+        """
+        Record when each received message becomes visible again, dropping records of messages
+        that already have (those were never deleted here and belong to another receive now).
+        """
+        now = time.time()
+        for receipt_handle, deadline in list(self.visibility_deadlines.items()):
+            if deadline < now:
+                self.visibility_deadlines.pop(receipt_handle, None)
+        deadline = now + self.get_visibility_timeout(queue)
+        for message in messages:
+            self.visibility_deadlines[message.receipt_handle] = deadline
+
+    def visibility_remaining(self, message) -> Optional[float]:
+        """
+        Seconds until message becomes visible to other consumers, or None if it is not tracked.
+        """
+        deadline = self.visibility_deadlines.get(message.receipt_handle)
+        return None if deadline is None else deadline - time.time()
+
+    def extend_visibility(self, queue_name: str, messages: List, timeout_seconds: int):
+        """
+        Keep messages invisible for another timeout_seconds, in ChangeMessageVisibility batches of 10.
+        """
+        for i in range(0, len(messages), 10):
+            batch = messages[i:i + 10]
+            entries = [{"Id": str(idx), "ReceiptHandle": message.receipt_handle, "VisibilityTimeout": timeout_seconds} for idx, message in enumerate(batch)]
+            response = self.with_queue(queue_name, lambda queue: queue.change_message_visibility_batch(Entries=entries))
+            failed = {int(failure["Id"]): failure.get("Message") for failure in response.get("Failed", [])}
+            deadline = time.time() + timeout_seconds
+            for idx, message in enumerate(batch):
+                if idx in failed:
+                    logger.warning(f"Could not extend visibility of message {message.receipt_handle}: {failed[idx]}")
+                else:
+                    self.visibility_deadlines[message.receipt_handle] = deadline
+
+    def forget_visibility(self, messages: List):
         """
-        queue = self.get_or_create_queue(self.input_queue_name)[0]
-        return [(m, self.input_queue_name) for m in queue.receive_messages(MaxNumberOfMessages=min(batch_size, SQS_MAX_BATCH_SIZE), WaitTimeSeconds=20)]
+        Stop tracking messages that are being deleted, warning about any whose visibility
+        lapsed first, as another consumer may have received them again meanwhile.
+        """
+        now = time.time()
+        for message in messages:
+            deadline = self.visibility_deadlines.pop(message.receipt_handle, None)
+            if deadline is not None and deadline < now:
+                logger.warning(f"Deleting message {message.receipt_handle} {now - deadline:.1f}s after its visibility timeout lapsed")
 
-    def find_queue_by_name(self, queue_name: str) -> boto3.resources.base.ServiceResource:
+    def get_approximate_depth(self, queue_name: str) -> Optional[int]:
         """
-        Search through queues to find the right one
+        Approximate number of messages waiting on a queue, or None if SQS could not say.
         """
-        return self.all_queues.get(queue_name)
+        queue = self.get_or_create_queue(queue_name)[0]
+        try:
+            response = self.get_sqs().meta.client.get_queue_attributes(QueueUrl=queue.url, AttributeNames=["ApproximateNumberOfMessages"])
+            return int(response["Attributes"]["ApproximateNumberOfMessages"])
+        except (botocore.exceptions.ClientError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Could not read the depth of {queue_name}: {e}")
+            return None
 
     def push_message(self, queue_name: str, message: schemas.Message) -> schemas.Message:
         """
         Actual SQS logic for pushing a message to a queue
         """
-        message_data = {"MessageBody": json.dumps(message.model_dump())}
-        if queue_name.endswith('.fifo'):
-            message_data["MessageGroupId"] = message.body.id
-        self.find_queue_by_name(queue_name).send_message(**message_data)
+        self.send_message(queue_name, message)
         return message
 
+    def push_messages(self, queue_name: str, messages: List[schemas.Message]) -> List[schemas.Message]:
+        """
+        Push messages with SendMessageBatch. Entries SQS failed on its side, and batches whose
+        request failed, are retried, up to SEND_MAX_ATTEMPTS in all; returns the messages that
+        could not be sent, including any over the SQS size limit, which are never attempted.
+        """
+        entries, unsent, pending = {}, [], []
+        for idx, message in enumerate(messages):
+            entry = {"Id": str(idx), "MessageBody": json.dumps(message.model_dump())}
+            if queue_name.endswith('.fifo'):
+                entry["MessageGroupId"] = message.body.id
+            entries[idx] = entry
+            if len(entry["MessageBody"].encode("utf-8")) > SQS_MAX_BATCH_BYTES:
+                logger.warning(f"Message {idx} for {queue_name} is over the SQS limit of {SQS_MAX_BATCH_BYTES} bytes")
+                unsent.append(idx)
+            else:
+                pending.append(idx)
+        for attempt in range(SEND_MAX_ATTEMPTS):
+            retry = []
+            for batch in self.batch_send_entries([entries[idx] for idx in pending]):
+                try:
+                    response = self.with_queue(queue_name, lambda queue: queue.send_message_batch(Entries=batch))
+                except botocore.exceptions.ClientError as e:
+                    # Earlier batches were sent, so raising here would duplicate them on a retry.
+                    logger.warning(f"Sending {len(batch)} messages to {queue_name} failed: {e}")
+                    retry += [int(entry["Id"]) for entry in batch]
+                    continue
+                for failure in response.get("Failed", []):
+                    idx = int(failure["Id"])
+                    logger.warning(f"Sending message {idx} to {queue_name} failed: {failure.get('Code')} {failure.get('Message')}")
+                    # Sender faults, such as an oversized body, fail the same way every time.
+                    (unsent if failure.get("SenderFault") else retry).append(idx)
+            pending = retry
+            if not pending:
+                break
+            time.sleep(0.1 * 2 ** attempt)
+        unsent += pending
+        if unsent:
+            logger.error(f"Could not send {len(unsent)} of {len(messages)} messages to {queue_name}")
+        return [messages[idx] for idx in sorted(unsent)]
+
+    @staticmethod
+    def batch_send_entries(entries: List[Dict]) -> List[List[Dict]]:
+        """
+        Split SendMessageBatch entries into batches within SQS_MAX_BATCH_SIZE entries and SQS_MAX_BATCH_BYTES.
+        """
+        batches, batch, batch_bytes = [], [], 0
+        for entry in entries:
+            entry_bytes = len(entry["MessageBody"].encode("utf-8"))
+            if batch and (len(batch) == SQS_MAX_BATCH_SIZE or batch_bytes + entry_bytes > SQS_MAX_BATCH_BYTES):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(entry)
+            batch_bytes += entry_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
     def push_to_dead_letter_queue(self, message: schemas.Message):
         """
         Push a message to the dead letter queue.
         """
         dlq_name = Queue.get_dead_letter_queue_name()
-        self.push_message(dlq_name, message)
\ No newline at end of file
+        self.push_message(dlq_name, message)
+
+os.register_at_fork(after_in_child=Queue.reset_after_fork)
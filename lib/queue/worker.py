@@ -1,18 +1,33 @@
 import os
+import queue
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import json
-from typing import List, Tuple, Any
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple, Any, Optional
 from lib import schemas
 from lib.logger import logger
-from lib.queue.queue import Queue, MAX_RETRIES
+from lib.queue.queue import Queue, MAX_RETRIES, DEFAULT_VISIBILITY_TIMEOUT_SECONDS
 from lib.model.model import Model
+from lib.queue.batching import AdaptiveBatchSizer
+from lib.queue.execution import ExecutionEngine
 from lib.sentry import capture_custom_message
 from lib.helpers import get_environment_setting
-from lib.telemetry import OpenTelemetryExporter
+from lib.telemetry import OPEN_TELEMETRY_EXPORTER
 
 TIMEOUT_SECONDS = int(os.getenv("WORK_TIMEOUT_SECONDS", "60"))
-OPEN_TELEMETRY_EXPORTER = OpenTelemetryExporter(service_name="QueueWorkerService", local_debug=False)
+# Batches of media to receive and download ahead of the one being hashed; 0 disables the
+# prefetch pipeline. Prefetched messages are kept invisible on the queue by the visibility
+# heartbeat while they wait, so a larger value only costs memory and tempfile space.
+PREFETCH_BATCHES = int(os.getenv("PREFETCH_BATCHES", "0"))
+PREFETCH_THREADS = int(os.getenv("PREFETCH_THREADS", "8"))
+# How long the hashing side waits for a prefetched batch before its loop comes round empty,
+# as an unprefetched worker's receive long poll does, so an idle worker keeps its heartbeat.
+PREFETCH_WAIT_SECONDS = 20
+# Latency models with a MIN_BATCH_SIZE aim their batches at, well inside WORK_TIMEOUT_SECONDS.
+BATCH_TARGET_SECONDS = float(os.getenv("BATCH_TARGET_SECONDS", str(TIMEOUT_SECONDS / 4)))
+QUEUE_DEPTH_REFRESH_SECONDS = float(os.getenv("QUEUE_DEPTH_REFRESH_SECONDS", "10"))
 
 class QueueWorker(Queue):
     @classmethod
@@ -40,6 +55,21 @@ class QueueWorker(Queue):
         self.output_queues = self.get_or_create_queue(self.output_queue_name)
         self.dead_letter_queues = self.get_or_create_queue(self.dlq_queue_name)
         self.all_queues = self.store_queue_map([item for row in [self.input_queues, self.output_queues, self.dead_letter_queues] for item in row])
+        self.prefetcher = None
+        self.prefetched_batches = None
+        self.prefetch_executor = None
+        self.prefetch_stopped = threading.Event()
+        self.execution_engine = None
+        # Passed to the ExecutionEngine, which calls it with the pid of each execution child.
+        self.on_execution_process: Optional[Callable[[int], None]] = None
+        self.batch_sizer = None
+        self.queue_depth = None
+        self.queue_depth_checked_at = 0.0
+        # Receipt handle -> (message, queue name) of the messages of the batch being executed.
+        self.in_flight: Dict[str, Tuple[Any, str]] = {}
+        self.in_flight_lock = threading.Lock()
+        self.heartbeat = None
+        self.heartbeat_stopped = threading.Event()
         logger.info(f"Worker listening to queues of {self.all_queues}")
 
     def process(self, model: Model):
@@ -47,29 +77,229 @@ class QueueWorker(Queue):
         Main routine. Given a model, in a loop, read tasks from input_queue_name,
         pass messages to model to respond (i.e. fingerprint) them, then pass responses to output queue.
         If failures happen at any point, resend failed messages to input queue.
+        Returns the responses pushed to the output queue.
         """
         responses = self.safely_respond(model)
         if responses:
             for response in responses:
                 logger.info(f"Processing message of: ({response})")
-                self.push_message(self.output_queue_name, response)
+            unsent = self.push_messages(self.output_queue_name, responses)
+            if unsent:
+                self.dead_letter_unsent_responses(unsent)
+        return responses
+
+    def dead_letter_unsent_responses(self, responses: List[schemas.Message]):
+        """
+        Their inputs are already deleted, so responses that could not be sent to the output queue
+        go to the dead letter queue rather than being dropped. Any the dead letter queue refuses
+        too, such as results over the SQS size limit, are reported as lost.
+        """
+        logger.error(f"Moving {len(responses)} unsent responses to {self.dlq_queue_name}")
+        for response in self.push_messages(self.dlq_queue_name, responses):
+            QueueWorker.log_and_handle_error(f"Response {response.body.id} could not be sent to {self.output_queue_name} or {self.dlq_queue_name}")
 
     def safely_respond(self, model: Model) -> List[schemas.Message]:
         """
         Rescue against failures when attempting to respond (i.e. fingerprint) from models.
         Return responses if no failure.
         """
-        messages_with_queues = self.receive_messages(model.BATCH_SIZE)
-        if not messages_with_queues:
-            return []
-        messages = self.extract_messages(messages_with_queues, model)
-        responses, success = self.execute_with_timeout(model, messages, timeout_seconds=TIMEOUT_SECONDS)
+        if self.uses_prefetch(model):
+            # Prefetched batches have been on the heartbeat since they were received.
+            messages_with_queues, messages = self.receive_prefetched_batch(model)
+            if not messages_with_queues:
+                return []
+        else:
+            messages_with_queues = self.receive_messages(self.get_batch_size(model))
+            if not messages_with_queues:
+                return []
+            messages = self.extract_messages(messages_with_queues, model)
+            self.track_in_flight(messages_with_queues)
+        try:
+            start_time = time.time()
+            responses, success = self.execute_with_timeout(model, messages, timeout_seconds=TIMEOUT_SECONDS)
+            self.record_batch(model, len(messages), time.time() - start_time, success)
+        finally:
+            self.untrack_in_flight(messages_with_queues)
+        if self.uses_prefetch(model):
+            model.release_prefetched(messages)
         if success:
             self.delete_processed_messages(messages_with_queues)
         else:
             self.increment_message_error_counts(messages_with_queues)
         return responses
 
+    def track_in_flight(self, messages_with_queues: List[Tuple]):
+        """
+        Hand a batch to the visibility heartbeat, starting its thread on first use.
+        """
+        with self.in_flight_lock:
+            for message, queue_name in messages_with_queues:
+                self.in_flight[message.receipt_handle] = (message, queue_name)
+        if self.heartbeat is None:
+            self.heartbeat = threading.Thread(target=self.heartbeat_loop, daemon=True)
+            self.heartbeat.start()
+
+    def untrack_in_flight(self, messages_with_queues: List[Tuple]):
+        """
+        Take a batch off the heartbeat before it is deleted or failed. Waits for an extension
+        in progress, so none is sent for an already deleted message.
+        """
+        with self.in_flight_lock:
+            for message, queue_name in messages_with_queues:
+                self.in_flight.pop(message.receipt_handle, None)
+
+    def heartbeat_loop(self):
+        """
+        Wake every quarter visibility timeout and extend the in-flight messages that have less
+        than half of it left, so a long video or audio job is never handed to a second worker.
+        """
+        while not self.heartbeat_stopped.wait((self.visibility_timeout or DEFAULT_VISIBILITY_TIMEOUT_SECONDS) / 4):
+            try:
+                self.extend_in_flight()
+            except Exception as e:
+                QueueWorker.log_and_handle_error(str(e))
+
+    def extend_in_flight(self):
+        timeout_seconds = self.visibility_timeout or DEFAULT_VISIBILITY_TIMEOUT_SECONDS
+        with self.in_flight_lock:
+            due = defaultdict(list)
+            for message, queue_name in self.in_flight.values():
+                remaining = self.visibility_remaining(message)
+                if remaining is not None and remaining <= timeout_seconds / 2:
+                    due[queue_name].append(message)
+            for queue_name, messages in due.items():
+                logger.info(f"Extending visibility of {len(messages)} in-flight messages on {queue_name} by {timeout_seconds}s")
+                self.extend_visibility(queue_name, messages, timeout_seconds)
+
+    def stop_heartbeat(self):
+        self.heartbeat_stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+
+    def get_batch_sizer(self, model: Model) -> Optional[AdaptiveBatchSizer]:
+        """
+        The batch size controller for model, or None when the model declares a fixed BATCH_SIZE
+        (no MIN_BATCH_SIZE below it).
+        """
+        min_size = getattr(model, "MIN_BATCH_SIZE", None)
+        if min_size is None or min_size >= model.BATCH_SIZE:
+            return None
+        if self.batch_sizer is None:
+            self.batch_sizer = AdaptiveBatchSizer(min_size, model.BATCH_SIZE, BATCH_TARGET_SECONDS)
+        return self.batch_sizer
+
+    def get_batch_size(self, model: Model) -> int:
+        """
+        Number of messages to receive for the next batch of model.
+        """
+        batch_sizer = self.get_batch_sizer(model)
+        return batch_sizer.size if batch_sizer else model.BATCH_SIZE
+
+    def get_queue_depth(self) -> Optional[int]:
+        """
+        Approximate backlog of the input queue, asked of SQS at most every QUEUE_DEPTH_REFRESH_SECONDS.
+        """
+        if time.time() - self.queue_depth_checked_at >= QUEUE_DEPTH_REFRESH_SECONDS:
+            self.queue_depth = self.get_approximate_depth(self.input_queue_name)
+            self.queue_depth_checked_at = time.time()
+        return self.queue_depth
+
+    def record_batch(self, model: Model, count: int, seconds: float, success: bool):
+        """
+        Feed a batch's execution time to the batch size controller and export the chosen size.
+        A failed batch only counts when it was slow, so quick errors never grow the batch.
+        """
+        batch_sizer = self.get_batch_sizer(model)
+        if batch_sizer is None or (not success and seconds <= BATCH_TARGET_SECONDS):
+            return
+        previous_size = batch_sizer.size
+        batch_size = batch_sizer.record(count, seconds, self.get_queue_depth())
+        if batch_size != previous_size:
+            logger.info(f"Batch size for {model.model_name} changed from {previous_size} to {batch_size} after {count} messages in {seconds:.2f}s")
+        OPEN_TELEMETRY_EXPORTER.log_batch_size(model.model_name, batch_size)
+
+    @staticmethod
+    def uses_prefetch(model: Model) -> bool:
+        return PREFETCH_BATCHES > 0 and bool(getattr(model, "MEDIA_DOWNLOAD", None))
+
+    def receive_prefetched_batch(self, model: Model) -> Tuple[List[Tuple], List[schemas.Message]]:
+        """
+        Take the next batch whose media has already been downloaded, starting the prefetch
+        thread on first use. Time spent waiting here means hashing outpaces downloading.
+        Returns an empty batch if none is ready within PREFETCH_WAIT_SECONDS.
+        """
+        if self.prefetcher is None:
+            self.prefetched_batches = queue.Queue(maxsize=PREFETCH_BATCHES)
+            self.prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_THREADS)
+            self.prefetcher = threading.Thread(target=self.prefetch_loop, args=(model,), daemon=True)
+            self.prefetcher.start()
+        start_time = time.time()
+        try:
+            batch = self.prefetched_batches.get(timeout=PREFETCH_WAIT_SECONDS)
+        except queue.Empty:
+            return [], []
+        QueueWorker.log_execution_time(f"{model.model_name}.prefetch_wait", time.time() - start_time)
+        return batch
+
+    def prefetch_loop(self, model: Model):
+        """
+        Producer side of the pipeline: receive and download batches until the bounded
+        prefetched_batches queue is full, then block until the hashing side takes one.
+        Once stopped, batches that were never handed over are discarded.
+        """
+        while not self.prefetch_stopped.is_set():
+            messages_with_queues, messages = self.prefetch_batch(model)
+            while messages_with_queues:
+                if self.prefetch_stopped.is_set():
+                    self.discard_prefetched(model, messages_with_queues, messages)
+                    break
+                try:
+                    self.prefetched_batches.put((messages_with_queues, messages), timeout=1)
+                    break
+                except queue.Full:
+                    continue
+        while not self.prefetched_batches.empty():
+            self.discard_prefetched(model, *self.prefetched_batches.get())
+
+    def discard_prefetched(self, model: Model, messages_with_queues: List[Tuple], messages: List[schemas.Message]):
+        """
+        Drop a prefetched batch without processing it: its messages come off the heartbeat and
+        become visible again when their visibility timeout runs out.
+        """
+        self.untrack_in_flight(messages_with_queues)
+        model.release_prefetched(messages)
+
+    def stop_prefetch(self):
+        """
+        Stop the prefetch thread, discarding the batches it already received.
+        """
+        self.prefetch_stopped.set()
+        if self.prefetcher is not None:
+            self.prefetcher.join()
+            self.prefetch_executor.shutdown()
+
+    def prefetch_batch(self, model: Model) -> Tuple[List[Tuple], List[schemas.Message]]:
+        """
+        Receive one batch and download its media on the prefetch thread pool. The batch goes
+        on the visibility heartbeat as soon as it is received, as it may wait behind the batch
+        being hashed for longer than the visibility timeout.
+        """
+        messages_with_queues = []
+        try:
+            messages_with_queues = self.receive_messages(self.get_batch_size(model))
+            if not messages_with_queues:
+                return [], []
+            self.track_in_flight(messages_with_queues)
+            messages = self.extract_messages(messages_with_queues, model)
+            start_time = time.time()
+            model.prefetch(messages, self.prefetch_executor)
+            QueueWorker.log_execution_time(f"{model.model_name}.prefetch", time.time() - start_time)
+            return messages_with_queues, messages
+        except Exception as e:
+            QueueWorker.log_and_handle_error(str(e))
+            self.untrack_in_flight(messages_with_queues)
+            return [], []
+
     @staticmethod
     def extract_messages(messages_with_queues: List[Tuple], model: Model) -> List[schemas.Message]:
         """
@@ -84,11 +314,21 @@ class QueueWorker(Queue):
         return [schemas.parse_input_message({**json.loads(message.body), **{"model_name": model.model_name}})
                 for message, queue in messages_with_queues]
 
-    @staticmethod
-    def execute_with_timeout(model, args, timeout_seconds: int) -> List[schemas.Message]:
+    def get_execution_engine(self, model: Model) -> ExecutionEngine:
+        """
+        The worker's long-lived execution engine for model, kept across batches.
+        """
+        if self.execution_engine is None or self.execution_engine.model is not model:
+            if self.execution_engine is not None:
+                self.execution_engine.shutdown()
+            self.execution_engine = ExecutionEngine(model, on_process=self.on_execution_process)
+        return self.execution_engine
+
+    def execute_with_timeout(self, model, args, timeout_seconds: int) -> List[schemas.Message]:
         """
         Executes a given hasher/fingerprinter with a specified timeout. If the hasher/fingerprinter execution time exceeds the timeout,
-        logs an error and returns an empty list.
+        logs an error and returns an empty list. Execution happens on the worker's ExecutionEngine, so a timed out batch
+        does not hold up the next one.
 
         Parameters:
         - model (callable): The model to execute a respond request upon.
@@ -100,15 +340,16 @@ class QueueWorker(Queue):
         """
         start_time = time.time()
         try:
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(model.respond, args)
-                result = future.result(timeout=timeout_seconds)
-                execution_time = time.time() - start_time
-                QueueWorker.log_execution_time(model.model_name, execution_time)
-                QueueWorker.log_execution_status(model.model_name, "successful_message_response")
-                return result, True
+            result = self.get_execution_engine(model).run(args, timeout_seconds)
+            execution_time = time.time() - start_time
+            QueueWorker.log_execution_time(model.model_name, execution_time)
+            QueueWorker.log_execution_status(model.model_name, "successful_message_response")
+            return result, True
         except TimeoutError:
             error_message = "Model respond timeout exceeded."
+            abandoned = self.execution_engine.abandoned_threads() if self.execution_engine else 0
+            if abandoned:
+                error_message += f" {abandoned} abandoned respond threads are still running."
             QueueWorker.log_and_handle_error(error_message)
             QueueWorker.log_execution_status(model.model_name, "timeout_message_response")
             return [], False
@@ -163,10 +404,12 @@ class QueueWorker(Queue):
     def increment_message_error_counts(self, messages_with_queues: List[Tuple]):
         """
         Increment the error count for messages and push them back to the queue or to the dead letter queue if retries exceed the limit.
+        Pushes are batched per queue, and only messages whose push went through are deleted, so the rest become visible again.
 
         Parameters:
         - messages_with_queues (List[Tuple]): A list of tuples, each containing a message and its corresponding queue.
         """
+        dead_letters, retries = [], []
         for message, queue in messages_with_queues:
             message_body = json.loads(message.body)
             retry_count = message_body.get('retry_count', 0) + 1
@@ -174,9 +417,15 @@ class QueueWorker(Queue):
             if retry_count > MAX_RETRIES:
                 logger.info(f"Message {message_body} exceeded max retries. Moving to DLQ.")
                 capture_custom_message("Message exceeded max retries. Moving to DLQ.", 'info', {"message_body": message_body})
-                self.push_to_dead_letter_queue(schemas.parse_input_message(message_body))
+                dead_letters.append((schemas.parse_input_message(message_body), (message, queue)))
             else:
                 updated_message = schemas.parse_input_message(message_body)
                 updated_message.retry_count = retry_count
-                queue.delete_messages(Entries=[self.delete_message_entry(message)])
-                self.push_message(self.input_queue_name, updated_message)
+                retries.append((updated_message, (message, queue)))
+        pushed = []
+        for queue_name, pushes in ((Queue.get_dead_letter_queue_name(), dead_letters), (self.input_queue_name, retries)):
+            if pushes:
+                unsent = {id(message) for message in self.push_messages(queue_name, [message for message, original in pushes])}
+                pushed += [original for message, original in pushes if id(message) not in unsent]
+        if pushed:
+            self.delete_messages(pushed)
@@ -0,0 +1,192 @@
+import gc
+import json
+import multiprocessing
+import os
+import signal
+import time
+from typing import Dict, List, Optional
+
+from lib.logger import logger
+from lib.model.model import Model
+from lib.queue.worker import QueueWorker, TIMEOUT_SECONDS
+
+NUM_WORKERS = int(os.getenv("NUM_WORKERS", "1"))
+# A child restarting sooner than this after its last start is crash-looping and is backed off.
+SUPERVISOR_MIN_UPTIME_SECONDS = float(os.getenv("SUPERVISOR_MIN_UPTIME_SECONDS", "10"))
+SUPERVISOR_MAX_BACKOFF_SECONDS = float(os.getenv("SUPERVISOR_MAX_BACKOFF_SECONDS", "30"))
+# A child whose loop has not come round for this long is considered hung and restarted. One
+# loop is a receive long poll, a batch bounded by WORK_TIMEOUT_SECONDS and the sends, so the
+# default is the work timeout plus a margin for the rest (and for a process-mode execution
+# child loading its model).
+SUPERVISOR_HEARTBEAT_MARGIN_SECONDS = float(os.getenv("SUPERVISOR_HEARTBEAT_MARGIN_SECONDS", "120"))
+SUPERVISOR_HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("SUPERVISOR_HEARTBEAT_TIMEOUT_SECONDS", str(TIMEOUT_SECONDS + SUPERVISOR_HEARTBEAT_MARGIN_SECONDS)))
+SUPERVISOR_REPORT_SECONDS = float(os.getenv("SUPERVISOR_REPORT_SECONDS", "60"))
+SUPERVISOR_STATUS_FILE = os.getenv("SUPERVISOR_STATUS_FILE", "")
+
+# Per-child counters in shared memory: batches, messages, last heartbeat (epoch seconds) and
+# the pid of the child's process-mode execution child (0 when it has none).
+BATCHES, MESSAGES, HEARTBEAT, EXECUTION_PID = range(4)
+
+class ChildState:
+    def __init__(self, index: int, context):
+        self.index = index
+        self.counters = context.Array("d", 4)
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 0.0
+        self.restart_at = 0.0
+        self.reported = (0.0, 0.0, time.time())
+
+class WorkerSupervisor:
+    """
+    Runs NUM_WORKERS queue workers as forked children of one process. The model is loaded once,
+    before forking, so its weights are shared copy-on-write instead of loaded per worker.
+    Children that exit are restarted straight away, with exponential backoff only when they
+    keep dying within SUPERVISOR_MIN_UPTIME_SECONDS. Children whose heartbeat goes stale are
+    killed and restarted. Per-child health and throughput are logged every
+    SUPERVISOR_REPORT_SECONDS and, if SUPERVISOR_STATUS_FILE is set, written there as JSON.
+    """
+    def __init__(self, model: Model, num_workers: int = NUM_WORKERS):
+        self.model = model
+        self.context = multiprocessing.get_context("fork")
+        self.children = [ChildState(index, self.context) for index in range(num_workers)]
+        self.stopping = False
+
+    @staticmethod
+    def run_worker(model: Model, counters) -> None:
+        """
+        Body of a child: the same loop as run_worker.py, counting batches and messages.
+        """
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        queue = QueueWorker.create()
+        queue.on_execution_process = lambda pid: counters.__setitem__(EXECUTION_PID, pid)
+        while True:
+            counters[HEARTBEAT] = time.time()
+            responses = queue.process(model)
+            if responses:
+                counters[BATCHES] += 1
+                counters[MESSAGES] += len(responses)
+
+    @staticmethod
+    def kill_execution_process(child: ChildState) -> None:
+        """
+        Kill the process group of child's execution child. It leads a group of its own, so
+        killing the worker does not take it, or any process the model started, down with it.
+        """
+        pid = int(child.counters[EXECUTION_PID])
+        if pid:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            child.counters[EXECUTION_PID] = 0
+
+    def start_child(self, child: ChildState) -> None:
+        child.counters[HEARTBEAT] = time.time()
+        child.counters[EXECUTION_PID] = 0
+        child.process = self.context.Process(
+            target=self.run_worker, args=(self.model, child.counters), name=f"worker-{child.index}"
+        )
+        child.process.start()
+        child.started_at = time.time()
+        logger.info(f"Started worker-{child.index} as pid {child.process.pid}")
+
+    def check_child(self, child: ChildState, now: float) -> None:
+        """
+        Restart child if it exited or hung, backing off when it is crash-looping.
+        """
+        if child.process is not None and child.process.is_alive():
+            if now - child.counters[HEARTBEAT] <= SUPERVISOR_HEARTBEAT_TIMEOUT_SECONDS:
+                return
+            logger.error(f"worker-{child.index} (pid {child.process.pid}) missed its heartbeat, killing it")
+            child.process.kill()
+        if child.process is not None:
+            child.process.join()
+            self.kill_execution_process(child)
+            logger.error(f"worker-{child.index} (pid {child.process.pid}) exited with {child.process.exitcode}")
+            if now - child.started_at < SUPERVISOR_MIN_UPTIME_SECONDS:
+                child.backoff = min(max(child.backoff * 2, 1.0), SUPERVISOR_MAX_BACKOFF_SECONDS)
+            else:
+                child.backoff = 0.0
+            child.restart_at = now + child.backoff
+            child.restarts += 1
+            child.process = None
+        if now >= child.restart_at:
+            self.start_child(child)
+
+    def status(self, now: float) -> List[Dict]:
+        """
+        Health and throughput of each child since the previous status call.
+        """
+        report = []
+        for child in self.children:
+            batches, messages = child.counters[BATCHES], child.counters[MESSAGES]
+            last_batches, last_messages, last_time = child.reported
+            elapsed = max(now - last_time, 1e-9)
+            alive = child.process is not None and child.process.is_alive()
+            report.append({
+                "worker": child.index,
+                "pid": child.process.pid if child.process is not None else None,
+                "alive": alive,
+                "restarts": child.restarts,
+                "uptime_seconds": round(now - child.started_at, 1) if alive else 0,
+                "seconds_since_heartbeat": round(now - child.counters[HEARTBEAT], 1),
+                "batches": int(batches),
+                "messages": int(messages),
+                "messages_per_second": round((messages - last_messages) / elapsed, 3),
+                "batches_per_second": round((batches - last_batches) / elapsed, 3),
+            })
+            child.reported = (batches, messages, now)
+        return report
+
+    def report(self, now: float) -> None:
+        report = self.status(now)
+        for entry in report:
+            logger.info(f"Supervisor status: {json.dumps(entry)}")
+        if SUPERVISOR_STATUS_FILE:
+            temp_name = f"{SUPERVISOR_STATUS_FILE}.tmp"
+            with open(temp_name, "w") as f:
+                json.dump({"time": now, "workers": report}, f)
+            os.replace(temp_name, SUPERVISOR_STATUS_FILE)
+
+    def stop(self, *args) -> None:
+        self.stopping = True
+
+    def shutdown(self) -> None:
+        for child in self.children:
+            if child.process is not None and child.process.is_alive():
+                child.process.terminate()
+        for child in self.children:
+            if child.process is not None:
+                child.process.join(10)
+                if child.process.is_alive():
+                    child.process.kill()
+                    child.process.join()
+                self.kill_execution_process(child)
+
+    def run(self, poll_seconds: float = 1.0, max_seconds: Optional[float] = None) -> None:
+        """
+        Start the children and supervise them until SIGTERM/SIGINT (or max_seconds, for tests).
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # Objects created so far (the model above all) are never collected, so the garbage
+        # collector does not touch, and thereby copy, their pages in the children.
+        gc.freeze()
+        started = time.time()
+        last_report = started
+        try:
+            while not self.stopping:
+                now = time.time()
+                for child in self.children:
+                    self.check_child(child, now)
+                if now - last_report >= SUPERVISOR_REPORT_SECONDS:
+                    self.report(now)
+                    last_report = now
+                if max_seconds is not None and now - started >= max_seconds:
+                    break
+                time.sleep(poll_seconds)
+        finally:
+            self.shutdown()
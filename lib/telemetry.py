@@ -84,6 +84,32 @@ class OpenTelemetryExporter:
             unit="s",
             description="Returned non-cached response"
         )
+        self.downloaded_bytes = self.meter.create_counter(
+            name="downloaded_bytes",
+            unit="By",
+            description="Bytes of media downloaded"
+        )
+        self.download_throughput_gauge = self.meter.create_gauge(
+            name="download_throughput",
+            unit="By/s",
+            description="Media download throughput"
+        )
+        self.batch_size_gauge = self.meter.create_gauge(
+            name="batch_size",
+            unit="{message}",
+            description="Batch size chosen by the worker"
+        )
+
+        self.cache_lookups = self.meter.create_counter(
+            name="cache_lookups",
+            unit="{lookup}",
+            description="Cache lookups by tier and result"
+        )
+        self.cache_evictions = self.meter.create_counter(
+            name="cache_evictions",
+            unit="{entry}",
+            description="Entries evicted from a cache tier to stay within its bounds"
+        )
 
     def log_execution_time(self, func_name: str, execution_time: float):
         env_name = os.getenv("DEPLOY_ENV", "development")
@@ -92,3 +118,29 @@ class OpenTelemetryExporter:
     def log_execution_status(self, func_name: str, function_name: str):
         env_name = os.getenv("DEPLOY_ENV", "development")
         getattr(self, function_name).add(1, {"function_name": func_name, "env": env_name})
+
+    def log_download(self, model_name: str, num_bytes: int, seconds: float):
+        env_name = os.getenv("DEPLOY_ENV", "development")
+        attributes = {"model_name": model_name, "env": env_name}
+        self.downloaded_bytes.add(num_bytes, attributes)
+        if seconds > 0:
+            self.download_throughput_gauge.set(num_bytes / seconds, attributes)
+
+    def log_batch_size(self, model_name: str, batch_size: int):
+        env_name = os.getenv("DEPLOY_ENV", "development")
+        self.batch_size_gauge.set(batch_size, {"model_name": model_name, "env": env_name})
+
+    def log_cache_lookups(self, tier: str, hits: int, misses: int, namespace: str = ""):
+        env_name = os.getenv("DEPLOY_ENV", "development")
+        if hits:
+            self.cache_lookups.add(hits, {"tier": tier, "result": "hit", "namespace": namespace, "env": env_name})
+        if misses:
+            self.cache_lookups.add(misses, {"tier": tier, "result": "miss", "namespace": namespace, "env": env_name})
+
+    def log_cache_evictions(self, tier: str, count: int, namespace: str = ""):
+        env_name = os.getenv("DEPLOY_ENV", "development")
+        self.cache_evictions.add(count, {"tier": tier, "namespace": namespace, "env": env_name})
+
+# Shared by every module of the worker: metrics.set_meter_provider only takes effect once per
+# process, so a second exporter would just log an override warning and start another reader.
+OPEN_TELEMETRY_EXPORTER = OpenTelemetryExporter(service_name="QueueWorkerService", local_debug=False)
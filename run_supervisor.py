@@ -0,0 +1,10 @@
+from lib.model.model import Model
+from lib.logger import logger
+from lib.sentry import sentry_sdk
+from lib.supervisor import WorkerSupervisor, NUM_WORKERS
+
+if __name__ == "__main__":
+    model = Model.create()
+
+    logger.info(f"Starting {NUM_WORKERS} workers...")
+    WorkerSupervisor(model).run()
@@ -5,10 +5,13 @@ from lib.queue.worker import QueueWorker
 from lib.model.model import Model
 from lib.logger import logger
 from lib.sentry import sentry_sdk
-queue = QueueWorker.create()
+# Guarded so that processes spawned for RESPOND_EXECUTOR="process" can import this module.
+if __name__ == "__main__":
+    queue = QueueWorker.create()
 
-model = Model.create()
+    model = Model.create()
+
+    logger.info("Beginning work loop...")
+    while True:
+        queue.process(model)
 
-logger.info("Beginning work loop...")
-while True:
-    queue.process(model)
@@ -5,20 +5,16 @@ if [ "$ROLE" != "worker" ]; then
   uvicorn main:app --host 0.0.0.0 --port ${PRESTO_PORT}
 
 else
-  # Start worker processes in background
-  NUM_WORKERS=${NUM_WORKERS:-1}  # Default to 1 worker if not specified
-
-  for i in $(seq 1 $NUM_WORKERS)
-  do
-    (
-      while true; do
-        echo "Starting run_worker.py instance $i..."
-        python run_worker.py worker-$i
-        echo "run_worker.py instance $i exited. Restarting..."
-        sleep 30  # Prevent potential rapid restart loop
-      done
-    ) &  # Run workers as background processes
-  done
+  # Load the model once and fork NUM_WORKERS (default 1) workers from it, restarting any that exit.
+  # The supervisor itself is restarted if it dies, as the processor below keeps the container up.
+  (
+    while true; do
+      echo "Starting run_supervisor.py..."
+      python run_supervisor.py
+      echo "run_supervisor.py exited. Restarting..."
+      sleep 30  # Prevent potential rapid restart loop
+    done
+  ) &
 
   # Start the processor process in the foreground
   python run_processor.py
@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import MagicMock, patch
-import urllib.request
 from lib.model.audio import Model
+from lib.model.model import DOWNLOAD_TIMEOUT_SECONDS
 import acoustid
 from acoustid import FingerprintGenerationError
 
@@ -11,44 +11,38 @@ class TestAudio(unittest.TestCase):
     def setUp(self):
         self.audio_model = Model()
 
-    @patch('urllib.request.urlopen')
-    @patch('urllib.request.Request')
+    @patch('lib.http_client.HTTPClient.stream')
     @patch('acoustid.fingerprint_file')
-    def test_process_audio_success(self, mock_fingerprint_file, mock_request, mock_urlopen):
+    def test_process_audio_success(self, mock_fingerprint_file, mock_stream):
         mock_fingerprint_file.return_value = FINGERPRINT_RESPONSE
-        mock_request.return_value = mock_request
 
         # Use the `with` statement for proper file handling
         with open("data/test-audio.mp3", 'rb') as f:
             contents = f.read()
 
-        mock_urlopen.return_value = MagicMock(read=MagicMock(return_value=contents))
+        mock_stream.return_value.__enter__.return_value = MagicMock(status_code=200, headers={}, iter_bytes=MagicMock(return_value=iter([contents])))
 
         audio = schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://example.com/callback", "url": "https://example.com/audio.mp3"}, "model_name": "audio__Model"})
         result = self.audio_model.process(audio)
-        mock_request.assert_called_once_with(audio.body.url, headers={'User-Agent': 'Mozilla/5.0'})
-        mock_urlopen.assert_called_once_with(mock_request)
+        mock_stream.assert_called_once_with(audio.body.url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=DOWNLOAD_TIMEOUT_SECONDS)
         self.assertEqual(dict, type(result))
 
-    @patch('urllib.request.urlopen')
-    @patch('urllib.request.Request')
+    @patch('lib.http_client.HTTPClient.stream')
     @patch('acoustid.fingerprint_file')
     @patch('acoustid.chromaprint.decode_fingerprint')
     def test_process_audio_failure(self, mock_decode_fingerprint, mock_fingerprint_file,
-                                      mock_request, mock_urlopen):
+                                      mock_stream):
         mock_fingerprint_file.side_effect = FingerprintGenerationError("Failed to generate fingerprint")
-        mock_request.return_value = mock_request
 
         # Use the `with` statement for proper file handling
         with open("data/test-audio.mp3", 'rb') as f:
             contents = f.read()
 
-        mock_urlopen.return_value = MagicMock(read=MagicMock(return_value=contents))
+        mock_stream.return_value.__enter__.return_value = MagicMock(status_code=200, headers={}, iter_bytes=MagicMock(return_value=iter([contents])))
 
         audio = schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://example.com/callback", "url": "https://example.com/audio.mp3"}, "model_name": "audio__Model"})
         result = self.audio_model.process(audio)
-        mock_request.assert_called_once_with(audio.body.url, headers={'User-Agent': 'Mozilla/5.0'})
-        mock_urlopen.assert_called_once_with(mock_request)
+        mock_stream.assert_called_once_with(audio.body.url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=DOWNLOAD_TIMEOUT_SECONDS)
         self.assertEqual({'hash_value': []}, result)
 
 if __name__ == '__main__':
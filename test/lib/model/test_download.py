@@ -0,0 +1,167 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+
+from lib import schemas
+from lib.base_exception import PrestoBaseException
+from lib.model.model import Model
+
+CONTENT = os.urandom(300 * 1024)
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """
+    Serves CONTENT, honouring "Range: bytes=N-" when the server supports ranges. When
+    drop_after is set, the first response is cut off after that many bytes.
+    """
+    supports_ranges = True
+    drop_after = None
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(self.headers.get("Range"))
+        start = 0
+        range_header = self.headers.get("Range")
+        if self.supports_ranges and range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        else:
+            self.send_response(200)
+        if self.supports_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(CONTENT) - start))
+        self.end_headers()
+        body = CONTENT[start:]
+        if type(self).drop_after is not None:
+            body = body[:type(self).drop_after]
+            type(self).drop_after = None
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestDownload(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/media.mp4"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        MediaHandler.supports_ranges = True
+        MediaHandler.drop_after = None
+        MediaHandler.requests = []
+        self.model = Model()
+
+    @patch('lib.model.model.DOWNLOAD_CHUNK_BYTES', 64 * 1024)
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_download_streams_in_chunks(self, mock_exporter):
+        out_file = io.BytesIO()
+        with patch.object(out_file, 'write', wraps=out_file.write) as mock_write:
+            written = self.model.download_url(self.url, out_file)
+        self.assertEqual(written, len(CONTENT))
+        self.assertEqual(out_file.getvalue(), CONTENT)
+        self.assertTrue(all(len(call.args[0]) <= 64 * 1024 for call in mock_write.call_args_list))
+        mock_exporter.log_download.assert_called_once()
+        self.assertEqual(mock_exporter.log_download.call_args.args[1], len(CONTENT))
+
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_download_over_size_limit(self, mock_exporter):
+        self.model.DOWNLOAD_MAX_BYTES = 1024
+        with self.assertRaises(PrestoBaseException) as context:
+            self.model.get_buffer_for_url(self.url)
+        self.assertEqual(context.exception.error_code, 413)
+        mock_exporter.log_download.assert_not_called()
+
+    @patch('lib.model.model.DOWNLOAD_CHUNK_BYTES', 16 * 1024)
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_download_resumes_with_range(self, mock_exporter):
+        MediaHandler.drop_after = 100 * 1024
+        buffer = self.model.get_buffer_for_url(self.url)
+        self.assertEqual(buffer.read(), CONTENT)
+        # Whole chunks received before the drop are kept; the request resumes after them.
+        self.assertEqual(MediaHandler.requests[0], None)
+        self.assertEqual(len(MediaHandler.requests), 2)
+        offset = int(MediaHandler.requests[1].split("=")[1].rstrip("-"))
+        self.assertTrue(0 < offset <= 100 * 1024)
+
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_download_without_ranges_fails_on_drop(self, mock_exporter):
+        MediaHandler.supports_ranges = False
+        MediaHandler.drop_after = 100 * 1024
+        with self.assertRaises(httpx.TransportError):
+            self.model.get_buffer_for_url(self.url)
+        self.assertEqual(MediaHandler.requests, [None])
+
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_tempfile_removed_on_failure(self, mock_exporter):
+        self.model.DOWNLOAD_MAX_BYTES = 1024
+        with tempfile.TemporaryDirectory() as temp_dir, patch('tempfile.tempdir', temp_dir):
+            with self.assertRaises(PrestoBaseException):
+                self.model.get_tempfile_for_url(self.url)
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_tempfile_for_url(self, mock_exporter):
+        path = self.model.get_tempfile_for_url(self.url)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), CONTENT)
+        os.remove(path)
+
+    def media_message(self, url):
+        return schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://example.com/callback", "url": url}, "model_name": "image__Model"})
+
+    @patch('lib.cache.Cache.get_many', side_effect=lambda keys, **policy: [None] * len(keys))
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_prefetch_buffer(self, mock_exporter, mock_cache_get):
+        self.model.MEDIA_DOWNLOAD = "buffer"
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.model.prefetch([self.media_message(self.url), self.media_message(self.url)], executor)
+        self.assertEqual(len(MediaHandler.requests), 1)
+        self.assertEqual(self.model.get_buffer_for_url(self.url).read(), CONTENT)
+        self.assertEqual(len(MediaHandler.requests), 1)
+        self.assertEqual(self.model.prefetched, {})
+
+    @patch('lib.cache.Cache.get_many', side_effect=lambda keys, **policy: [None] * len(keys))
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_prefetch_tempfile_released(self, mock_exporter, mock_cache_get):
+        self.model.MEDIA_DOWNLOAD = "tempfile"
+        message = self.media_message(self.url)
+        self.model.prefetch([message])
+        path = self.model.prefetched[self.url]
+        self.assertTrue(os.path.exists(path))
+        self.model.release_prefetched([message])
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.model.prefetched, {})
+
+    @patch('lib.cache.Cache.get_many', return_value=[{"hash_value": "cached"}])
+    def test_prefetch_skips_cached_and_text_models(self, mock_cache_get):
+        self.model.prefetch([self.media_message(self.url)])
+        self.model.MEDIA_DOWNLOAD = "buffer"
+        self.model.prefetch([self.media_message(self.url)])
+        self.assertEqual(MediaHandler.requests, [])
+
+    @patch('lib.cache.Cache.get_many', side_effect=lambda keys, **policy: [None] * len(keys))
+    @patch('lib.model.model.OPEN_TELEMETRY_EXPORTER')
+    def test_prefetch_failure_is_left_to_process(self, mock_exporter, mock_cache_get):
+        self.model.MEDIA_DOWNLOAD = "buffer"
+        self.model.DOWNLOAD_MAX_BYTES = 1024
+        self.model.prefetch([self.media_message(self.url)])
+        self.assertEqual(self.model.prefetched, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,11 +20,11 @@ class TestGenericTransformerModel(unittest.TestCase):
         self.assertEqual(vectors[0], [4, 5, 6])
         self.assertEqual(vectors[1], [7, 8, 9])
 
-    @patch('lib.cache.Cache.get_cached_result')
-    @patch('lib.cache.Cache.set_cached_result')
+    @patch('lib.cache.Cache.get_many')
+    @patch('lib.cache.Cache.set_many')
     def test_respond_with_cache(self, mock_set_cache, mock_get_cache):
         # Simulate cache hit
-        mock_get_cache.return_value = [1, 2, 3]
+        mock_get_cache.return_value = [[1, 2, 3]]
 
         query = schemas.parse_input_message({
             "body": {
@@ -40,11 +40,11 @@ class TestGenericTransformerModel(unittest.TestCase):
         self.assertEqual(response[0].body.result, [1, 2, 3])
         mock_set_cache.assert_not_called()
 
-    @patch('lib.cache.Cache.get_cached_result')
-    @patch('lib.cache.Cache.set_cached_result')
+    @patch('lib.cache.Cache.get_many')
+    @patch('lib.cache.Cache.set_many')
     def test_respond_without_cache(self, mock_set_cache, mock_get_cache):
         # Simulate cache miss
-        mock_get_cache.return_value = None
+        mock_get_cache.return_value = [None]
 
         query = schemas.parse_input_message({
             "body": {
@@ -60,7 +60,24 @@ class TestGenericTransformerModel(unittest.TestCase):
         response = self.model.respond(query)
         self.assertEqual(len(response), 1)
         self.assertEqual(response[0].body.result, [1, 2, 3])
-        mock_set_cache.assert_called_once_with(query.body.content_hash, [1, 2, 3])
+        mock_set_cache.assert_called_once_with({query.body.content_hash: [1, 2, 3]}, vector=True, **self.model.get_cache_policy())
+
+    @patch('lib.cache.Cache.get_many')
+    @patch('lib.cache.Cache.set_many')
+    def test_respond_uses_one_cache_call_per_batch(self, mock_set_cache, mock_get_cache):
+        queries = [schemas.parse_input_message({
+            "body": {"id": str(i), "callback_url": "http://example.com/callback", "text": f"text {i}"},
+            "model_name": "fptg__Model"
+        }) for i in range(3)]
+        mock_get_cache.return_value = [None, [9, 9, 9], None]
+        self.model.vectorize = MagicMock(return_value=[[1, 2, 3], [4, 5, 6]])
+
+        response = self.model.respond(queries)
+
+        mock_get_cache.assert_called_once_with([query.body.content_hash for query in queries], **self.model.get_cache_policy())
+        self.model.vectorize.assert_called_once_with(["text 0", "text 2"])
+        self.assertEqual([doc.body.result for doc in response], [[1, 2, 3], [9, 9, 9], [4, 5, 6]])
+        mock_set_cache.assert_called_once_with({queries[0].body.content_hash: [1, 2, 3], queries[2].body.content_hash: [4, 5, 6]}, vector=True, **self.model.get_cache_policy())
 
     def test_ensure_list(self):
         single_doc = schemas.parse_input_message({
@@ -79,8 +96,8 @@ class TestGenericTransformerModel(unittest.TestCase):
 
     def test_separate_cached_docs(self):
         # Mock cache
-        with patch('lib.cache.Cache.get_cached_result') as mock_cache:
-            mock_cache.side_effect = [None, [4, 5, 6]]
+        with patch('lib.cache.Cache.get_many') as mock_cache:
+            mock_cache.return_value = [None, [4, 5, 6]]
 
             docs = [
                 schemas.parse_input_message({
@@ -1,7 +1,7 @@
 import io
 import unittest
-from unittest.mock import patch, Mock
-from urllib.error import URLError
+from unittest.mock import patch, Mock, MagicMock
+import httpx
 from typing import Dict
 
 from lib.model.image import Model
@@ -18,23 +18,28 @@ class TestModel(unittest.TestCase):
         result = Model().compute_pdq(io.BytesIO(image_content))
         self.assertEqual(result, '0001110000111110101111100001110001110100001111100001011000111100101101100001000000010010101110110111110000010110010110001011111011101001100100101000101111000001000000111110100110100011110000011111111010010100010001001011111011110110100101001110011101000100')
 
-    @patch("urllib.request.urlopen")
-    def test_get_iobytes_for_image(self, mock_urlopen):
+    def test_pdq_draft_mode_setting(self):
+        self.assertIsNone(Model().pdq_hasher.draftMode)
+        with patch.dict("os.environ", {"PDQ_DRAFT_MODE": "L"}):
+            self.assertEqual(Model().pdq_hasher.draftMode, "L")
+
+    @patch("lib.http_client.HTTPClient.stream")
+    def test_get_iobytes_for_image(self, mock_stream):
         with open("img/presto_flowchart.png", "rb") as file:
             image_content = file.read()
-        mock_response = Mock()
-        mock_response.read.return_value = image_content
-        mock_urlopen.return_value = mock_response
+        mock_response = MagicMock(status_code=200, headers={})
+        mock_response.iter_bytes.return_value = iter([image_content])
+        mock_stream.return_value.__enter__.return_value = mock_response
         image = schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg"}, "model_name": "image__Model"})
         result = Model().get_iobytes_for_image(image)
         self.assertIsInstance(result, io.BytesIO)
         self.assertEqual(result.read(), image_content)
 
-    @patch("urllib.request.urlopen")
-    def test_get_iobytes_for_image_raises_error(self, mock_urlopen):
-        mock_urlopen.side_effect = URLError('test error')
+    @patch("lib.http_client.HTTPClient.stream")
+    def test_get_iobytes_for_image_raises_error(self, mock_stream):
+        mock_stream.side_effect = httpx.ConnectError('test error')
         image = schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg"}, "model_name": "image__Model"})
-        with self.assertRaises(URLError):
+        with self.assertRaises(httpx.ConnectError):
             Model().get_iobytes_for_image(image)
 
     @patch.object(Model, "get_iobytes_for_image")
@@ -46,6 +51,122 @@ class TestModel(unittest.TestCase):
         result = Model().process(image)
         self.assertEqual(result, {"hash_value": "1001"})
 
+    @patch("lib.model.model.Cache")
+    @patch.object(Model, "get_iobytes_for_image")
+    def test_respond_hashes_uncached_images_in_one_batch(self, mock_get_iobytes_for_image, mock_cache):
+        with open("img/presto_flowchart.png", "rb") as file:
+            image_content = file.read()
+        mock_get_iobytes_for_image.side_effect = lambda image: io.BytesIO(image_content)
+        mock_cache.get_many.side_effect = lambda content_hashes, **policy: [{"hash_value": "cached"} if content_hash == "seen" else None for content_hash in content_hashes]
+        messages = [
+            schemas.parse_input_message({"body": {"id": str(i), "content_hash": content_hash, "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg"}, "model_name": "image__Model"})
+            for i, content_hash in enumerate(["seen", "new1", "new2"])
+        ]
+        model = Model()
+        with patch.object(model.pdq_hasher, "fromImages", wraps=model.pdq_hasher.fromImages) as mock_batch:
+            responses = model.respond(messages)
+        mock_batch.assert_called_once()
+        self.assertEqual(len(mock_batch.call_args[0][0]), 2)
+        self.assertEqual(responses[0].body.result, {"hash_value": "cached"})
+        expected = Model().compute_pdq(io.BytesIO(image_content))
+        self.assertEqual(responses[1].body.result, {"hash_value": expected})
+        self.assertEqual(responses[2].body.result, {"hash_value": expected})
+        mock_cache.get_many.assert_called_once()
+        mock_cache.set_many.assert_called_once()
+        self.assertEqual(list(mock_cache.set_many.call_args[0][0]), ["new1", "new2"])
+
+    @patch("lib.model.model.Cache")
+    @patch.object(Model, "get_iobytes_for_image")
+    def test_respond_isolates_failures_to_the_failing_message(self, mock_get_iobytes_for_image, mock_cache):
+        with open("img/presto_flowchart.png", "rb") as file:
+            image_content = file.read()
+        mock_get_iobytes_for_image.side_effect = lambda image: io.BytesIO(b"not an image" if image.body.id == "bad" else image_content)
+        mock_cache.get_many.return_value = [None, None]
+        messages = [
+            schemas.parse_input_message({"body": {"id": id, "content_hash": id, "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg"}, "model_name": "image__Model"})
+            for id in ["good", "bad"]
+        ]
+        responses = Model().respond(messages)
+        self.assertEqual(responses[0].body.result, {"hash_value": Model().compute_pdq(io.BytesIO(image_content))})
+        self.assertIsInstance(responses[1].body.result, schemas.ErrorResponse)
+        self.assertEqual(responses[1].body.result.error_code, 500)
+        # Each image is downloaded once: the failure does not send the batch down another path.
+        self.assertEqual(mock_get_iobytes_for_image.call_count, 2)
+        self.assertEqual(list(mock_cache.set_many.call_args[0][0]), ["good"])
+
+    @patch("lib.model.model.Cache")
+    @patch.object(Model, "get_iobytes_for_image")
+    def test_respond_isolates_hashing_failures(self, mock_get_iobytes_for_image, mock_cache):
+        with open("img/presto_flowchart.png", "rb") as file:
+            image_content = file.read()
+        mock_get_iobytes_for_image.side_effect = lambda image: io.BytesIO(image_content)
+        mock_cache.get_many.return_value = [None, None]
+        messages = [
+            schemas.parse_input_message({"body": {"id": id, "content_hash": id, "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg"}, "model_name": "image__Model"})
+            for id in ["first", "second"]
+        ]
+        model = Model()
+        from_images = model.pdq_hasher.fromImages
+        calls = []
+        def fail_batches_and_second_image(images):
+            calls.append(len(images))
+            if len(images) > 1 or len(calls) == 3:
+                raise ValueError("hashing failed")
+            return from_images(images)
+        with patch.object(model.pdq_hasher, "fromImages", side_effect=fail_batches_and_second_image):
+            responses = model.respond(messages)
+        self.assertEqual(calls, [2, 1, 1])
+        self.assertEqual(list(responses[0].body.result), ["hash_value"])
+        self.assertIsInstance(responses[1].body.result, schemas.ErrorResponse)
+        self.assertEqual(mock_get_iobytes_for_image.call_count, 2)
+
+    @patch("lib.model.model.RESPOND_WORKERS", 2)
+    @patch("lib.model.model.RESPOND_EXECUTOR", "thread")
+    @patch("lib.model.model.Cache")
+    @patch.object(Model, "process", return_value={"hash_value": "1"})
+    def test_respond_uses_respond_executor(self, mock_process, mock_cache):
+        mock_cache.get_many.return_value = [None, None]
+        messages = [
+            schemas.parse_input_message({"body": {"id": id, "content_hash": id, "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg"}, "model_name": "image__Model"})
+            for id in ["first", "second"]
+        ]
+        model = Model()
+        try:
+            responses = model.respond(messages)
+        finally:
+            model.reset_respond_executor()
+        self.assertEqual(mock_process.call_count, 2)
+        self.assertEqual([response.body.result for response in responses], [{"hash_value": "1"}, {"hash_value": "1"}])
+
+    def test_compute_pdq_dihedral(self):
+        with open("img/presto_flowchart.png", "rb") as file:
+            image_content = file.read()
+        model = Model()
+        result = model.compute_pdq_dihedral(io.BytesIO(image_content))
+        self.assertEqual(result["hash_value"], model.compute_pdq(io.BytesIO(image_content)))
+        self.assertEqual(set(result["dihedral_hash_values"]), set(Model.DIHEDRAL_TRANSFORMS))
+        self.assertEqual(result["dihedral_hash_values"]["original"], result["hash_value"])
+        self.assertEqual(len(set(result["dihedral_hash_values"].values())), 8)
+        self.assertTrue(0 <= result["quality"] <= 100)
+
+    @patch("lib.model.model.Cache")
+    @patch.object(Model, "get_iobytes_for_image")
+    def test_respond_dihedral_downloads_once_and_caches_separately(self, mock_get_iobytes_for_image, mock_cache):
+        with open("img/presto_flowchart.png", "rb") as file:
+            image_content = file.read()
+        mock_get_iobytes_for_image.side_effect = lambda image: io.BytesIO(image_content)
+        mock_cache.get_many.return_value = [None, None]
+        messages = [
+            schemas.parse_input_message({"body": {"id": str(i), "content_hash": "abc", "callback_url": "http://example.com?callback", "url": "http://example.com/image.jpg", "parameters": parameters}, "model_name": "image__Model"})
+            for i, parameters in enumerate([{}, {"dihedral": True}])
+        ]
+        responses = Model().respond(messages)
+        self.assertEqual(mock_get_iobytes_for_image.call_count, 2)
+        self.assertEqual(list(responses[0].body.result), ["hash_value"])
+        self.assertEqual(responses[1].body.result["hash_value"], responses[0].body.result["hash_value"])
+        self.assertEqual(len(responses[1].body.result["dihedral_hash_values"]), 8)
+        self.assertEqual(list(mock_cache.set_many.call_args[0][0]), ["abc", "abc:dihedral"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,114 @@
+import os
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+from lib import schemas
+from lib.base_exception import PrestoBaseException
+from lib.model.model import Model
+
+class SleepyModel(Model):
+    """
+    Sleeps for the number of milliseconds in the message text, so later messages can finish
+    first. "fail" and "bad" raise, like a model failing on one item of a batch.
+    """
+    def get_cache_key(self, message):
+        return None
+
+    def process(self, message):
+        if message.body.text == "fail":
+            raise ValueError("could not fingerprint")
+        if message.body.text == "bad":
+            raise PrestoBaseException("bad input", 422)
+        time.sleep(int(message.body.text) / 1000)
+        return {"text": message.body.text, "pid": os.getpid()}
+
+class ProcessSleepyModel(SleepyModel):
+    RESPOND_EXECUTOR = "process"
+
+def make_messages(texts):
+    return [
+        schemas.parse_input_message({"body": {"id": str(i), "callback_url": "http://example.com/callback", "text": text}, "model_name": "mean_tokens__Model"})
+        for i, text in enumerate(texts)
+    ]
+
+class TestRespond(unittest.TestCase):
+    def tearDown(self):
+        for model in getattr(self, "models", []):
+            model.reset_respond_executor()
+
+    def make_model(self, model_class):
+        model = model_class()
+        model.model_name = "mean_tokens__Model"
+        self.models = getattr(self, "models", []) + [model]
+        return model
+
+    def test_cache_policy_is_per_model(self):
+        class ExpensiveModel(SleepyModel):
+            CACHE_TTL = 3600
+            CACHE_MAX_ENTRIES = 10
+        model = self.make_model(ExpensiveModel)
+        self.assertEqual(model.get_cache_policy(), {"namespace": "mean_tokens__Model:1", "ttl": 3600, "max_entries": 10})
+        with patch('lib.model.model.CACHE_MODEL_TTL', 60), patch('lib.model.model.CACHE_MODEL_MAX_ENTRIES', 5):
+            self.assertEqual(model.get_cache_policy(), {"namespace": "mean_tokens__Model:1", "ttl": 60, "max_entries": 5})
+        model.CACHE_VERSION = "2"
+        self.assertEqual(self.make_model(SleepyModel).get_cache_policy()["ttl"], 86400)
+        self.assertEqual(model.get_cache_policy()["namespace"], "mean_tokens__Model:2")
+
+    def test_serial_by_default(self):
+        model = self.make_model(SleepyModel)
+        self.assertIsNone(model.get_respond_executor())
+        responses = model.respond(make_messages(["5", "0"]))
+        self.assertEqual([r.body.result["text"] for r in responses], ["5", "0"])
+
+    @patch('lib.model.model.RESPOND_WORKERS', 4)
+    def test_threads_keep_order(self):
+        model = self.make_model(SleepyModel)
+        start = time.time()
+        responses = model.respond(make_messages(["200", "150", "100", "50"]))
+        self.assertLess(time.time() - start, 0.45)
+        self.assertEqual([r.body.result["text"] for r in responses], ["200", "150", "100", "50"])
+        self.assertIs(model.get_respond_executor(), model.get_respond_executor())
+
+    @patch('lib.model.model.capture_custom_message')
+    @patch('lib.model.model.RESPOND_WORKERS', 4)
+    def test_threads_isolate_errors(self, mock_capture):
+        model = self.make_model(SleepyModel)
+        responses = model.respond(make_messages(["10", "fail", "bad", "0"]))
+        self.assertEqual(responses[0].body.result["text"], "10")
+        self.assertEqual(responses[1].body.result.error_code, 500)
+        self.assertEqual(responses[2].body.result.error_code, 422)
+        self.assertEqual(responses[3].body.result["text"], "0")
+        self.assertEqual(mock_capture.call_count, 2)
+
+    @patch('lib.model.model.RESPOND_WORKERS', 2)
+    def test_processes(self):
+        model = self.make_model(ProcessSleepyModel)
+        responses = model.respond(make_messages(["50", "0", "bad"]))
+        self.assertEqual([r.body.result["text"] for r in responses[:2]], ["50", "0"])
+        self.assertNotEqual(responses[0].body.result["pid"], os.getpid())
+        self.assertEqual(responses[2].body.result.error_code, 422)
+
+    @patch('lib.model.model.RESPOND_EXECUTOR', "thread")
+    @patch('lib.model.model.RESPOND_WORKERS', 2)
+    def test_environment_overrides_executor_kind(self):
+        model = self.make_model(ProcessSleepyModel)
+        responses = model.respond(make_messages(["0", "0"]))
+        self.assertEqual(responses[0].body.result["pid"], os.getpid())
+
+    @patch('lib.model.model.capture_custom_message')
+    @patch('lib.model.model.RESPOND_WORKERS', 2)
+    def test_broken_process_pool_is_replaced(self, mock_capture):
+        model = self.make_model(ProcessSleepyModel)
+        executor = model.get_respond_executor()
+        with self.assertRaises(BrokenProcessPool):
+            executor.submit(os._exit, 1).result()
+        responses = model.respond(make_messages(["0", "0"]))
+        self.assertEqual([r.body.result.error_code for r in responses], [500, 500])
+        self.assertIsNot(model.get_respond_executor(), executor)
+        responses = model.respond(make_messages(["0", "0"]))
+        self.assertEqual([r.body.result["text"] for r in responses], ["0", "0"])
+
+if __name__ == '__main__':
+    unittest.main()
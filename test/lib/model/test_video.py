@@ -5,7 +5,6 @@ import tempfile
 import shutil
 import uuid
 import pathlib
-import urllib.request
 import tmkpy
 from lib.model.video import Model
 from lib import s3
@@ -20,20 +19,20 @@ class TestVideoModel(unittest.TestCase):
         self.video_model.get_tempfile()
         mock_named_tempfile.assert_called_once()
 
-    @patch('urllib.request.urlopen')
+    @patch('lib.http_client.HTTPClient.stream')
     @patch('tmkpy.hashVideo')
     @patch('s3.upload_file_to_s3')
     @patch('pathlib.Path')
     def test_process_video(self, mock_pathlib, mock_upload_file_to_s3,
-                               mock_hash_video, mock_urlopen):
+                               mock_hash_video, mock_stream):
         with open("data/test-video.mp4", "rb") as video_file:
             video_contents = video_file.read()
         mock_hash_video_output = MagicMock()
         mock_hash_video_output.getPureAverageFeature.return_value = "hash_value"
         mock_hash_video.return_value = mock_hash_video_output
-        mock_urlopen.return_value = MagicMock(read=MagicMock(return_value=video_contents))
+        mock_stream.return_value.__enter__.return_value = MagicMock(status_code=200, headers={}, iter_bytes=MagicMock(return_value=iter([video_contents])))
         self.video_model.process(schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://blah.com?callback_id=123", "url": "http://example.com/video.mp4"}, "model_name": "video__Model"}))
-        mock_urlopen.assert_called_once()
+        mock_stream.assert_called_once()
         mock_hash_video.assert_called_once_with(ANY, "/usr/local/bin/ffmpeg")
 
     @patch('pathlib.Path')
@@ -48,10 +47,10 @@ class TestVideoModel(unittest.TestCase):
         result = self.video_model.tmk_program_name()
         self.assertEqual(result, "PrestoVideoEncoder")
 
-    @patch('lib.cache.Cache.get_cached_result')
-    @patch('lib.cache.Cache.set_cached_result')
+    @patch('lib.cache.Cache.get_many')
+    @patch('lib.cache.Cache.set_many')
     def test_respond_with_single_video(self, mock_cache_set, mock_cache_get):
-        mock_cache_get.return_value = None
+        mock_cache_get.return_value = [None]
         mock_cache_set.return_value = True
         video = schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://blah.com?callback_id=123", "url": "http://example.com/video.mp4"}, "model_name": "video__Model"})
         mock_process = MagicMock()
@@ -60,10 +59,10 @@ class TestVideoModel(unittest.TestCase):
         mock_process.assert_called_once_with(video)
         self.assertEqual(result, [video])
 
-    @patch('lib.cache.Cache.get_cached_result')
-    @patch('lib.cache.Cache.set_cached_result')
+    @patch('lib.cache.Cache.get_many')
+    @patch('lib.cache.Cache.set_many')
     def test_respond_with_multiple_videos(self, mock_cache_set, mock_cache_get):
-        mock_cache_get.return_value = None
+        mock_cache_get.return_value = [None, None]
         mock_cache_set.return_value = True
         videos = [schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://blah.com?callback_id=123", "url": "http://example.com/video.mp4"}, "model_name": "video__Model"}), schemas.parse_input_message({"body": {"id": "123", "callback_url": "http://blah.com?callback_id=123", "url": "http://example.com/video2.mp4"}, "model_name": "video__Model"})]
         mock_process = MagicMock()
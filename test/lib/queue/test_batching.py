@@ -0,0 +1,38 @@
+import unittest
+
+from lib.queue.batching import AdaptiveBatchSizer
+
+class TestAdaptiveBatchSizer(unittest.TestCase):
+    def test_starts_at_max_size(self):
+        self.assertEqual(AdaptiveBatchSizer(1, 10, 5).size, 10)
+        self.assertEqual(AdaptiveBatchSizer(1, 10, 5, initial_size=4).size, 4)
+
+    def test_slow_batch_shrinks_in_proportion(self):
+        sizer = AdaptiveBatchSizer(1, 100, 5)
+        self.assertEqual(sizer.record(100, 20), 25)
+        self.assertEqual(sizer.record(25, 60), 2)
+        self.assertEqual(sizer.record(2, 60), 1)
+
+    def test_fast_full_batches_grow_with_backlog(self):
+        sizer = AdaptiveBatchSizer(1, 100, 5, initial_size=4)
+        self.assertEqual(sizer.record(4, 0.4, queue_depth=1000), 8)
+        self.assertEqual(sizer.record(8, 0.8, queue_depth=1000), 16)
+        self.assertEqual(sizer.record(16, 1.6, queue_depth=1000), 32)
+        # 0.1s a message, so 50 messages fit in the 5s target.
+        self.assertEqual(sizer.record(32, 3.2, queue_depth=1000), 50)
+        self.assertEqual(sizer.record(50, 5.0, queue_depth=1000), 50)
+
+    def test_holds_without_backlog_or_full_batch(self):
+        sizer = AdaptiveBatchSizer(1, 100, 5, initial_size=4)
+        self.assertEqual(sizer.record(4, 0.1, queue_depth=2), 4)
+        self.assertEqual(sizer.record(3, 0.1, queue_depth=1000), 4)
+        self.assertEqual(sizer.record(0, 0.0), 4)
+        self.assertEqual(sizer.record(4, 0.1), 8)
+
+    def test_stays_within_bounds(self):
+        sizer = AdaptiveBatchSizer(2, 10, 5, initial_size=8)
+        self.assertEqual(sizer.record(8, 0.1), 10)
+        self.assertEqual(sizer.record(10, 500), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import TimeoutError
+from typing import List
+
+from lib import schemas
+from lib.queue.execution import ExecutionEngine
+
+class SleepModel:
+    """
+    Sleeps for the number of seconds in each message's text; "fail" raises.
+    """
+    model_name = "sleep.Model"
+    MEDIA_DOWNLOAD = None
+
+    def respond(self, messages: List[schemas.Message]) -> List[schemas.Message]:
+        for message in messages:
+            if message.body.text == "fail":
+                raise ValueError("could not fingerprint")
+            time.sleep(float(message.body.text))
+            message.body.result = {"pid": os.getpid()}
+        return messages
+
+class TempfileModel(SleepModel):
+    """
+    Reports whether the prefetched tempfile for each message reached it.
+    """
+    MEDIA_DOWNLOAD = "tempfile"
+
+    def __init__(self):
+        self.prefetched = {}
+
+    def pop_prefetched(self, url):
+        return self.prefetched.pop(url, None)
+
+    def release_prefetched(self, messages):
+        for message in messages:
+            self.prefetched.pop(message.body.url, None)
+
+    def respond(self, messages: List[schemas.Message]) -> List[schemas.Message]:
+        for message in messages:
+            message.body.result = {"prefetched": message.body.url in self.prefetched}
+        time.sleep(float(messages[0].body.text))
+        return messages
+
+class BrokenModel(SleepModel):
+    """
+    Fails to load.
+    """
+    def __init__(self, loaded=False):
+        if not loaded:
+            raise RuntimeError("weights missing")
+
+def make_messages(*texts, url=None):
+    return [
+        schemas.parse_input_message({"body": {"id": str(i), "callback_url": "http://example.com", "text": text, "url": url}, "model_name": "mean_tokens__Model"})
+        for i, text in enumerate(texts)
+    ]
+
+class TestExecutionEngine(unittest.TestCase):
+    def setUp(self):
+        self.engines = []
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.shutdown()
+
+    def make_engine(self, model, mode, **kwargs):
+        engine = ExecutionEngine(model, mode=mode, **kwargs)
+        self.engines.append(engine)
+        return engine
+
+    def test_thread_reuses_executor(self):
+        engine = self.make_engine(SleepModel(), "thread")
+        self.assertEqual(engine.run(make_messages("0"), 1)[0].body.result["pid"], os.getpid())
+        executor = engine.executor
+        engine.run(make_messages("0"), 1)
+        self.assertIs(engine.executor, executor)
+
+    def test_thread_timeout_does_not_block_next_batch(self):
+        engine = self.make_engine(SleepModel(), "thread")
+        start = time.time()
+        with self.assertRaises(TimeoutError):
+            engine.run(make_messages("1"), 0.1)
+        engine.run(make_messages("0"), 1)
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_thread_timeout_tracks_abandoned_threads(self):
+        engine = self.make_engine(SleepModel(), "thread")
+        for _ in range(2):
+            with self.assertRaises(TimeoutError):
+                engine.run(make_messages("0.5"), 0.05)
+        self.assertEqual(engine.abandoned_threads(), 2)
+        time.sleep(0.6)
+        self.assertEqual(engine.abandoned_threads(), 0)
+
+    def test_process_runs_in_child(self):
+        engine = self.make_engine(SleepModel(), "process")
+        first = engine.run(make_messages("0", "0"), 5)
+        self.assertNotEqual(first[0].body.result["pid"], os.getpid())
+        second = engine.run(make_messages("0"), 5)
+        self.assertEqual(second[0].body.result["pid"], first[0].body.result["pid"])
+
+    def test_process_error_is_raised(self):
+        engine = self.make_engine(SleepModel(), "process")
+        with self.assertRaises(ValueError):
+            engine.run(make_messages("fail"), 5)
+        self.assertTrue(engine.process.is_alive())
+
+    def test_process_timeout_kills_child(self):
+        engine = self.make_engine(SleepModel(), "process")
+        engine.run(make_messages("0"), 5)
+        process = engine.process
+        start = time.time()
+        with self.assertRaises(TimeoutError):
+            engine.run(make_messages("30"), 0.2)
+        self.assertLess(time.time() - start, 5)
+        self.assertFalse(process.is_alive())
+        self.assertIsNotNone(engine.run(make_messages("0"), 5)[0].body.result["pid"])
+
+    def test_process_reports_child_pid(self):
+        pids = []
+        engine = self.make_engine(SleepModel(), "process", on_process=pids.append)
+        pid = engine.run(make_messages("0"), 5)[0].body.result["pid"]
+        with self.assertRaises(TimeoutError):
+            engine.run(make_messages("30"), 0.2)
+        self.assertEqual(pids, [pid, 0])
+
+    def test_process_model_load_failure_is_reported(self):
+        engine = self.make_engine(BrokenModel(loaded=True), "process")
+        with self.assertRaises(RuntimeError):
+            engine.run(make_messages("0"), 5)
+        self.assertIsNone(engine.process)
+
+    def test_process_crash_is_reported(self):
+        engine = self.make_engine(SleepModel(), "process")
+        engine.run(make_messages("0"), 5)
+        engine.process.kill()
+        engine.process.join()
+        self.assertNotEqual(engine.run(make_messages("0"), 5)[0].body.result["pid"], os.getpid())
+
+    def test_process_recycled_after_max_tasks(self):
+        engine = self.make_engine(SleepModel(), "process", max_tasks=2)
+        pids = [engine.run(make_messages("0"), 5)[0].body.result["pid"] for _ in range(3)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def test_process_recycled_at_memory_high_water_mark(self):
+        engine = self.make_engine(SleepModel(), "process", max_memory_mb=1)
+        pids = [engine.run(make_messages("0"), 5)[0].body.result["pid"] for _ in range(2)]
+        self.assertNotEqual(pids[0], pids[1])
+
+    def test_process_receives_prefetched_media(self):
+        model = TempfileModel()
+        engine = self.make_engine(model, "process")
+        url = "http://example.com/video.mp4"
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        model.prefetched[url] = path
+        responses = engine.run(make_messages("0", url=url), 5)
+        self.assertTrue(responses[0].body.result["prefetched"])
+        self.assertEqual(model.prefetched, {})
+        # The child did not consume the file, so it is cleaned up for it.
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
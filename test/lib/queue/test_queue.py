@@ -1,7 +1,9 @@
 import json
 import os
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
+import botocore
 import numpy as np
 import time
 from typing import Union, List
@@ -63,10 +65,10 @@ class TestQueueWorker(unittest.TestCase):
         with patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
             self.queue = QueueWorker(self.queue_name_input, self.queue_name_output, self.queue_name_dlq)
     
-        # Ensure `self.all_queues` is populated for `find_queue_by_name`
-        self.queue.all_queues = self.queue.store_queue_map([
-            self.mock_input_queue, self.mock_output_queue, self.mock_dlq_queue
-        ])
+        # Resolve queues through the queue registry on the mocked SQS resource
+        get_sqs = patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource)
+        get_sqs.start()
+        self.addCleanup(get_sqs.stop)
 
     def test_get_output_queue_name(self):
         self.assertEqual(self.queue.get_output_queue_name().replace(".fifo", ""), (self.queue.get_input_queue_name()+'_output').replace(".fifo", ""))
@@ -94,11 +96,21 @@ class TestQueueWorker(unittest.TestCase):
         mock_log_execution_time.assert_called_once_with('timeout.MockModelNoTimeout', 0.5)
         mock_log_execution_status.assert_called_once_with('timeout.MockModelNoTimeout', 'successful_message_response')
 
+    @patch('lib.queue.worker.QueueWorker.log_and_handle_error')
+    def test_execute_with_timeout_reuses_engine(self, mock_log_error):
+        model = MockModelNoTimeout()
+        self.queue.execute_with_timeout(model, [], timeout_seconds=1)
+        engine = self.queue.execution_engine
+        self.queue.execute_with_timeout(model, [], timeout_seconds=1)
+        self.assertIs(self.queue.execution_engine, engine)
+        self.queue.execute_with_timeout(MockModelTimeout(), [], timeout_seconds=1)
+        self.assertIsNot(self.queue.execution_engine, engine)
+
     def test_process(self):
         self.queue.receive_messages = MagicMock(return_value=[(FakeSQSMessage(receipt_handle="blah", body=json.dumps({
             "body": {"id": 1, "callback_url": "http://example.com", "text": "This is a test"},
             "model_name": "audio__Model"
-        })), self.mock_input_queue)])
+        })), self.queue_name_input)])
         self.queue.input_queue = MagicMock(return_value=None)
         self.model.model = self.mock_model
         self.model.model.encode = MagicMock(return_value=np.array([[4, 5, 6], [7, 8, 9]]))
@@ -106,6 +118,80 @@ class TestQueueWorker(unittest.TestCase):
         self.queue.process(self.model)
         self.queue.receive_messages.assert_called_once_with(1)
 
+    @patch('lib.queue.worker.PREFETCH_BATCHES', 1)
+    @patch('lib.queue.worker.QueueWorker.log_execution_time')
+    def test_process_with_prefetch(self, mock_log_execution_time):
+        batches = [
+            [(FakeSQSMessage(receipt_handle=f"handle-{i}", body=json.dumps({
+                "body": {"id": i, "callback_url": "http://example.com", "url": f"http://example.com/{i}.jpg"},
+                "model_name": "image__Model"
+            })), self.queue_name_input)]
+            for i in range(3)
+        ]
+        def receive_messages(batch_size):
+            if batches:
+                return batches.pop(0)
+            time.sleep(0.01)
+            return []
+        self.queue.receive_messages = MagicMock(side_effect=receive_messages)
+        self.queue.delete_processed_messages = MagicMock()
+        self.queue.push_messages = MagicMock(return_value=[])
+        model = MagicMock(MEDIA_DOWNLOAD="buffer", BATCH_SIZE=1, MIN_BATCH_SIZE=None, model_name="image__Model")
+        model.respond.side_effect = lambda messages: messages
+        for _ in range(3):
+            self.queue.process(model)
+        self.queue.stop_prefetch()
+        self.assertEqual([call.args[0][0].body.id for call in model.respond.call_args_list], [0, 1, 2])
+        self.assertEqual(model.prefetch.call_count, 3)
+        self.assertIs(model.prefetch.call_args.args[1], self.queue.prefetch_executor)
+        self.assertEqual(model.release_prefetched.call_count, 3)
+        self.assertEqual(self.queue.delete_processed_messages.call_count, 3)
+        logged = {call.args[0] for call in mock_log_execution_time.call_args_list}
+        self.assertIn("image__Model.prefetch", logged)
+        self.assertIn("image__Model.prefetch_wait", logged)
+
+    @patch('lib.queue.worker.BATCH_TARGET_SECONDS', 0.1)
+    @patch('lib.queue.worker.OPEN_TELEMETRY_EXPORTER')
+    def test_process_adapts_batch_size(self, mock_exporter):
+        def receive_messages(batch_size):
+            return [(FakeSQSMessage(receipt_handle=f"handle-{i}", body=json.dumps({
+                "body": {"id": i, "callback_url": "http://example.com", "text": "slow"},
+                "model_name": "mean_tokens__Model"
+            })), self.mock_input_queue) for i in range(batch_size)]
+        def execute_with_timeout(model, messages, timeout_seconds):
+            # The first batch of 8 takes 0.3s, three times the target; the second is instant.
+            time.sleep(0.3 if len(messages) == 8 else 0)
+            return messages, True
+        self.queue.receive_messages = MagicMock(side_effect=receive_messages)
+        self.queue.get_approximate_depth = MagicMock(return_value=500)
+        self.queue.execute_with_timeout = MagicMock(side_effect=execute_with_timeout)
+        self.queue.push_messages = MagicMock(return_value=[])
+        self.queue.delete_processed_messages = MagicMock()
+        model = MagicMock(BATCH_SIZE=8, MIN_BATCH_SIZE=1, model_name="mean_tokens__Model")
+        self.queue.process(model)
+        self.queue.process(model)
+        self.assertEqual([call.args[0] for call in self.queue.receive_messages.call_args_list], [8, 2])
+        # Grown again, but only to what the per-message estimate fits into the target.
+        self.assertEqual(self.queue.batch_sizer.size, 3)
+        self.queue.get_approximate_depth.assert_called_once_with(self.queue_name_input)
+        self.assertEqual([call.args[1] for call in mock_exporter.log_batch_size.call_args_list], [2, 3])
+
+    def test_fixed_batch_size_without_min_batch_size(self):
+        self.assertIsNone(self.queue.get_batch_sizer(self.model))
+        self.assertEqual(self.queue.get_batch_size(self.model), self.model.BATCH_SIZE)
+
+    def test_get_approximate_depth(self):
+        self.mock_sqs_resource.meta.client.get_queue_attributes.return_value = {"Attributes": {"ApproximateNumberOfMessages": "42"}}
+        with patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
+            self.assertEqual(self.queue.get_approximate_depth(self.queue_name_input), 42)
+            self.mock_sqs_resource.meta.client.get_queue_attributes.return_value = {}
+            self.assertIsNone(self.queue.get_approximate_depth(self.queue_name_input))
+
+    @patch('lib.queue.worker.PREFETCH_BATCHES', 1)
+    def test_prefetch_skipped_for_text_models(self):
+        self.assertTrue(QueueWorker.uses_prefetch(self.model))
+        self.assertFalse(QueueWorker.uses_prefetch(MockModelNoTimeout()))
+
     def test_receive_messages(self):
         self.queue.input_queue = self.queue_name_input
         # Mocking the queue and messages
@@ -128,6 +214,195 @@ class TestQueueWorker(unittest.TestCase):
         self.assertIn("a test", json.loads(received_messages[0][0].body)["body"]["text"])
         self.assertIn("another test", json.loads(received_messages[1][0].body)["body"]["text"])
 
+    def make_sqs_messages(self, count, prefix="handle"):
+        return [FakeSQSMessage(receipt_handle=f"{prefix}-{i}", body=json.dumps({"body": {"id": i}})) for i in range(count)]
+
+    def test_receive_messages_fills_large_batch(self):
+        waiting = self.make_sqs_messages(35)
+        def receive(MaxNumberOfMessages, WaitTimeSeconds):
+            taken = waiting[:MaxNumberOfMessages]
+            del waiting[:MaxNumberOfMessages]
+            return taken
+        self.mock_input_queue.receive_messages.side_effect = receive
+        self.mock_sqs_resource.Queue.return_value.receive_messages.side_effect = receive
+        self.queue.get_or_create_queue = MagicMock(return_value=[self.mock_input_queue])
+        with patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
+            received_messages = self.queue.receive_messages(25)
+        self.assertEqual(len(received_messages), 25)
+        self.assertEqual(len({message.receipt_handle for message, queue in received_messages}), 25)
+        self.assertEqual(len(waiting), 10)
+        self.mock_input_queue.receive_messages.assert_called_once_with(MaxNumberOfMessages=10, WaitTimeSeconds=20)
+        self.mock_sqs_resource.Queue.assert_called_with(self.mock_input_queue.url)
+        self.assertEqual(sorted(call.kwargs["MaxNumberOfMessages"] for call in self.mock_sqs_resource.Queue.return_value.receive_messages.call_args_list), [5, 10])
+        for message, queue in received_messages:
+            self.assertAlmostEqual(self.queue.visibility_remaining(message), 30, delta=5)
+
+    @patch('lib.queue.queue.RECEIVE_LINGER_SECONDS', 0.2)
+    def test_receive_messages_stops_lingering_on_empty_queue(self):
+        self.mock_input_queue.receive_messages.return_value = self.make_sqs_messages(3)
+        self.mock_sqs_resource.Queue.return_value.receive_messages.return_value = []
+        self.queue.get_or_create_queue = MagicMock(return_value=[self.mock_input_queue])
+        start = time.time()
+        with patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
+            received_messages = self.queue.receive_messages(100)
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual(len(received_messages), 3)
+        # A single round of short polls for the 97 missing messages, then it gives up.
+        calls = self.mock_sqs_resource.Queue.return_value.receive_messages.call_args_list
+        self.assertEqual(sorted(call.kwargs["MaxNumberOfMessages"] for call in calls), [7] + [10] * 9)
+        self.assertEqual({call.kwargs["WaitTimeSeconds"] for call in calls}, {0})
+
+    @patch('lib.queue.queue.logger')
+    def test_visibility_deadlines_are_per_message(self, mock_logger):
+        self.mock_input_queue.attributes = {"VisibilityTimeout": "60"}
+        early, late = self.make_sqs_messages(1, "early"), self.make_sqs_messages(1, "late")
+        with patch('lib.queue.queue.time.time', return_value=1000):
+            self.queue.track_visibility(early, self.mock_input_queue)
+        with patch('lib.queue.queue.time.time', return_value=1050):
+            self.queue.track_visibility(late, self.mock_input_queue)
+            self.assertEqual(self.queue.visibility_remaining(early[0]), 10)
+            self.assertEqual(self.queue.visibility_remaining(late[0]), 60)
+        with patch('lib.queue.queue.time.time', return_value=1070), patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
+            self.queue.delete_messages_from_queue(self.queue_name_input, early + late)
+        self.assertEqual(self.queue.visibility_deadlines, {})
+        mock_logger.warning.assert_called_once()
+        self.assertIn("early-0", mock_logger.warning.call_args.args[0])
+
+    @patch('lib.queue.queue.logger')
+    def test_extend_visibility_in_batches(self, mock_logger):
+        messages = self.make_sqs_messages(25)
+        self.mock_input_queue.change_message_visibility_batch.return_value = {"Failed": [{"Id": "3", "Message": "expired"}]}
+        self.queue.get_or_create_queue = MagicMock(return_value=[self.mock_input_queue])
+        self.queue.extend_visibility(self.queue_name_input, messages, 60)
+        calls = self.mock_input_queue.change_message_visibility_batch.call_args_list
+        self.assertEqual([len(call.kwargs["Entries"]) for call in calls], [10, 10, 5])
+        self.assertEqual(calls[1].kwargs["Entries"][0], {"Id": "0", "ReceiptHandle": "handle-10", "VisibilityTimeout": 60})
+        # Entry 3 failed in each of the three batches.
+        self.assertEqual(mock_logger.warning.call_count, 3)
+        self.assertEqual(len(self.queue.visibility_deadlines), 22)
+        self.assertAlmostEqual(self.queue.visibility_remaining(messages[0]), 60, delta=5)
+
+    def test_heartbeat_extends_long_running_batch(self):
+        self.queue.visibility_timeout = 1
+        messages_with_queues = [(message, self.queue_name_input) for message in self.make_sqs_messages(2)]
+        def receive_messages(batch_size):
+            self.queue.track_visibility([message for message, queue in messages_with_queues], self.mock_input_queue)
+            return messages_with_queues
+        self.queue.receive_messages = MagicMock(side_effect=receive_messages)
+        self.queue.extract_messages = MagicMock(return_value=[])
+        self.queue.extend_visibility = MagicMock(side_effect=lambda queue_name, messages, timeout_seconds: self.queue.visibility_deadlines.update({m.receipt_handle: time.time() + timeout_seconds for m in messages}))
+        self.queue.delete_processed_messages = MagicMock()
+        def execute_with_timeout(model, messages, timeout_seconds):
+            # Runs for over twice the visibility timeout.
+            time.sleep(2.2)
+            return [], True
+        self.queue.execute_with_timeout = MagicMock(side_effect=execute_with_timeout)
+        try:
+            self.queue.safely_respond(self.model)
+        finally:
+            self.queue.stop_heartbeat()
+        self.assertGreaterEqual(self.queue.extend_visibility.call_count, 3)
+        for call in self.queue.extend_visibility.call_args_list:
+            self.assertEqual(call.args[0], self.queue_name_input)
+            self.assertEqual([m.receipt_handle for m in call.args[1]], ["handle-0", "handle-1"])
+            self.assertEqual(call.args[2], 1)
+        self.assertEqual(self.queue.in_flight, {})
+        self.queue.delete_processed_messages.assert_called_once_with(messages_with_queues)
+
+    @patch('lib.queue.worker.PREFETCH_BATCHES', 1)
+    def test_heartbeat_extends_waiting_prefetched_batch(self):
+        self.queue.visibility_timeout = 1
+        batches = [[(message, self.queue_name_input)] for message in self.make_sqs_messages(2)]
+        def receive_messages(batch_size):
+            if batches:
+                messages_with_queues = batches.pop(0)
+                self.queue.track_visibility([message for message, queue in messages_with_queues], self.mock_input_queue)
+                return messages_with_queues
+            time.sleep(0.01)
+            return []
+        self.queue.receive_messages = MagicMock(side_effect=receive_messages)
+        self.queue.extract_messages = MagicMock(return_value=[])
+        self.queue.extend_visibility = MagicMock(side_effect=lambda queue_name, messages, timeout_seconds: self.queue.visibility_deadlines.update({m.receipt_handle: time.time() + timeout_seconds for m in messages}))
+        self.queue.delete_processed_messages = MagicMock()
+        self.queue.execute_with_timeout = MagicMock(return_value=([], True))
+        model = MagicMock(MEDIA_DOWNLOAD="buffer", BATCH_SIZE=1, MIN_BATCH_SIZE=None, model_name="image__Model")
+        try:
+            self.queue.safely_respond(model)
+            # The second batch now waits in prefetched_batches for over twice the visibility timeout.
+            time.sleep(2.2)
+            extended = {m.receipt_handle for call in self.queue.extend_visibility.call_args_list for m in call.args[1]}
+            self.assertEqual(extended, {"handle-1"})
+            self.queue.safely_respond(model)
+        finally:
+            self.queue.stop_prefetch()
+            self.queue.stop_heartbeat()
+        self.assertEqual(self.queue.in_flight, {})
+        self.assertEqual(self.queue.delete_processed_messages.call_count, 2)
+
+    @patch('lib.queue.worker.PREFETCH_BATCHES', 1)
+    def test_stop_prefetch_discards_waiting_batch(self):
+        batches = [[(message, self.queue_name_input)] for message in self.make_sqs_messages(3)]
+        def receive_messages(batch_size):
+            if batches:
+                return batches.pop(0)
+            time.sleep(0.01)
+            return []
+        self.queue.receive_messages = MagicMock(side_effect=receive_messages)
+        self.queue.extract_messages = MagicMock(return_value=[])
+        self.queue.delete_processed_messages = MagicMock()
+        self.queue.execute_with_timeout = MagicMock(return_value=([], True))
+        model = MagicMock(MEDIA_DOWNLOAD="buffer", BATCH_SIZE=1, MIN_BATCH_SIZE=None, model_name="image__Model")
+        self.queue.safely_respond(model)
+        while batches:
+            time.sleep(0.01)
+        self.queue.stop_prefetch()
+        self.queue.stop_heartbeat()
+        self.assertEqual(self.queue.in_flight, {})
+        self.assertEqual(model.release_prefetched.call_count, 3)
+        self.queue.delete_processed_messages.assert_called_once()
+
+    def test_heartbeat_leaves_short_batches_alone(self):
+        messages = self.make_sqs_messages(2)
+        self.queue.track_visibility(messages, self.mock_input_queue)
+        self.queue.extend_visibility = MagicMock()
+        self.queue.track_in_flight([(message, self.queue_name_input) for message in messages])
+        self.queue.extend_in_flight()
+        self.queue.stop_heartbeat()
+        self.queue.extend_visibility.assert_not_called()
+
+    def test_queue_handles_are_cached(self):
+        with patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
+            self.mock_sqs_resource.get_queue_by_name.reset_mock()
+            QueueWorker(self.queue_name_input, self.queue_name_output, self.queue_name_dlq)
+            self.assertIs(self.queue.get_or_create_queue(self.queue_name_input)[0], self.mock_input_queue)
+        self.mock_sqs_resource.get_queue_by_name.assert_not_called()
+
+    def test_queue_urls_are_shared_across_threads(self):
+        thread_sqs_resource = MagicMock()
+        thread_sqs_resource.meta.client.meta.endpoint_url = self.mock_sqs_resource.meta.client.meta.endpoint_url
+        handles = []
+        def lookup():
+            with patch.object(QueueWorker, 'get_sqs', return_value=thread_sqs_resource):
+                handles.append(self.queue.get_or_create_queue(self.queue_name_input)[0])
+        thread = threading.Thread(target=lookup)
+        thread.start()
+        thread.join()
+        thread_sqs_resource.get_queue_by_name.assert_not_called()
+        thread_sqs_resource.Queue.assert_called_once_with(self.mock_input_queue.url)
+        self.assertIs(handles[0], thread_sqs_resource.Queue.return_value)
+
+    @patch('lib.queue.queue.logger')
+    def test_vanished_queue_is_looked_up_again(self, mock_logger):
+        recreated_queue = MagicMock(url=self.mock_input_queue.url)
+        self.mock_input_queue.send_message.side_effect = botocore.exceptions.ClientError({"Error": {"Code": "AWS.SimpleQueueService.NonExistentQueue"}}, "SendMessage")
+        message = schemas.parse_input_message({"body": {"id": 1, "callback_url": "http://example.com", "text": "This is a test"}, "model_name": "mean_tokens__Model"})
+        with patch.object(QueueWorker, 'get_sqs', return_value=self.mock_sqs_resource):
+            self.mock_sqs_resource.get_queue_by_name.side_effect = lambda QueueName: recreated_queue
+            self.queue.send_message(self.queue_name_input, message)
+            self.assertIs(self.queue.get_or_create_queue(self.queue_name_input)[0], recreated_queue)
+        recreated_queue.send_message.assert_called_once()
+        self.mock_sqs_resource.get_queue_by_name.assert_called_with(QueueName=self.queue_name_input)
+
     def test_restrict_queues_by_suffix(self):
         queues = [
             MagicMock(url='http://test.com/test_input'),
@@ -176,6 +451,81 @@ class TestQueueWorker(unittest.TestCase):
         self.mock_output_queue.send_message.assert_called_once_with(MessageBody='{"body": {"id": 1, "content_hash": null, "callback_url": "http://example.com", "url": null, "text": "This is a test", "raw": {}, "parameters": {}, "result": {"hash_value": null}}, "model_name": "mean_tokens__Model", "retry_count": 0}')
         self.assertEqual(returned_message, message_to_push)
 
+    def make_output_messages(self, count, text="This is a test"):
+        return [schemas.parse_input_message({"body": {"id": i, "callback_url": "http://example.com", "text": text}, "model_name": "mean_tokens__Model"}) for i in range(count)]
+
+    def test_push_messages_in_batches_of_ten(self):
+        self.mock_output_queue.send_message_batch.return_value = {"Successful": []}
+        unsent = self.queue.push_messages(self.queue_name_output, self.make_output_messages(25))
+        self.assertEqual(unsent, [])
+        calls = self.mock_output_queue.send_message_batch.call_args_list
+        self.assertEqual([len(call.kwargs["Entries"]) for call in calls], [10, 10, 5])
+        self.assertEqual(calls[2].kwargs["Entries"][0]["Id"], "20")
+        self.assertEqual(json.loads(calls[2].kwargs["Entries"][0]["MessageBody"])["body"]["id"], 20)
+
+    def test_batch_send_entries_respects_size_limit(self):
+        entries = [{"Id": str(i), "MessageBody": "x" * 100000} for i in range(5)]
+        self.assertEqual([len(batch) for batch in QueueWorker.batch_send_entries(entries)], [2, 2, 1])
+        oversized = [{"Id": "0", "MessageBody": "x" * 300000}, {"Id": "1", "MessageBody": "x"}]
+        self.assertEqual([len(batch) for batch in QueueWorker.batch_send_entries(oversized)], [1, 1])
+
+    @patch('lib.queue.queue.time.sleep')
+    @patch('lib.queue.queue.logger')
+    def test_push_messages_retries_only_failed_entries(self, mock_logger, mock_sleep):
+        self.mock_output_queue.send_message_batch.side_effect = [
+            {"Failed": [{"Id": "1", "SenderFault": False, "Code": "ServiceUnavailable"}, {"Id": "2", "SenderFault": True, "Code": "InvalidMessageContents"}]},
+            {"Failed": [{"Id": "1", "SenderFault": False, "Code": "ServiceUnavailable"}]},
+            {},
+        ]
+        messages = self.make_output_messages(3)
+        unsent = self.queue.push_messages(self.queue_name_output, messages)
+        calls = self.mock_output_queue.send_message_batch.call_args_list
+        self.assertEqual([[entry["Id"] for entry in call.kwargs["Entries"]] for call in calls], [["0", "1", "2"], ["1"], ["1"]])
+        self.assertEqual(unsent, [messages[2]])
+
+    @patch('lib.queue.queue.time.sleep')
+    @patch('lib.queue.queue.logger')
+    @patch('lib.queue.queue.SEND_MAX_ATTEMPTS', 2)
+    def test_push_messages_gives_up_after_max_attempts(self, mock_logger, mock_sleep):
+        self.mock_output_queue.send_message_batch.return_value = {"Failed": [{"Id": "0", "SenderFault": False}]}
+        messages = self.make_output_messages(2)
+        self.assertEqual(self.queue.push_messages(self.queue_name_output, messages), [messages[0]])
+        self.assertEqual(self.mock_output_queue.send_message_batch.call_count, 2)
+        mock_logger.error.assert_called_once()
+
+    @patch('lib.queue.queue.logger')
+    def test_push_messages_reports_oversized_entries_as_unsent(self, mock_logger):
+        self.mock_output_queue.send_message_batch.return_value = {}
+        messages = self.make_output_messages(2)
+        messages[1].body.text = "x" * 300000
+        self.assertEqual(self.queue.push_messages(self.queue_name_output, messages), [messages[1]])
+        calls = self.mock_output_queue.send_message_batch.call_args_list
+        self.assertEqual([[entry["Id"] for entry in call.kwargs["Entries"]] for call in calls], [["0"]])
+
+    @patch('lib.queue.queue.time.sleep')
+    @patch('lib.queue.queue.logger')
+    def test_push_messages_retries_failed_batch_request(self, mock_logger, mock_sleep):
+        error = botocore.exceptions.ClientError({"Error": {"Code": "ThrottlingException"}}, "SendMessageBatch")
+        self.mock_output_queue.send_message_batch.side_effect = [{}, error, {}]
+        messages = self.make_output_messages(15)
+        self.assertEqual(self.queue.push_messages(self.queue_name_output, messages), [])
+        calls = self.mock_output_queue.send_message_batch.call_args_list
+        # Only the failed second batch is sent again, so the first is not duplicated.
+        self.assertEqual([len(call.kwargs["Entries"]) for call in calls], [10, 5, 5])
+        self.assertEqual(calls[2].kwargs["Entries"][0]["Id"], "10")
+
+    @patch('lib.queue.worker.capture_custom_message')
+    def test_process_dead_letters_unsent_responses(self, mock_capture_custom_message):
+        responses = self.make_output_messages(3)
+        self.queue.safely_respond = MagicMock(return_value=responses)
+        self.queue.push_messages = MagicMock(side_effect=lambda queue_name, messages: messages[-1:])
+        self.assertEqual(self.queue.process(self.model), responses)
+        calls = self.queue.push_messages.call_args_list
+        self.assertEqual([call.args[0] for call in calls], [self.queue_name_output, self.queue_name_dlq])
+        self.assertEqual(calls[1].args[1], [responses[2]])
+        # The dead letter queue refused it too, so it is reported as lost.
+        mock_capture_custom_message.assert_called_once()
+
     def test_push_to_dead_letter_queue(self):
         message_to_push = schemas.parse_input_message({"body": {"id": 1, "content_hash": None, "callback_url": "http://example.com", "text": "This is a test"}, "model_name": "mean_tokens__Model"})
         # Call push_to_dead_letter_queue
@@ -192,13 +542,14 @@ class TestQueueWorker(unittest.TestCase):
         fake_message = FakeSQSMessage(receipt_handle="blah", body=json.dumps(message_body))
         messages_with_queues = [(fake_message, self.mock_input_queue)]
 
-        self.queue.push_to_dead_letter_queue = MagicMock()
-        self.queue.push_message = MagicMock()
+        self.queue.push_messages = MagicMock(return_value=[])
+        self.queue.delete_messages = MagicMock()
 
         self.queue.increment_message_error_counts(messages_with_queues)
 
-        self.queue.push_to_dead_letter_queue.assert_called_once()
-        self.queue.push_message.assert_not_called()
+        self.queue.push_messages.assert_called_once()
+        self.assertEqual(self.queue.push_messages.call_args.args[0], self.queue_name_dlq)
+        self.queue.delete_messages.assert_called_once_with(messages_with_queues)
 
     def test_increment_message_error_counts_increment(self):
         message_body = {
@@ -209,13 +560,32 @@ class TestQueueWorker(unittest.TestCase):
         fake_message = FakeSQSMessage(receipt_handle="blah", body=json.dumps(message_body))
         messages_with_queues = [(fake_message, self.mock_input_queue)]
 
-        self.queue.push_to_dead_letter_queue = MagicMock()
-        self.queue.push_message = MagicMock()
+        self.queue.push_messages = MagicMock(return_value=[])
+        self.queue.delete_messages = MagicMock()
 
         self.queue.increment_message_error_counts(messages_with_queues)
 
-        self.queue.push_to_dead_letter_queue.assert_not_called()
-        self.queue.push_message.assert_called_once()
+        self.queue.push_messages.assert_called_once()
+        self.assertEqual(self.queue.push_messages.call_args.args[0], self.queue_name_input)
+        self.assertEqual(self.queue.push_messages.call_args.args[1][0].retry_count, 3)
+        self.queue.delete_messages.assert_called_once_with(messages_with_queues)
+
+    def test_increment_message_error_counts_keeps_unsent_messages(self):
+        messages_with_queues = [
+            (FakeSQSMessage(receipt_handle=f"handle-{i}", body=json.dumps({
+                "body": {"id": i, "callback_url": "http://example.com", "text": "This is a test"},
+                "retry_count": retry_count,
+                "model_name": "mean_tokens__Model"
+            })), self.queue_name_input)
+            for i, retry_count in enumerate([0, 5, 1])
+        ]
+        self.queue.push_messages = MagicMock(side_effect=lambda queue_name, messages: messages[-1:] if queue_name == self.queue_name_input else [])
+        self.queue.delete_messages = MagicMock()
+        self.queue.increment_message_error_counts(messages_with_queues)
+        self.assertEqual([call.args[0] for call in self.queue.push_messages.call_args_list], [self.queue_name_dlq, self.queue_name_input])
+        self.assertEqual([len(call.args[1]) for call in self.queue.push_messages.call_args_list], [1, 2])
+        # The retry of handle-2 was not sent, so its original is left to become visible again.
+        self.queue.delete_messages.assert_called_once_with([messages_with_queues[1], messages_with_queues[0]])
 
     def test_extract_messages(self):
         messages_with_queues = [
@@ -1,11 +1,16 @@
 import pytest
+import redis
 from unittest.mock import patch, MagicMock
-from lib.cache import Cache
+import time
+from lib.cache import Cache, LocalCache
 
 # Mock the Redis client and its methods
 @pytest.fixture
 def mock_redis_client():
-    with patch('lib.cache.redis.Redis') as mock_redis:
+    with patch('lib.cache.redis.Redis') as mock_redis, \
+         patch.object(Cache, '_client', None), \
+         patch.object(Cache, '_getex_supported', True), \
+         patch.object(Cache, '_local', None):
         yield mock_redis
 
 def test_set_cached_result(mock_redis_client):
@@ -16,24 +21,26 @@ def test_set_cached_result(mock_redis_client):
 
     Cache.set_cached_result(content_hash, result, ttl)
 
-    mock_instance.setex.assert_called_once_with('presto_media_cache:'+content_hash, ttl, '{"data": "example"}')
+    mock_instance.setex.assert_called_once_with('presto_media_cache:'+content_hash, ttl, b'{"data": "example"}')
 
 def test_get_cached_result_exists(mock_redis_client):
     mock_instance = mock_redis_client.from_url.return_value
     content_hash = "test_hash"
     ttl = 3600
     cached_data = '{"data": "example"}'
-    mock_instance.get.return_value = cached_data
+    mock_instance.getex.return_value = cached_data
 
     result = Cache.get_cached_result(content_hash, reset_ttl=True, ttl=ttl)
 
     assert result == {"data": "example"}
-    mock_instance.expire.assert_called_once_with('presto_media_cache:'+content_hash, ttl)
+    mock_instance.getex.assert_called_once_with('presto_media_cache:'+content_hash, ex=ttl)
+    mock_instance.get.assert_not_called()
+    mock_instance.expire.assert_not_called()
 
 def test_get_cached_result_not_exists(mock_redis_client):
     mock_instance = mock_redis_client.from_url.return_value
     content_hash = "test_hash"
-    mock_instance.get.return_value = None
+    mock_instance.getex.return_value = None
 
     result = Cache.get_cached_result(content_hash)
 
@@ -50,3 +57,216 @@ def test_get_cached_result_no_ttl_reset(mock_redis_client):
 
     assert result == {"data": "example"}
     mock_instance.expire.assert_not_called()
+    mock_instance.getex.assert_not_called()
+
+def test_client_is_shared(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.getex.return_value = None
+
+    Cache.get_cached_result("first")
+    Cache.set_cached_result("second", {"data": "example"})
+
+    assert Cache.get_client() is mock_instance
+    mock_redis_client.from_url.assert_called_once()
+
+def test_get_cached_result_without_getex(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.getex.side_effect = redis.ResponseError("unknown command 'GETEX'")
+    pipeline = mock_instance.pipeline.return_value
+    pipeline.execute.return_value = ['{"data": "example"}', True]
+
+    assert Cache.get_cached_result("test_hash", ttl=3600) == {"data": "example"}
+    assert Cache.get_cached_result("test_hash", ttl=3600) == {"data": "example"}
+
+    mock_instance.getex.assert_called_once()
+    mock_instance.pipeline.assert_called_with(transaction=False)
+    pipeline.get.assert_called_with('presto_media_cache:test_hash')
+    pipeline.expire.assert_called_with('presto_media_cache:test_hash', 3600)
+    assert pipeline.execute.call_count == 2
+
+def test_get_many_pipelines_getex(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    pipeline = mock_instance.pipeline.return_value
+    pipeline.execute.return_value = ['{"data": 1}', None]
+
+    results = Cache.get_many(["first", None, "second"], ttl=3600)
+
+    assert results == [{"data": 1}, None, None]
+    assert [call.args for call in pipeline.getex.call_args_list] == [('presto_media_cache:first',), ('presto_media_cache:second',)]
+    assert pipeline.getex.call_args.kwargs == {"ex": 3600}
+    pipeline.execute.assert_called_once()
+    mock_instance.getex.assert_not_called()
+
+def test_get_many_without_ttl_reset_uses_mget(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.mget.return_value = [None, '{"data": 2}']
+
+    assert Cache.get_many(["first", "second"], reset_ttl=False) == [None, {"data": 2}]
+    mock_instance.mget.assert_called_once_with(['presto_media_cache:first', 'presto_media_cache:second'])
+    mock_instance.pipeline.assert_not_called()
+
+def test_get_many_without_getex(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    pipeline = mock_instance.pipeline.return_value
+    pipeline.execute.side_effect = [redis.ResponseError("unknown command 'GETEX'"), ['{"data": 1}', True, None, False]]
+
+    assert Cache.get_many(["first", "second"], ttl=3600) == [{"data": 1}, None]
+    pipeline.expire.assert_called_with('presto_media_cache:second', 3600)
+
+def test_get_many_skips_redis_without_keys(mock_redis_client):
+    assert Cache.get_many([None, ""]) == [None, None]
+    mock_redis_client.from_url.assert_not_called()
+
+def test_set_many_pipelines_setex(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    pipeline = mock_instance.pipeline.return_value
+
+    Cache.set_many({"first": {"data": 1}, None: {"data": 2}, "second": [1, 2]}, ttl=3600)
+
+    mock_instance.pipeline.assert_called_once_with(transaction=False)
+    assert [call.args for call in pipeline.setex.call_args_list] == [
+        ('presto_media_cache:first', 3600, b'{"data": 1}'),
+        ('presto_media_cache:second', 3600, b'[1, 2]'),
+    ]
+    pipeline.execute.assert_called_once()
+    mock_instance.setex.assert_not_called()
+
+def test_vector_round_trips_as_float32(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    vector = [0.5, -1.25, 3.0]
+
+    Cache.set_cached_result("vector_hash", vector, vector=True)
+    stored = mock_instance.setex.call_args.args[2]
+    mock_instance.getex.return_value = stored
+
+    assert len(stored) == 4 + 4 * len(vector)
+    assert Cache.get_cached_result("vector_hash") == vector
+
+@pytest.fixture
+def local_tier(mock_redis_client):
+    with patch('lib.cache.CACHE_LOCAL_MAX_ENTRIES', 10):
+        yield mock_redis_client.from_url.return_value
+
+def test_local_tier_reads_through_and_serves_repeats(local_tier):
+    local_tier.getex.return_value = b'{"data": "example"}'
+
+    assert Cache.get_cached_result("test_hash") == {"data": "example"}
+    assert Cache.get_cached_result("test_hash") == {"data": "example"}
+
+    local_tier.getex.assert_called_once_with('presto_media_cache:test_hash', ex=86400)
+
+def test_local_tier_is_written_through(local_tier):
+    Cache.set_many({"first": {"data": 1}})
+    Cache.set_cached_result("second", {"data": 2})
+
+    assert Cache.get_many(["first", "second", "third"]) == [{"data": 1}, {"data": 2}, None]
+    local_tier.pipeline.return_value.getex.assert_called_once_with('presto_media_cache:third', ex=86400)
+
+def test_invalidate_removes_both_tiers(local_tier):
+    Cache.set_cached_result("test_hash", {"data": "example"})
+    local_tier.getex.return_value = None
+
+    Cache.invalidate("test_hash")
+
+    local_tier.delete.assert_called_once_with('presto_media_cache:test_hash')
+    assert Cache.get_cached_result("test_hash") is None
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(max_entries=2, max_bytes=10, ttl_seconds=60)
+    local.set("a", b"1234")
+    local.set("b", b"1234")
+    local.get("a")
+    local.set("c", b"1234")
+    assert (local.get("a"), local.get("b"), local.get("c")) == (b"1234", None, b"1234")
+    local.set("d", b"12345678")
+    assert (local.get("a"), local.get("c"), local.get("d")) == (None, None, b"12345678")
+    assert local.size == 8
+    local.set("e", b"12345678901")
+    assert local.get("e") is None
+
+def test_local_cache_expires_entries():
+    local = LocalCache(max_entries=2, max_bytes=100, ttl_seconds=0.05)
+    local.set("a", b"1")
+    assert local.get("a") == b"1"
+    time.sleep(0.06)
+    assert local.get("a") is None
+    assert local.size == 0
+
+def test_local_cache_drops_fill_that_raced_a_delete():
+    local = LocalCache(max_entries=2, max_bytes=100, ttl_seconds=60)
+    generation = local.generation
+    local.delete("a")
+    local.set("a", b"stale", generation)
+    assert local.get("a") is None
+
+def test_namespace_prefixes_keys(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.getex.return_value = None
+
+    Cache.set_cached_result("test_hash", {"data": "example"}, ttl=60, namespace="video__Model:1")
+    Cache.get_cached_result("test_hash", ttl=60, namespace="video__Model:1")
+
+    mock_instance.setex.assert_called_once_with('presto_media_cache:video__Model:1:test_hash', 60, b'{"data": "example"}')
+    mock_instance.getex.assert_called_once_with('presto_media_cache:video__Model:1:test_hash', ex=60)
+
+def test_set_many_evicts_least_recently_used_over_max_entries(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    pipeline = mock_instance.pipeline.return_value
+    # Two SETEXs, then ZADD, ZREMRANGEBYSCORE, EXPIRE and ZCARD of the namespace index.
+    pipeline.execute.return_value = [True, True, 2, 0, True, 5]
+    mock_instance.zpopmin.return_value = [(b'presto_media_cache:yake:1:old', 1.0)]
+
+    Cache.set_many({"a": ["x"], "b": ["y"]}, ttl=60, namespace="yake:1", max_entries=4)
+
+    index = 'presto_media_cache_index:yake:1'
+    pipeline.zadd.assert_called_once()
+    assert pipeline.zadd.call_args.args[0] == index
+    assert set(pipeline.zadd.call_args.args[1]) == {'presto_media_cache:yake:1:a', 'presto_media_cache:yake:1:b'}
+    mock_instance.zpopmin.assert_called_once_with(index, 1)
+    mock_instance.delete.assert_called_once_with('presto_media_cache:yake:1:old')
+
+def test_set_many_does_not_evict_within_max_entries(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.pipeline.return_value.execute.return_value = [True, 1, 0, True, 4]
+
+    Cache.set_many({"a": ["x"]}, ttl=60, namespace="yake:1", max_entries=4)
+
+    mock_instance.zpopmin.assert_not_called()
+
+def test_get_many_refreshes_last_use_in_capped_namespace(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    pipeline = mock_instance.pipeline.return_value
+    pipeline.execute.return_value = [b'["x"]', None, 1, 0, True]
+
+    results = Cache.get_many(["a", "b"], ttl=60, namespace="yake:1", max_entries=4)
+
+    assert results == [["x"], None]
+    assert pipeline.zadd.call_args.kwargs == {"xx": True}
+    mock_instance.mget.assert_not_called()
+
+@patch('lib.cache.CACHE_LEGACY_FALLBACK', True)
+def test_misses_fall_back_to_legacy_keys(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.pipeline.return_value.execute.side_effect = [[None, None], [True]]
+    mock_instance.mget.return_value = [b'{"data": "old"}', None]
+
+    results = Cache.get_many(["a", "b"], ttl=60, namespace="video__Model:1")
+
+    assert results == [{"data": "old"}, None]
+    mock_instance.mget.assert_called_once_with(['presto_media_cache:a', 'presto_media_cache:b'])
+    # The legacy entry is copied into the namespace, so it is read the old way only once.
+    mock_instance.pipeline.return_value.setex.assert_called_once_with('presto_media_cache:video__Model:1:a', 60, b'{"data": "old"}')
+
+def test_legacy_keys_are_not_read_by_default(mock_redis_client):
+    mock_instance = mock_redis_client.from_url.return_value
+    mock_instance.getex.return_value = None
+
+    assert Cache.get_cached_result("a", ttl=60, namespace="video__Model:1") is None
+    mock_instance.mget.assert_not_called()
+
+@patch('lib.cache.OPEN_TELEMETRY_EXPORTER')
+def test_writes_count_as_cache_misses(mock_exporter, mock_redis_client):
+    Cache.set_cached_result("a", ["x"])
+    Cache.set_many({"b": ["y"]})
+
+    assert [call.args for call in mock_exporter.log_execution_status.call_args_list] == [("cache_miss_response", "cache_miss_response")] * 2
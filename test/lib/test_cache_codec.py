@@ -0,0 +1,67 @@
+import json
+import zlib
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from lib import cache_codec
+from lib.cache_codec import CacheCodec, CODEC_JSON, COMPRESSION_ZLIB
+
+class TestCacheCodec(unittest.TestCase):
+    def test_small_json_is_stored_bare(self):
+        result = {"hash_value": "abc", "vector": [1, 2]}
+        encoded = CacheCodec.encode(result)
+        self.assertEqual(encoded, json.dumps(result).encode("utf-8"))
+        self.assertEqual(CacheCodec.decode(encoded), result)
+
+    def test_legacy_json_entries_decode(self):
+        self.assertEqual(CacheCodec.decode(b'[0.1, 0.2]'), [0.1, 0.2])
+        self.assertEqual(CacheCodec.decode('{"data": "example"}'), {"data": "example"})
+
+    def test_vector_is_stored_as_float32(self):
+        vector = np.random.rand(768).astype(np.float32).tolist()
+        encoded = CacheCodec.encode(vector, vector=True)
+        self.assertEqual(len(encoded), 4 + 4 * 768)
+        self.assertLess(len(encoded), len(json.dumps(vector)) / 4)
+        self.assertEqual(CacheCodec.decode(encoded), vector)
+
+    @patch.object(cache_codec, 'CACHE_VECTOR_DTYPE', 'float16')
+    def test_vector_can_be_stored_as_float16(self):
+        vector = [0.1, 0.25, -3.5]
+        encoded = CacheCodec.encode(vector, vector=True)
+        self.assertEqual(len(encoded), 4 + 2 * 3)
+        np.testing.assert_allclose(CacheCodec.decode(encoded), vector, rtol=1e-3)
+
+    @patch.object(cache_codec, 'CACHE_VECTOR_DTYPE', 'json')
+    def test_vector_can_be_stored_as_json(self):
+        vector = [0.1, 0.25, -3.5]
+        self.assertEqual(CacheCodec.encode(vector, vector=True), json.dumps(vector).encode("utf-8"))
+
+    def test_float_lists_stay_json_unless_opted_in(self):
+        scores = [0.1, 1 / 3, 2.0 ** -40]
+        encoded = CacheCodec.encode(scores)
+        self.assertEqual(encoded, json.dumps(scores).encode("utf-8"))
+        self.assertEqual(CacheCodec.decode(encoded), scores)
+
+    def test_mixed_lists_are_not_vectors(self):
+        for result in [[], [1, 2], [0.5, "a"], [0.5, True]]:
+            self.assertEqual(CacheCodec.decode(CacheCodec.encode(result)), result)
+
+    @patch.object(cache_codec, 'ZSTD_AVAILABLE', False)
+    def test_large_json_is_compressed(self):
+        result = {"classification": [{"label": "label %d" % (i % 10), "score": 0.5} for i in range(500)]}
+        encoded = CacheCodec.encode(result)
+        self.assertEqual(encoded[:4], CacheCodec.header(CODEC_JSON, COMPRESSION_ZLIB))
+        self.assertLess(len(encoded), len(json.dumps(result)) / 4)
+        self.assertEqual(CacheCodec.decode(encoded), result)
+
+    def test_unreadable_entries_decode_as_missing(self):
+        newer_version = b"\x00\x02\x00\x00{}"
+        unknown_compression = CacheCodec.header(CODEC_JSON, 9) + b"{}"
+        corrupt = CacheCodec.header(CODEC_JSON, COMPRESSION_ZLIB) + b"not zlib"
+        for data in [newer_version, unknown_compression, corrupt, b"\x00"]:
+            self.assertIsNone(CacheCodec.decode(data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,23 +2,20 @@ from fastapi.testclient import TestClient
 import unittest
 from unittest.mock import patch
 from lib.http import app
-from lib.queue.worker import QueueWorker
+from lib.queue.queue import Queue
 
 class TestProcessItem(unittest.TestCase):
     def setUp(self):
         self.client = TestClient(app)
 
-    @patch.object(QueueWorker, 'create')
-    @patch.object(QueueWorker, 'push_message')
-    def test_process_item(self, mock_push_message, mock_create):
-        mock_queue = mock_create.return_value
-        mock_queue.input_queue_name = "input_queue"
-        mock_queue.output_queue_name = "output_queue"
-
+    @patch.object(Queue, 'push_message')
+    def test_process_item(self, mock_push_message):
         test_data = {"id": 1, "callback_url": "http://example.com", "text": "This is a test"}
 
         response = self.client.post("/process_item/fptg__Model", json=test_data)
-        mock_create.assert_called_once_with("fptg__Model")
+        queue_name, message = mock_push_message.call_args.args
+        self.assertEqual(queue_name, f"{Queue.get_queue_prefix()}fptg__Model{Queue.get_queue_suffix()}")
+        self.assertEqual(message.body.text, "This is a test")
         self.assertEqual(response.status_code, 200)
         res = response.json()
         self.assertEqual(response.json(), {'message': 'Message pushed successfully', 'queue': 'fptg__Model', 'body': {'id': 1, 'callback_url': 'http://example.com', 'text': 'This is a test'}})
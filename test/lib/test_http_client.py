@@ -0,0 +1,126 @@
+import os
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+
+from lib.http_client import CachingDNSBackend, HTTPClient
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        status = 404 if self.path == "/missing" else 200
+        body = b"media bytes"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHTTPClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://localhost:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        HTTPClient.close()
+        KeepAliveHandler.connections = 0
+
+    def tearDown(self):
+        HTTPClient.close()
+
+    def test_connections_are_reused(self):
+        for i in range(5):
+            with HTTPClient.stream(f"{self.url}/item/{i}") as response:
+                self.assertEqual(response.read(), b"media bytes")
+        self.assertEqual(KeepAliveHandler.connections, 1)
+
+    def test_client_is_shared_within_process(self):
+        self.assertIs(HTTPClient.get_client(), HTTPClient.get_client())
+
+    def test_client_is_rebuilt_after_fork(self):
+        client = HTTPClient.get_client()
+        with patch('os.getpid', return_value=-1):
+            self.assertIsNot(HTTPClient.get_client(), client)
+
+    def test_fork_while_lock_held(self):
+        read, write = os.pipe()
+        with HTTPClient._lock:
+            pid = os.fork()
+            if pid == 0:
+                # The child must not inherit the held lock.
+                HTTPClient.get_host_semaphore(self.url)
+                os.write(write, b"ok")
+                os._exit(0)
+        os.close(write)
+        deadline = time.time() + 5
+        while os.waitpid(pid, os.WNOHANG) == (0, 0) and time.time() < deadline:
+            time.sleep(0.05)
+        if time.time() >= deadline:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+        self.assertEqual(os.read(read, 2), b"ok")
+        os.close(read)
+
+    def test_error_status_raises(self):
+        with self.assertRaises(httpx.HTTPStatusError):
+            with HTTPClient.stream(f"{self.url}/missing"):
+                pass
+
+    def test_host_semaphores(self):
+        first = HTTPClient.get_host_semaphore(f"{self.url}/a")
+        self.assertIs(first, HTTPClient.get_host_semaphore(f"{self.url}/b"))
+        self.assertIsNot(first, HTTPClient.get_host_semaphore("http://example.com/a"))
+
+    def test_dns_cache(self):
+        backend = CachingDNSBackend(ttl=60)
+        port = self.server.server_address[1]
+        with patch('socket.getaddrinfo', wraps=socket.getaddrinfo) as mock_getaddrinfo:
+            for _ in range(3):
+                backend.connect_tcp("localhost", port).close()
+        mock_getaddrinfo.assert_called_once()
+
+    def test_client_connects_through_dns_cache(self):
+        with patch.object(CachingDNSBackend, 'resolve', autospec=True, side_effect=CachingDNSBackend.resolve) as mock_resolve:
+            with HTTPClient.stream(f"{self.url}/item") as response:
+                self.assertEqual(response.read(), b"media bytes")
+        mock_resolve.assert_called_once()
+        self.assertEqual(mock_resolve.call_args.args[1:], ("localhost", self.server.server_address[1]))
+
+    def test_connect_errors_are_httpx_errors(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        with self.assertRaises(httpx.ConnectError):
+            with HTTPClient.stream(f"http://127.0.0.1:{port}/item"):
+                pass
+
+    def test_dns_cache_expires(self):
+        backend = CachingDNSBackend(ttl=0)
+        with patch('socket.getaddrinfo', wraps=socket.getaddrinfo) as mock_getaddrinfo:
+            backend.resolve("localhost", 80)
+            backend.resolve("localhost", 80)
+        self.assertEqual(mock_getaddrinfo.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lib.queue.worker import QueueWorker
+from lib.supervisor import WorkerSupervisor, BATCHES, EXECUTION_PID, HEARTBEAT
+
+class FakeQueue:
+    """
+    Stands in for QueueWorker in the forked children; behaviour is picked by the model name.
+    """
+    on_execution_process = None
+
+    def process(self, model):
+        if model.model_name == "crash":
+            os._exit(1)
+        if model.model_name == "hang_in_execution":
+            # Like a process-mode execution child, sleep leads a process group of its own.
+            self.on_execution_process(subprocess.Popen(["sleep", "60"], start_new_session=True).pid)
+            time.sleep(60)
+        if model.model_name == "hang":
+            time.sleep(60)
+        time.sleep(0.01)
+        return ["response", "response"]
+
+def make_model(name):
+    model = MagicMock()
+    model.model_name = name
+    return model
+
+def process_gone(pid):
+    """
+    Whether pid has exited; a killed orphan may linger as a zombie until its new parent reaps it.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+def wait_for(condition, seconds=5):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+@patch('lib.supervisor.QueueWorker.create', return_value=FakeQueue())
+class TestWorkerSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.supervisors = []
+
+    def tearDown(self):
+        for supervisor in self.supervisors:
+            supervisor.shutdown()
+
+    def make_supervisor(self, name, num_workers=2):
+        supervisor = WorkerSupervisor(make_model(name), num_workers=num_workers)
+        self.supervisors.append(supervisor)
+        return supervisor
+
+    def test_children_share_model_and_count_throughput(self, mock_create):
+        supervisor = self.make_supervisor("ok")
+        for child in supervisor.children:
+            supervisor.check_child(child, time.time())
+        self.assertTrue(wait_for(lambda: all(child.counters[BATCHES] >= 3 for child in supervisor.children)))
+        status = supervisor.status(time.time())
+        self.assertEqual(len(status), 2)
+        self.assertEqual(len({entry["pid"] for entry in status}), 2)
+        for entry in status:
+            self.assertTrue(entry["alive"])
+            self.assertEqual(entry["messages"], 2 * entry["batches"])
+            self.assertGreater(entry["messages_per_second"], 0)
+
+    def test_exited_child_is_restarted_without_delay(self, mock_create):
+        supervisor = self.make_supervisor("ok", num_workers=1)
+        child = supervisor.children[0]
+        supervisor.check_child(child, time.time())
+        pid = child.process.pid
+        child.process.kill()
+        child.process.join()
+        with patch('lib.supervisor.SUPERVISOR_MIN_UPTIME_SECONDS', 0):
+            supervisor.check_child(child, time.time())
+        self.assertEqual(child.restarts, 1)
+        self.assertNotEqual(child.process.pid, pid)
+        self.assertTrue(child.process.is_alive())
+
+    @patch('lib.supervisor.SUPERVISOR_MAX_BACKOFF_SECONDS', 4)
+    def test_crash_loop_backs_off(self, mock_create):
+        supervisor = self.make_supervisor("crash", num_workers=1)
+        child = supervisor.children[0]
+        backoffs = []
+        for _ in range(4):
+            supervisor.check_child(child, time.time())
+            child.process.join()
+            supervisor.check_child(child, time.time())
+            backoffs.append(child.backoff)
+            child.restart_at = 0
+        self.assertEqual(backoffs, [1, 2, 4, 4])
+
+    @patch('lib.supervisor.SUPERVISOR_MIN_UPTIME_SECONDS', 0)
+    @patch('lib.supervisor.SUPERVISOR_HEARTBEAT_TIMEOUT_SECONDS', 0.5)
+    def test_hung_child_is_killed(self, mock_create):
+        supervisor = self.make_supervisor("hang", num_workers=1)
+        child = supervisor.children[0]
+        supervisor.check_child(child, time.time())
+        pid = child.process.pid
+        supervisor.check_child(child, time.time() + 1)
+        self.assertEqual(child.restarts, 1)
+        self.assertNotEqual(child.process.pid, pid)
+
+    @patch('lib.supervisor.SUPERVISOR_MIN_UPTIME_SECONDS', 0)
+    @patch('lib.supervisor.SUPERVISOR_HEARTBEAT_TIMEOUT_SECONDS', 0.5)
+    def test_hung_child_execution_process_is_killed(self, mock_create):
+        supervisor = self.make_supervisor("hang_in_execution", num_workers=1)
+        child = supervisor.children[0]
+        supervisor.check_child(child, time.time())
+        self.assertTrue(wait_for(lambda: child.counters[EXECUTION_PID] > 0))
+        execution_pid = int(child.counters[EXECUTION_PID])
+        supervisor.check_child(child, time.time() + 1)
+        self.assertEqual(child.restarts, 1)
+        self.assertTrue(wait_for(lambda: process_gone(execution_pid)))
+
+    @patch('lib.queue.worker.PREFETCH_BATCHES', 1)
+    @patch('lib.queue.worker.PREFETCH_WAIT_SECONDS', 0.1)
+    @patch('lib.supervisor.SUPERVISOR_HEARTBEAT_TIMEOUT_SECONDS', 0.5)
+    def test_idle_prefetching_child_keeps_heartbeat(self, mock_create):
+        with patch.object(QueueWorker, 'get_sqs', return_value=MagicMock()):
+            worker = QueueWorker("image__Model", "image__Model_output", "image__Model_dlq")
+        worker.receive_messages = lambda batch_size: time.sleep(0.05) or []
+        mock_create.return_value = worker
+        supervisor = self.make_supervisor("idle", num_workers=1)
+        supervisor.model.MEDIA_DOWNLOAD = "buffer"
+        child = supervisor.children[0]
+        supervisor.check_child(child, time.time())
+        pid = child.process.pid
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            supervisor.check_child(child, time.time())
+            time.sleep(0.1)
+        self.assertEqual(child.restarts, 0)
+        self.assertEqual(child.process.pid, pid)
+        self.assertLess(time.time() - child.counters[HEARTBEAT], 0.5)
+
+    @patch('lib.supervisor.SUPERVISOR_REPORT_SECONDS', 0)
+    def test_run_writes_status_file(self, mock_create):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            status_file = os.path.join(temp_dir, "status.json")
+            with patch('lib.supervisor.SUPERVISOR_STATUS_FILE', status_file):
+                supervisor = self.make_supervisor("ok")
+                supervisor.run(poll_seconds=0.1, max_seconds=0.5)
+            with open(status_file) as f:
+                status = json.load(f)
+        self.assertEqual([entry["worker"] for entry in status["workers"]], [0, 1])
+        self.assertTrue(all(not child.process.is_alive() for child in supervisor.children))
+
+if __name__ == '__main__':
+    unittest.main()
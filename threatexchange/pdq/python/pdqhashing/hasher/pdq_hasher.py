@@ -60,14 +60,33 @@ class PDQHasher:
             d[i] = di
         return d
 
-    def __init__(self) -> None:
+    def __init__(self, draftMode=None) -> None:
         """Christoph Zauner 'Implementation and Benchmarking of Perceptual
         Image Hash Functions' 2010
 
         See also comments on dct64To16. Input is (0..63)x(0..63); output is
         (1..16)x(1..16) with the latter indexed as (0..15)x(0..15).
-        Returns 16x64 matrix."""
+        Returns 16x64 matrix.
+
+        draftMode trades exactness for decode speed on JPEGs, see readImage:
+        None (the default) decodes exactly as before, "RGB" decodes at reduced
+        scale and "L" additionally decodes straight to luma."""
         self.DCT_matrix = self.compute_dct_matrix()
+        self.draftMode = draftMode
+
+    def allocateBuffers(self, numRows, numCols):
+        """Scratch buffers for hashing one numRows x numCols image: two
+        full-size row-major luma buffers, the 64x64 downsample, the 16x64 DCT
+        intermediate and two 16x16 DCT outputs (the second one is only used
+        for dihedral transforms)."""
+        return (
+            MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols),
+            MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols),
+            MatrixUtil.allocateMatrix(64, 64),
+            MatrixUtil.allocateMatrix(16, 64),
+            MatrixUtil.allocateMatrix(16, 16),
+            MatrixUtil.allocateMatrix(16, 16),
+        )
 
     class HashingMetadata:
         def __init__(self) -> None:
@@ -75,23 +94,42 @@ class PDQHasher:
             self.hashSeconds = float(-1.0)
             self.imageHeightTimesWidth = -1
 
-    def fromFile(self, filepath, hashingMetadata=None):
-        t1 = time.time()
-        img = None
+    @classmethod
+    def readImage(cls, source, draftMode=None):
+        """Opens an image from a filename or file-like object, resized
+        proportionally to at most 512x512."""
         try:
-            img = Image.open(filepath)
+            img = Image.open(source)
+            if draftMode is not None:
+                # JPEG only, a no-op for other formats: let the decoder
+                # downscale by 1/2, 1/4 or 1/8 in the DCT domain, keeping
+                # both sides at least 512 so that thumbnail still does the
+                # final resize. thumbnail drafts by itself too, but only
+                # down to 1024 (its reducing_gap of 2), so this saves at
+                # most one more halving. In "L" mode only the Y channel is
+                # decoded; its JFIF coefficients are the LUMA_FROM_*_COEFFs,
+                # so no YCbCr->RGB conversion is needed at all.
+                img.draft(draftMode, (512, 512))
             # resizing the image proportionally to max 512px width and max 512px height
             img.thumbnail((512, 512))
         except IOError as e:
             raise e
+        return img
+
+    def fromFile(self, filepath, hashingMetadata=None):
+        t1 = time.time()
+        img = self.readImage(filepath, self.draftMode)
         t2 = time.time()
         readSeconds = t2 - t1
         numCols, numRows = img.size
-        buffer1 = MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols)
-        buffer2 = MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols)
-        buffer64x64 = MatrixUtil.allocateMatrix(64, 64)
-        buffer16x64 = MatrixUtil.allocateMatrix(16, 64)
-        buffer16x16 = MatrixUtil.allocateMatrix(16, 16)
+        (
+            buffer1,
+            buffer2,
+            buffer64x64,
+            buffer16x64,
+            buffer16x16,
+            _buffer16x16Aux,
+        ) = self.allocateBuffers(numRows, numCols)
         t1 = time.time()
         rv = self.fromImage(
             img, buffer1, buffer2, buffer64x64, buffer16x64, buffer16x16
@@ -105,22 +143,53 @@ class PDQHasher:
         return rv
 
     def fromBufferedImage(self, img_bytes):
-        try:
-            img = Image.open(img_bytes)
-            # resizing the image proportionally to max 512px width and max 512px height
-            img.thumbnail((512, 512))
-        except IOError as e:
-            raise e
+        img = self.readImage(img_bytes, self.draftMode)
         numCols, numRows = img.size
-        buffer1 = MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols)
-        buffer2 = MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols)
-        buffer64x64 = MatrixUtil.allocateMatrix(64, 64)
-        buffer16x64 = MatrixUtil.allocateMatrix(16, 64)
-        buffer16x16 = MatrixUtil.allocateMatrix(16, 16)
+        (
+            buffer1,
+            buffer2,
+            buffer64x64,
+            buffer16x64,
+            buffer16x16,
+            _buffer16x16Aux,
+        ) = self.allocateBuffers(numRows, numCols)
         return self.fromImage(
             img, buffer1, buffer2, buffer64x64, buffer16x64, buffer16x16
         )
 
+    def fromBufferedImages(self, imgBytesList):
+        """Hashes several images at once; returns one HashAndQuality per
+        input, in input order."""
+        return self.fromImages(
+            [self.readImage(img_bytes, self.draftMode) for img_bytes in imgBytesList]
+        )
+
+    def fromImages(self, imgs):
+        """Scratch buffers are allocated once per distinct image size and
+        shared by all images of that size."""
+        buffersBySize = {}
+        rv = []
+        for img in imgs:
+            numCols, numRows = img.size
+            if (numRows, numCols) not in buffersBySize:
+                buffersBySize[(numRows, numCols)] = self.allocateBuffers(
+                    numRows, numCols
+                )
+            (
+                buffer1,
+                buffer2,
+                buffer64x64,
+                buffer16x64,
+                buffer16x16,
+                _buffer16x16Aux,
+            ) = buffersBySize[(numRows, numCols)]
+            rv.append(
+                self.fromImage(
+                    img, buffer1, buffer2, buffer64x64, buffer16x64, buffer16x16
+                )
+            )
+        return rv
+
     def fromImage(self, img, buffer1, buffer2, buffer64x64, buffer16x64, buffer16x16):
         numCols, numRows = img.size
         self.fillFloatLumaFromBufferImage(img, buffer1)
@@ -130,6 +199,12 @@ class PDQHasher:
 
     def fillFloatLumaFromBufferImage(self, img, luma):
         numCols, numRows = img.size
+        if img.mode == "L" and self.draftMode == "L":
+            # Already luma, as decoded by readImage.
+            for i in range(numRows):
+                for j in range(numCols):
+                    luma[i * numCols + j] = float(img.getpixel((j, i)))
+            return
         rgb_image = img.convert("RGB")
         numCols, numRows = img.size
         for i in range(numRows):
@@ -179,12 +254,14 @@ class PDQHasher:
         hashingMetadata.readSeconds = t2 - t1
         numCols, numRows = img.size
         hashingMetadata.imageHeightTimesWidth = numRows * numCols
-        buffer1 = MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols)
-        buffer2 = MatrixUtil.allocateMatrixAsRowMajorArray(numRows, numCols)
-        buffer64x64 = MatrixUtil.allocateMatrix(64, 64)
-        buffer16x64 = MatrixUtil.allocateMatrix(16, 64)
-        buffer16x16 = MatrixUtil.allocateMatrix(16, 16)
-        buffer16x16Aux = MatrixUtil.allocateMatrix(16, 16)
+        (
+            buffer1,
+            buffer2,
+            buffer64x64,
+            buffer16x64,
+            buffer16x16,
+            buffer16x16Aux,
+        ) = self.allocateBuffers(numRows, numCols)
         t1 = time.time()
         rv = self.dihedralFromBufferedImage(
             img,
@@ -200,6 +277,16 @@ class PDQHasher:
         hashingMetadata.hashSeconds = t2 - t1
         return rv
 
+    def dihedralFromBytes(self, img_bytes, dihFlags=PDQ_DO_DIH_ALL):
+        """All dihedral-transform hashes of an image held in memory, from a
+        single decode and a single DCT. The image is read as by
+        fromBufferedImage, so the original hash is the same as its hash."""
+        img = self.readImage(img_bytes, self.draftMode)
+        numCols, numRows = img.size
+        return self.dihedralFromBufferedImage(
+            img, *self.allocateBuffers(numRows, numCols), dihFlags
+        )
+
     def dihedralFromBufferedImage(
         self,
         img,
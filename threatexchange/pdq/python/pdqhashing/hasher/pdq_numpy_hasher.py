@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import collections
+import threading
+
+import numpy
+
+from pdqhashing.hasher.pdq_hasher import PDQHasher
+from pdqhashing.types.containers import HashAndQuality
+from pdqhashing.types.hash256 import Hash256
+
+
+class PDQNumpyHasher(PDQHasher):
+    """NumPy-backed drop-in for PDQHasher.
+
+    Buffers are numpy float64 arrays instead of lists-of-lists, and the
+    per-pixel loops of the pure-Python hasher are replaced by whole-row or
+    whole-column array operations. Every floating-point operation is kept in
+    the same order as in PDQHasher (no cumulative sums, no BLAS matrix
+    products), so hashes and quality scores are bit-identical to the
+    pure-Python implementation.
+
+    The array methods accept buffers with any number of leading dimensions,
+    which is how fromImages hashes a stack of same-sized images in one pass.
+    Scratch buffers are pooled per thread and per image size, so methods
+    remain threadsafe."""
+
+    # Number of distinct image sizes whose scratch buffers are kept per thread.
+    BUFFER_POOL_MAX_SIZES = 8
+
+    # Sign patterns of the dct16OriginalTo* transforms (see the table in
+    # PDQHasher): +1 where a coefficient is kept, -1 where it is negated.
+    DCT16_SIGNS_ODD_ROWS = numpy.fromfunction(
+        lambda i, j: numpy.where(i % 2 == 1, 1.0, -1.0), (16, 16)
+    )
+    DCT16_SIGNS_ODD_COLS = numpy.fromfunction(
+        lambda i, j: numpy.where(j % 2 == 1, 1.0, -1.0), (16, 16)
+    )
+    DCT16_SIGNS_EVEN_SUMS = numpy.fromfunction(
+        lambda i, j: numpy.where((i + j) % 2 == 1, -1.0, 1.0), (16, 16)
+    )
+
+    def __init__(self, draftMode=None) -> None:
+        super().__init__(draftMode)
+        self.DCT_matrix = numpy.array(self.DCT_matrix, dtype=numpy.float64)
+        self.threadLocal = threading.local()
+
+    def getBatchBuffers(self, numImages, numRows, numCols):
+        """Pooled equivalent of allocateBuffers for a stack of numImages
+        images; every returned buffer has numImages as its leading dimension.
+        Contents are left over from previous use."""
+        pool = getattr(self.threadLocal, "bufferPool", None)
+        if pool is None:
+            pool = self.threadLocal.bufferPool = collections.OrderedDict()
+        key = (numRows, numCols)
+        buffers = pool.pop(key, None)
+        if buffers is None or buffers[0].shape[0] < numImages:
+            buffers = tuple(
+                numpy.zeros((numImages,) + shape, dtype=numpy.float64)
+                for shape in (
+                    (numRows, numCols),
+                    (numRows, numCols),
+                    (64, 64),
+                    (16, 64),
+                    (16, 16),
+                    (16, 16),
+                )
+            )
+        pool[key] = buffers
+        while len(pool) > self.BUFFER_POOL_MAX_SIZES:
+            pool.popitem(last=False)
+        return tuple(buffer[:numImages] for buffer in buffers)
+
+    def allocateBuffers(self, numRows, numCols):
+        return tuple(buffer[0] for buffer in self.getBatchBuffers(1, numRows, numCols))
+
+    def fromImages(self, imgs):
+        """Images are grouped by size and each group is hashed as a single
+        stack, so the per-operation overhead is paid once per group rather
+        than once per image."""
+        indicesBySize = collections.defaultdict(list)
+        for index, img in enumerate(imgs):
+            numCols, numRows = img.size
+            indicesBySize[(numRows, numCols)].append(index)
+        rv = [None] * len(imgs)
+        for (numRows, numCols), indices in indicesBySize.items():
+            (
+                buffer1,
+                buffer2,
+                buffer64x64,
+                buffer16x64,
+                buffer16x16,
+                _buffer16x16Aux,
+            ) = self.getBatchBuffers(len(indices), numRows, numCols)
+            for slot, index in enumerate(indices):
+                self.fillFloatLumaFromBufferImage(imgs[index], buffer1[slot])
+            hashesAndQualities = self.pdqHash256sFromFloatLumas(
+                buffer1,
+                buffer2,
+                numRows,
+                numCols,
+                buffer64x64,
+                buffer16x64,
+                buffer16x16,
+            )
+            for index, hashAndQuality in zip(indices, hashesAndQualities):
+                rv[index] = hashAndQuality
+        return rv
+
+    def pdqHash256sFromFloatLumas(
+        self,
+        fullBuffers1,
+        fullBuffers2,
+        numRows,
+        numCols,
+        buffers64x64,
+        buffers16x64,
+        buffers16x16,
+    ):
+        """pdqHash256FromFloatLuma over a stack of same-sized lumas."""
+        windowSizeAlongRows = self.computeJaroszFilterWindowSize(numCols)
+        windowSizeAlongCols = self.computeJaroszFilterWindowSize(numRows)
+        self.jaroszFilterFloat(
+            fullBuffers1,
+            fullBuffers2,
+            numRows,
+            numCols,
+            windowSizeAlongRows,
+            windowSizeAlongCols,
+            self.PDQ_NUM_JAROSZ_XY_PASSES,
+        )
+        self.decimateFloat(fullBuffers1, numRows, numCols, buffers64x64)
+        qualities = self.computePDQImageDomainQualityMetrics(buffers64x64)
+        self.dct64To16(buffers64x64, buffers16x64, buffers16x16)
+        return [
+            HashAndQuality(hash, quality)
+            for hash, quality in zip(
+                self.pdqBuffers16x16ToBits(buffers16x16), qualities
+            )
+        ]
+
+    def fillFloatLumaFromBufferImage(self, img, luma):
+        if img.mode == "L" and self.draftMode == "L":
+            luma[...] = numpy.asarray(img, dtype=numpy.float64)
+            return
+        rgb = numpy.asarray(img.convert("RGB"), dtype=numpy.float64)
+        luma[...] = (
+            self.LUMA_FROM_R_COEFF * rgb[..., 0]
+            + self.LUMA_FROM_G_COEFF * rgb[..., 1]
+            + self.LUMA_FROM_B_COEFF * rgb[..., 2]
+        )
+
+    @classmethod
+    def decimateFloat(cls, in_, inNumRows, inNumCols, out):
+        rowIndices = [int(((i + 0.5) * inNumRows) / 64) for i in range(64)]
+        colIndices = [int(((j + 0.5) * inNumCols) / 64) for j in range(64)]
+        out[...] = in_[..., numpy.array(rowIndices)[:, None], colIndices]
+
+    @classmethod
+    def computePDQImageDomainQualityMetric(cls, buffer64x64):
+        return cls.computePDQImageDomainQualityMetrics(buffer64x64[numpy.newaxis])[0]
+
+    @classmethod
+    def computePDQImageDomainQualityMetrics(cls, buffers64x64):
+        """computePDQImageDomainQualityMetric for each 64x64 buffer in a
+        stack; returns a list of ints."""
+        gradientSums = 0
+        for d in (
+            buffers64x64[..., :-1, :] - buffers64x64[..., 1:, :],
+            buffers64x64[..., :, :-1] - buffers64x64[..., :, 1:],
+        ):
+            gradientSums = gradientSums + numpy.abs(
+                numpy.trunc((d * 100) / 255)
+            ).astype(numpy.int64).sum(axis=(-2, -1))
+        return [min(int(int(gradientSum) / 90), 100) for gradientSum in gradientSums]
+
+    def dct64To16(self, A, T, B):
+        """Same products and sums as PDQHasher.dct64To16, accumulated one
+        k-term at a time across the whole output so that rounding matches the
+        scalar loops exactly."""
+        D = self.DCT_matrix
+        T[...] = 0.0
+        for k in range(64):
+            T += D[:, k, None] * A[..., k, None, :]
+        B[...] = 0.0
+        for k in range(64):
+            B += T[..., :, k, None] * D[:, k]
+
+    # Each transform is one elementwise sign multiply (exact, as is negation)
+    # and/or a transpose of the last two axes, so it applies to a stack of
+    # 16x16 buffers as well as to a single one.
+    def dct16OriginalToRotate90(self, A, B):
+        B[...] = numpy.swapaxes(A * self.DCT16_SIGNS_ODD_COLS, -1, -2)
+
+    def dct16OriginalToRotate180(self, A, B):
+        B[...] = A * self.DCT16_SIGNS_EVEN_SUMS
+
+    def dct16OriginalToRotate270(self, A, B):
+        B[...] = numpy.swapaxes(A * self.DCT16_SIGNS_ODD_ROWS, -1, -2)
+
+    def dct16OriginalToFlipX(self, A, B):
+        B[...] = A * self.DCT16_SIGNS_ODD_ROWS
+
+    def dct16OriginalToFlipY(self, A, B):
+        B[...] = A * self.DCT16_SIGNS_ODD_COLS
+
+    def dct16OriginalToFlipPlus1(self, A, B):
+        B[...] = numpy.swapaxes(A, -1, -2)
+
+    def dct16OriginalToFlipMinus1(self, A, B):
+        B[...] = numpy.swapaxes(A * self.DCT16_SIGNS_EVEN_SUMS, -1, -2)
+
+    def pdqBuffer16x16ToBits(self, dctOutput16x16):
+        return self.pdqBuffers16x16ToBits(dctOutput16x16[numpy.newaxis])[0]
+
+    @classmethod
+    def pdqBuffers16x16ToBits(cls, dctOutputs16x16):
+        """pdqBuffer16x16ToBits for each 16x16 buffer in a stack; returns a
+        list of Hash256.
+
+        MatrixUtil.torben returns the lower median, i.e. the 128th smallest
+        of the 256 values, which numpy.partition selects directly. Bit
+        i*16+j of the hash is bit i*16+j of the flattened comparison mask, so
+        the mask is packed little-endian straight into the hash value."""
+        flat = dctOutputs16x16.reshape(-1, 256)
+        medians = numpy.partition(flat, 127, axis=-1)[:, 127]
+        packed = numpy.packbits(flat > medians[:, None], axis=-1, bitorder="little")
+        return [Hash256(int.from_bytes(row.tobytes(), "little")) for row in packed]
+
+    @classmethod
+    def boxAlongRowsFloat(cls, input, output, numRows, numCols, windowSize):
+        """
+        input - (...) x numRows x numCols array
+        output - (...) x numRows x numCols array
+        """
+        # Walking along rows means reading strided columns; a transposed
+        # contiguous copy is considerably faster than filtering in place.
+        transposedInput = numpy.ascontiguousarray(numpy.swapaxes(input, -1, -2))
+        transposedOutput = numpy.empty_like(transposedInput)
+        cls.boxAlongColsFloat(
+            transposedInput, transposedOutput, numCols, numRows, windowSize
+        )
+        output[...] = numpy.swapaxes(transposedOutput, -1, -2)
+
+    @classmethod
+    def boxAlongColsFloat(cls, input, output, numRows, numCols, windowSize):
+        """
+        input - (...) x numRows x numCols array
+        output - (...) x numRows x numCols array
+        """
+        cls.box1DFloatAlongAxis(
+            numpy.moveaxis(input, -2, 0), numpy.moveaxis(output, -2, 0), windowSize
+        )
+
+    @classmethod
+    def box1DFloatAlongAxis(cls, invec, outvec, fullWindowSize):
+        """box1DFloat applied along the first axis of invec, for all
+        positions along the remaining axes at once. See PDQHasher.box1DFloat
+        for the four phases."""
+        vectorLength = invec.shape[0]
+        halfWindowSize = int((fullWindowSize + 2) / 2)  # 7->4, 8->5
+        phase_1_nreps = int(halfWindowSize - 1)
+        phase_2_nreps = int(fullWindowSize - halfWindowSize + 1)
+        phase_3_nreps = int(vectorLength - fullWindowSize)
+        phase_4_nreps = int(halfWindowSize - 1)
+        li = 0  # Index of left edge of read window, for subtracts
+        ri = 0  # Index of right edge of read windows, for adds
+        oi = 0  # Index into output vector
+        sum = numpy.zeros(invec.shape[1:], dtype=numpy.float64)
+        currentWindowSize = 0
+
+        # PHASE 1: ACCUMULATE FIRST SUM NO WRITES
+        for _i in range(phase_1_nreps):
+            sum += invec[ri]
+            currentWindowSize += 1
+            ri += 1
+        # PHASE 2: INITIAL WRITES WITH SMALL WINDOW
+        for _i in range(phase_2_nreps):
+            sum += invec[ri]
+            currentWindowSize += 1
+            numpy.divide(sum, currentWindowSize, out=outvec[oi])
+            ri += 1
+            oi += 1
+        # PHASE 3: WRITES WITH FULL WINDOW
+        for _i in range(phase_3_nreps):
+            sum += invec[ri]
+            sum -= invec[li]
+            numpy.divide(sum, currentWindowSize, out=outvec[oi])
+            li += 1
+            ri += 1
+            oi += 1
+        # PHASE 4: FINAL WRITES WITH SMALL WINDOW
+        for _i in range(phase_4_nreps):
+            sum -= invec[li]
+            currentWindowSize -= 1
+            numpy.divide(sum, currentWindowSize, out=outvec[oi])
+            li += 1
+            oi += 1
@@ -0,0 +1 @@
+# pyre-strict
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import heapq
+import itertools
+
+from pdqhashing.types.containers import Hash256AndMetadata
+from pdqhashing.types.hash256 import Hash256
+
+
+class MIH256:
+    """Mutually-indexed hashing for 256-bit hashes, after the C++
+    implementation in pdq/cpp/index/mih.h. See pdq/README-MIH.md for the
+    algorithm and for why the hashes are split into 16 16-bit slots.
+
+    If two hashes are within Hamming distance d, then in at least one of the
+    16 slots they are within floor(d/16) of each other. A radius query
+    therefore only has to look at hashes sharing a slot value with one of
+    the slotwise nearest neighbours of the needle, and then prunes those
+    candidates with the full 256-bit distance.
+
+    Entries are identified by the integer returned from insert. Deleted
+    entries leave a hole in allHashes so the identifiers of the remaining
+    entries do not change while the index is in memory. save does not
+    record identifiers: an index written by save and read back by load
+    numbers its entries 0, 1, 2, ... in order, skipping deleted ones, so keep
+    anything that must survive a reload in the metadata."""
+
+    # Largest d such that floor(d/16) <= MIH_MAX_SLOTWISE_D. Beyond this the
+    # number of slotwise nearest neighbours makes linear search the better
+    # choice.
+    MIH_MAX_D = 63
+    MIH_MAX_SLOTWISE_D = 3
+
+    # All 16-bit XOR masks of weight <= s, for s = 0..MIH_MAX_SLOTWISE_D.
+    SLOTWISE_NEIGHBOR_MASKS = [
+        [
+            sum(1 << bit for bit in bits)
+            for weight in range(s + 1)
+            for bits in itertools.combinations(range(16), weight)
+        ]
+        for s in range(MIH_MAX_SLOTWISE_D + 1)
+    ]
+
+    def __init__(self) -> None:
+        # 1. All hashes+metadata in the index; None where deleted.
+        self.allHashes = []
+        # 2. For each slot index i=0..15: map from slot value to the set of
+        #    indices into allHashes of hashes having that value at slot i.
+        self.slotValuesToIndices = [{} for _ in range(Hash256.HASH256_NUM_SLOTS)]
+        self.numDeleted = 0
+
+    def size(self):
+        return len(self.allHashes) - self.numDeleted
+
+    def get(self):
+        return [entry for entry in self.allHashes if entry is not None]
+
+    @classmethod
+    def slotValues(cls, hash):
+        value = hash.value
+        return [(value >> (16 * i)) & 0xFFFF for i in range(Hash256.HASH256_NUM_SLOTS)]
+
+    def insertAll(self, pairs):
+        return [self.insert(hash, metadata) for hash, metadata in pairs]
+
+    def insert(self, hash, metadata=None):
+        """Adds a hash to the index; returns its identifier."""
+        index = len(self.allHashes)
+        for i, slotValue in enumerate(self.slotValues(hash)):
+            self.slotValuesToIndices[i].setdefault(slotValue, set()).add(index)
+        self.allHashes.append(Hash256AndMetadata(hash, metadata))
+        return index
+
+    def delete(self, index):
+        """Removes the entry with the given identifier, as returned by
+        insert. Raises KeyError if there is no such entry."""
+        if index < 0 or index >= len(self.allHashes) or self.allHashes[index] is None:
+            raise KeyError(index)
+        for i, slotValue in enumerate(self.slotValues(self.allHashes[index].hash)):
+            indices = self.slotValuesToIndices[i][slotValue]
+            indices.discard(index)
+            if not indices:
+                del self.slotValuesToIndices[i][slotValue]
+        self.allHashes[index] = None
+        self.numDeleted += 1
+
+    def deleteHash(self, hash):
+        """Removes all entries with exactly this hash; returns how many were
+        removed."""
+        indices = self.findCandidates(hash, 0)
+        matching = [i for i in indices if self.allHashes[i].hash == hash]
+        for index in matching:
+            self.delete(index)
+        return len(matching)
+
+    def findCandidates(self, needle, d):
+        """Indices of all hashes within slotwise distance floor(d/16) of the
+        needle in at least one slot: a superset of the hashes within d."""
+        slotwiseD = d // 16
+        if d < 0 or slotwiseD > self.MIH_MAX_SLOTWISE_D:
+            raise ValueError(
+                "PDQ MIH queryAll: distance threshold out of bounds. "
+                "Please use linear search."
+            )
+        masks = self.SLOTWISE_NEIGHBOR_MASKS[slotwiseD]
+        indices = set()
+        for slotValue, indicesForSlotValue in zip(
+            self.slotValues(needle), self.slotValuesToIndices
+        ):
+            for mask in masks:
+                found = indicesForSlotValue.get(slotValue ^ mask)
+                if found:
+                    indices.update(found)
+        return indices
+
+    def queryAll(self, needle, d):
+        """All entries within Hamming distance d (0..MIH_MAX_D) of the
+        needle, as Hash256AndMetadata, in insertion order."""
+        matches = []
+        for index in sorted(self.findCandidates(needle, d)):
+            entry = self.allHashes[index]
+            if entry.hash.hammingDistanceLE(needle, d):
+                matches.append(entry)
+        return matches
+
+    def queryKNearest(self, needle, k):
+        """The k entries nearest to the needle, as (distance,
+        Hash256AndMetadata) pairs ordered by distance and then insertion
+        order. Widens the MIH radius one slotwise step at a time and falls
+        back to linear search if fewer than k entries lie within MIH_MAX_D."""
+        for slotwiseD in range(self.MIH_MAX_SLOTWISE_D + 1):
+            # All hashes within d are guaranteed to be among the candidates.
+            d = 16 * slotwiseD + 15
+            scored = []
+            for index in self.findCandidates(needle, d):
+                distance = self.allHashes[index].hash.hammingDistance(needle)
+                if distance <= d:
+                    scored.append((distance, index))
+            if len(scored) >= k:
+                break
+        else:
+            scored = [
+                (entry.hash.hammingDistance(needle), index)
+                for index, entry in enumerate(self.allHashes)
+                if entry is not None
+            ]
+        return [
+            (distance, self.allHashes[index])
+            for distance, index in heapq.nsmallest(k, scored)
+        ]
+
+    # ----------------------------------------------------------------
+    # LINEAR SEARCH
+    def bruteForceQueryAll(self, needle, d):
+        return [
+            entry
+            for entry in self.allHashes
+            if entry is not None and entry.hash.hammingDistanceLE(needle, d)
+        ]
+
+    def bruteForceQueryAny(self, needle, d):
+        for entry in self.allHashes:
+            if entry is not None and entry.hash.hammingDistanceLE(needle, d):
+                return entry
+        return None
+
+    # ----------------------------------------------------------------
+    # PERSISTENCE
+    #
+    # One "hash,metadata" line per entry, the same layout as the
+    # "hash,quality,filename" output of pdq_photo_hasher_tool (for which the
+    # metadata is "quality,filename"). Metadata is written with str() and
+    # read back as a string; an empty metadata is read back as None.
+    def save(self, filename):
+        """Writes one "hash[,metadata]" line per live entry, in identifier
+        order. Identifiers themselves are not saved; see the class
+        docstring."""
+        with open(filename, "w") as f:
+            for entry in self.allHashes:
+                if entry is None:
+                    continue
+                if entry.metadata is None:
+                    f.write("{}\n".format(entry.hash))
+                else:
+                    f.write("{},{}\n".format(entry.hash, entry.metadata))
+
+    @classmethod
+    def load(cls, filename):
+        mih = cls()
+        with open(filename) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                hexString, _, metadata = line.partition(",")
+                mih.insert(Hash256.fromHexString(hexString), metadata or None)
+        return mih
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from pdqhashing.types.hash256 import Hash256
+
+try:
+    popcount64 = numpy.bitwise_count
+except AttributeError:  # NumPy < 2.0
+
+    def popcount64(x):
+        """Per-element popcount of a uint64 array, SWAR-style as in
+        Hash256.bitCount."""
+        x = x - ((x >> numpy.uint64(1)) & numpy.uint64(0x5555555555555555))
+        x = (x & numpy.uint64(0x3333333333333333)) + (
+            (x >> numpy.uint64(2)) & numpy.uint64(0x3333333333333333)
+        )
+        x = (x + (x >> numpy.uint64(4))) & numpy.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * numpy.uint64(0x0101010101010101)) >> numpy.uint64(56)
+
+
+class MMapHashCorpus:
+    """On-disk corpus of PDQ hashes for exact brute-force radius search over
+    more hashes than fit in memory as Hash256 objects.
+
+    The corpus is two flat files:
+    * FILENAME holds 32 bytes per hash, as written by Hash256.toBytes;
+    * FILENAME.ids holds one little-endian int64 ID per hash.
+    Both are opened with numpy.memmap, so only the pages being scanned are
+    resident. Queries XOR and popcount the needles against CHUNK_SIZE hashes
+    at a time, optionally spreading the chunks across a process pool; each
+    worker maps the files itself so no hash data is pickled."""
+
+    IDS_SUFFIX = ".ids"
+    ID_DTYPE = numpy.dtype("<i8")
+    CHUNK_SIZE = 1 << 18
+
+    def __init__(self, filename) -> None:
+        self.filename = filename
+        self.hashes = self.mapHashes(filename)
+        self.ids = self.mapIds(filename)
+        if len(self.ids) != len(self.hashes):
+            raise ValueError(
+                "{}: {} hashes but {} IDs".format(
+                    filename, len(self.hashes), len(self.ids)
+                )
+            )
+
+    @classmethod
+    def mapHashes(cls, filename):
+        numHashes = os.path.getsize(filename) // Hash256.HASH256_NUM_BYTES
+        if numHashes == 0:
+            return numpy.zeros((0, 4), dtype=numpy.uint64)
+        # XOR and popcount don't care about byte order, so the 32 bytes of
+        # each hash can be read as four native-order 64-bit words.
+        return numpy.memmap(
+            filename, dtype=numpy.uint64, mode="r", shape=(numHashes, 4)
+        )
+
+    @classmethod
+    def mapIds(cls, filename):
+        idsFilename = filename + cls.IDS_SUFFIX
+        numIds = os.path.getsize(idsFilename) // cls.ID_DTYPE.itemsize
+        if numIds == 0:
+            return numpy.zeros(0, dtype=cls.ID_DTYPE)
+        return numpy.memmap(idsFilename, dtype=cls.ID_DTYPE, mode="r", shape=(numIds,))
+
+    def size(self):
+        return len(self.hashes)
+
+    def getHash(self, i):
+        return Hash256.fromBytes(self.hashes[i].tobytes())
+
+    def getId(self, i):
+        return int(self.ids[i])
+
+    # ----------------------------------------------------------------
+    # WRITING
+    @classmethod
+    def write(cls, filename, pairs, append=False):
+        """Writes (Hash256, int ID) pairs, streaming; returns how many were
+        written."""
+        mode = "ab" if append else "wb"
+        count = 0
+        with open(filename, mode) as hashFile, open(
+            filename + cls.IDS_SUFFIX, mode
+        ) as idsFile:
+            for hash, id in pairs:
+                hashFile.write(hash.toBytes())
+                idsFile.write(
+                    int(id).to_bytes(cls.ID_DTYPE.itemsize, "little", signed=True)
+                )
+                count += 1
+        return count
+
+    @classmethod
+    def nextId(cls, filename):
+        """One more than the largest ID in the corpus, or 0 if it is empty or
+        does not exist yet."""
+        idsFilename = filename + cls.IDS_SUFFIX
+        if not os.path.exists(idsFilename):
+            return 0
+        ids = cls.mapIds(filename)
+        return int(ids.max()) + 1 if len(ids) else 0
+
+    @classmethod
+    def writeFromHasherOutput(cls, filename, lines, append=False):
+        """Converts "hash,quality,filename" lines from pdq_photo_hasher_tool
+        (or any lines starting with a hex hash) to a corpus. The ID of each
+        hash is nextId(filename) before the write (0 without append) plus its
+        zero-based line number, so IDs stay unique across appended inputs and
+        a match can be traced back to its line given the input's first ID."""
+        firstId = cls.nextId(filename) if append else 0
+        return cls.write(
+            filename,
+            (
+                (Hash256.fromHexString(line.split(",", 1)[0].strip()), firstId + lno)
+                for lno, line in enumerate(lines)
+                if line.strip()
+            ),
+            append,
+        )
+
+    # ----------------------------------------------------------------
+    # SEARCH
+    @classmethod
+    def needleWords(cls, needles):
+        return numpy.frombuffer(
+            b"".join(needle.toBytes() for needle in needles), dtype=numpy.uint64
+        ).reshape(len(needles), 4)
+
+    @classmethod
+    def scanChunk(cls, hashes, start, stop, needleWords, d):
+        """For each needle, the (row, distance) pairs of hashes[start:stop]
+        within distance d."""
+        chunk = numpy.asarray(hashes[start:stop])
+        matches = []
+        for needle in needleWords:
+            distances = popcount64(chunk ^ needle).sum(axis=1, dtype=numpy.int64)
+            rows = numpy.flatnonzero(distances <= d)
+            matches.append([(start + int(row), int(distances[row])) for row in rows])
+        return matches
+
+    @classmethod
+    def scanFileChunk(cls, filename, start, stop, needleWords, d):
+        """Process-pool entry point: maps the corpus in the worker."""
+        return cls.scanChunk(cls.mapHashes(filename), start, stop, needleWords, d)
+
+    def queryAll(self, needles, d, numProcesses=1, chunkSize=None):
+        """All entries within Hamming distance d of each needle, as a list (one
+        per needle) of (ID, distance) pairs in file order. With numProcesses >
+        1 the chunks are scanned in a process pool."""
+        chunkSize = chunkSize or self.CHUNK_SIZE
+        needleWords = self.needleWords(needles)
+        ranges = [
+            (start, min(start + chunkSize, self.size()))
+            for start in range(0, self.size(), chunkSize)
+        ]
+        if numProcesses > 1 and len(ranges) > 1:
+            with ProcessPoolExecutor(max_workers=numProcesses) as executor:
+                futures = [
+                    executor.submit(
+                        self.scanFileChunk, self.filename, start, stop, needleWords, d
+                    )
+                    for start, stop in ranges
+                ]
+                chunkMatches = [future.result() for future in futures]
+        else:
+            chunkMatches = [
+                self.scanChunk(self.hashes, start, stop, needleWords, d)
+                for start, stop in ranges
+            ]
+        results = [[] for _ in needles]
+        for matches in chunkMatches:
+            for result, needleMatches in zip(results, matches):
+                result.extend(
+                    (self.getId(row), distance) for row, distance in needleMatches
+                )
+        return results
+
+    def queryAny(self, needle, d, chunkSize=None):
+        """The first (ID, distance) pair within distance d of the needle, or
+        None; stops scanning at the first matching chunk."""
+        chunkSize = chunkSize or self.CHUNK_SIZE
+        needleWords = self.needleWords([needle])
+        for start in range(0, self.size(), chunkSize):
+            stop = min(start + chunkSize, self.size())
+            matches = self.scanChunk(self.hashes, start, stop, needleWords, d)[0]
+            if matches:
+                row, distance = matches[0]
+                return (self.getId(row), distance)
+        return None
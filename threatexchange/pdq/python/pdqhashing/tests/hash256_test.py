@@ -72,3 +72,40 @@ class Hash256Test(unittest.TestCase):
 
         self.assertEqual(hash.bitwiseOR(hash_negative), hash_set_all)
         self.assertEqual(hash.bitwiseXOR(hash_negative), hash_set_all)
+
+    def test_words_and_bits_layout(self) -> None:
+        hash = Hash256()
+        hash.setBit(0)
+        hash.setBit(17)
+        hash.setBit(255)
+        self.assertEqual(hash.w[0], 1)
+        self.assertEqual(hash.w[1], 2)
+        self.assertEqual(hash.w[15], 0x8000)
+        self.assertEqual(hash.dumpBitsFlat()[0], "1")
+        self.assertEqual(hash.dumpBitsFlat()[-1], "1")
+        self.assertEqual(hash.dumpBitsFlat()[-18], "1")
+        self.assertEqual(hash.dumpBitsFlat().count("1"), 3)
+        self.assertEqual(hash.dumpWords().split(",")[-1], "1")
+        with self.assertRaises(TypeError):
+            hash.w[0] = 5
+
+    def test_bytes_round_trip(self) -> None:
+        hash = Hash256.fromHexString(self.SAMPLE_HASH)
+        self.assertEqual(hash.toBytes().hex(), self.SAMPLE_HASH)
+        self.assertEqual(Hash256.fromBytes(hash.toBytes()), hash)
+        with self.assertRaises(PDQHashFormatException):
+            Hash256.fromBytes(b"\x00" * 31)
+
+    def test_hamming_distance_matches_per_word_count(self) -> None:
+        hash1 = Hash256.fromHexString(self.SAMPLE_HASH)
+        for numErrorBits in (0, 1, 5, 30, 100):
+            hash2 = hash1.fuzz(numErrorBits)
+            expected = sum(Hash256.bitCount(a ^ b) for a, b in zip(hash1.w, hash2.w))
+            self.assertEqual(hash1.hammingDistance(hash2), expected)
+            self.assertTrue(hash1.hammingDistanceLE(hash2, expected))
+            self.assertFalse(hash1.hammingDistanceLE(hash2, expected - 1))
+
+    def test_usable_as_dict_key(self) -> None:
+        hash = Hash256.fromHexString(self.SAMPLE_HASH)
+        seen = {hash: "sample"}
+        self.assertEqual(seen[Hash256.fromHexString(self.SAMPLE_HASH)], "sample")
@@ -0,0 +1,99 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import os
+import random
+import tempfile
+
+from pdqhashing.index.mih import MIH256
+from pdqhashing.types.hash256 import Hash256
+import unittest
+
+
+class MIH256Test(unittest.TestCase):
+    def setUp(self) -> None:
+        random.seed(1)
+        self.mih = MIH256()
+        self.hashes = [Hash256(random.getrandbits(256)) for _ in range(500)]
+        # Clusters of near-duplicates so that queries have matches at all radii.
+        for i in range(0, 500, 10):
+            self.hashes.extend(self.hashes[i].fuzz(n) for n in (1, 8, 20, 40, 60))
+        for i, hash in enumerate(self.hashes):
+            self.mih.insert(hash, i)
+        self.needles = [random.choice(self.hashes).fuzz(10) for _ in range(30)]
+
+    def test_query_all_matches_linear_search(self) -> None:
+        for d in (0, 15, 16, 31, 47, 63):
+            for needle in self.needles + self.hashes[:10]:
+                self.assertEqual(
+                    self.mih.queryAll(needle, d),
+                    self.mih.bruteForceQueryAll(needle, d),
+                )
+
+    def test_query_all_rejects_out_of_range_distance(self) -> None:
+        with self.assertRaises(ValueError):
+            self.mih.queryAll(self.hashes[0], MIH256.MIH_MAX_D + 1)
+        with self.assertRaises(ValueError):
+            self.mih.queryAll(self.hashes[0], -1)
+
+    def test_query_k_nearest_matches_linear_search(self) -> None:
+        for needle in self.needles:
+            for k in (1, 3, 10):
+                expected = sorted(
+                    (entry.hash.hammingDistance(needle), entry.metadata)
+                    for entry in self.mih.get()
+                )[:k]
+                computed = [
+                    (distance, entry.metadata)
+                    for distance, entry in self.mih.queryKNearest(needle, k)
+                ]
+                self.assertEqual(computed, expected)
+
+    def test_query_k_nearest_falls_back_to_linear_search(self) -> None:
+        mih = MIH256()
+        mih.insert(Hash256(0), "zero")
+        mih.insert(Hash256(Hash256.HASH256_ALL_BITS), "ones")
+        self.assertEqual(
+            [(d, e.metadata) for d, e in mih.queryKNearest(Hash256(0), 2)],
+            [(0, "zero"), (256, "ones")],
+        )
+
+    def test_delete(self) -> None:
+        needle = self.hashes[0]
+        self.assertEqual(self.mih.queryAll(needle, 0)[0].metadata, 0)
+        self.mih.delete(0)
+        self.assertEqual(self.mih.size(), len(self.hashes) - 1)
+        self.assertEqual(self.mih.queryAll(needle, 0), [])
+        for d in (15, 31, 63):
+            self.assertEqual(
+                self.mih.queryAll(needle, d), self.mih.bruteForceQueryAll(needle, d)
+            )
+        with self.assertRaises(KeyError):
+            self.mih.delete(0)
+
+    def test_delete_hash(self) -> None:
+        hash = self.hashes[3]
+        self.mih.insert(hash.clone(), "dup")
+        self.assertEqual(self.mih.deleteHash(hash), 2)
+        self.assertEqual(self.mih.queryAll(hash, 0), [])
+        self.assertEqual(self.mih.deleteHash(hash), 0)
+        self.assertEqual(self.mih.size(), len(self.hashes) - 1)
+
+    def test_save_and_load(self) -> None:
+        self.mih.delete(5)
+        self.mih.insert(Hash256(12345))
+        with tempfile.TemporaryDirectory() as dirname:
+            filename = os.path.join(dirname, "hashes.txt")
+            self.mih.save(filename)
+            loaded = MIH256.load(filename)
+        self.assertEqual(
+            [(e.hash, e.metadata) for e in loaded.get()],
+            [
+                (e.hash, None if e.metadata is None else str(e.metadata))
+                for e in self.mih.get()
+            ],
+        )
+        for needle in self.needles:
+            self.assertEqual(
+                [e.hash for e in loaded.queryAll(needle, 31)],
+                [e.hash for e in self.mih.queryAll(needle, 31)],
+            )
@@ -0,0 +1,99 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import os
+import random
+import tempfile
+
+import numpy
+
+from pdqhashing.index.mmap_corpus import MMapHashCorpus, popcount64
+from pdqhashing.types.hash256 import Hash256
+import unittest
+
+
+class MMapHashCorpusTest(unittest.TestCase):
+    def setUp(self) -> None:
+        random.seed(1)
+        self.hashes = [Hash256(random.getrandbits(256)) for _ in range(300)]
+        for i in range(0, 300, 10):
+            self.hashes.extend(self.hashes[i].fuzz(n) for n in (1, 8, 20, 40))
+        self.ids = [1000 + i for i in range(len(self.hashes))]
+        self.needles = [random.choice(self.hashes).fuzz(10) for _ in range(20)]
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, "corpus.pdq")
+        MMapHashCorpus.write(self.filename, zip(self.hashes, self.ids))
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def bruteForce(self, needle, d):
+        return [
+            (id, hash.hammingDistance(needle))
+            for hash, id in zip(self.hashes, self.ids)
+            if hash.hammingDistanceLE(needle, d)
+        ]
+
+    def test_file_layout(self) -> None:
+        self.assertEqual(os.path.getsize(self.filename), 32 * len(self.hashes))
+        corpus = MMapHashCorpus(self.filename)
+        self.assertEqual(corpus.size(), len(self.hashes))
+        self.assertEqual(corpus.getHash(7), self.hashes[7])
+        self.assertEqual(corpus.getId(7), self.ids[7])
+
+    def test_popcount(self) -> None:
+        values = [0, 1, 2**64 - 1, 0x8000000000000001, 0x0123456789ABCDEF]
+        self.assertEqual(
+            popcount64(numpy.array(values, dtype=numpy.uint64)).tolist(),
+            [bin(v).count("1") for v in values],
+        )
+
+    def test_query_all_matches_brute_force(self) -> None:
+        corpus = MMapHashCorpus(self.filename)
+        for d in (0, 10, 31, 63, 256):
+            # A small chunk size exercises the chunk boundaries.
+            for chunkSize in (None, 37):
+                results = corpus.queryAll(self.needles, d, chunkSize=chunkSize)
+                for needle, result in zip(self.needles, results):
+                    self.assertEqual(result, self.bruteForce(needle, d))
+
+    def test_query_all_with_process_pool(self) -> None:
+        corpus = MMapHashCorpus(self.filename)
+        results = corpus.queryAll(self.needles, 31, numProcesses=2, chunkSize=64)
+        for needle, result in zip(self.needles, results):
+            self.assertEqual(result, self.bruteForce(needle, 31))
+
+    def test_query_any(self) -> None:
+        corpus = MMapHashCorpus(self.filename)
+        self.assertEqual(corpus.queryAny(self.hashes[50], 0), (self.ids[50], 0))
+        self.assertIsNone(corpus.queryAny(Hash256(0), 10))
+
+    def test_empty_corpus(self) -> None:
+        filename = os.path.join(self.tempdir.name, "empty.pdq")
+        MMapHashCorpus.write(filename, [])
+        corpus = MMapHashCorpus(filename)
+        self.assertEqual(corpus.size(), 0)
+        self.assertEqual(corpus.queryAll(self.needles[:2], 31), [[], []])
+
+    def test_write_from_hasher_output(self) -> None:
+        filename = os.path.join(self.tempdir.name, "from_tool.pdq")
+        lines = ["{},100,img{}.jpg\n".format(h, i) for i, h in enumerate(self.hashes)]
+        MMapHashCorpus.writeFromHasherOutput(filename, lines[:10])
+        MMapHashCorpus.writeFromHasherOutput(filename, lines[10:20], append=True)
+        corpus = MMapHashCorpus(filename)
+        self.assertEqual(corpus.size(), 20)
+        self.assertEqual(corpus.getHash(15), self.hashes[15])
+        # IDs are line numbers, offset past the IDs already in the corpus.
+        self.assertEqual(corpus.getId(5), 5)
+        self.assertEqual(corpus.getId(15), 15)
+
+    def test_appended_inputs_get_distinct_ids(self) -> None:
+        filename = os.path.join(self.tempdir.name, "appended.pdq")
+        first = ["{},100,a.jpg\n".format(h) for h in self.hashes[:3]] + ["\n"]
+        second = ["{},100,b.jpg\n".format(h) for h in self.hashes[3:6]]
+        MMapHashCorpus.writeFromHasherOutput(filename, first)
+        self.assertEqual(MMapHashCorpus.nextId(filename), 3)
+        MMapHashCorpus.writeFromHasherOutput(filename, second, append=True)
+        corpus = MMapHashCorpus(filename)
+        ids = [corpus.getId(i) for i in range(corpus.size())]
+        self.assertEqual(ids, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(corpus.queryAny(self.hashes[4], 0), (4, 0))
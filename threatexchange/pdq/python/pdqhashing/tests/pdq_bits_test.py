@@ -0,0 +1,104 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import os
+import random
+
+import numpy
+
+from pdqhashing.hasher.pdq_hasher import PDQHasher
+from pdqhashing.hasher.pdq_numpy_hasher import PDQNumpyHasher
+from pdqhashing.tests.pdq_numpy_test import make_test_image
+from pdqhashing.tests import pdq_test
+from pdqhashing.utils.matrix import MatrixUtil
+import unittest
+
+
+class PdqBitsTest(unittest.TestCase):
+    """Regression suite for PDQNumpyHasher.pdqBuffer16x16ToBits against the
+    pure-Python PDQHasher.pdqBuffer16x16ToBits (torben median + setBit)."""
+
+    def assertBitsMatch(self, buffers16x16):
+        pdq = PDQHasher()
+        pdq_numpy = PDQNumpyHasher()
+        stack = numpy.array(buffers16x16, dtype=numpy.float64)
+        expected = [pdq.pdqBuffer16x16ToBits(b.tolist()) for b in stack]
+        self.assertEqual(pdq_numpy.pdqBuffers16x16ToBits(stack), expected)
+        for buffer16x16, hash in zip(stack, expected):
+            self.assertEqual(pdq_numpy.pdqBuffer16x16ToBits(buffer16x16), hash)
+
+    def dctBuffersOfImage(self, img):
+        """The 16x16 DCT outputs of all eight dihedral transforms."""
+        pdq_numpy = PDQNumpyHasher()
+        numCols, numRows = img.size
+        (
+            buffer1,
+            buffer2,
+            buffer64x64,
+            buffer16x64,
+            buffer16x16,
+            buffer16x16Aux,
+        ) = pdq_numpy.allocateBuffers(numRows, numCols)
+        pdq_numpy.fillFloatLumaFromBufferImage(img, buffer1)
+        pdq_numpy.jaroszFilterFloat(
+            buffer1,
+            buffer2,
+            numRows,
+            numCols,
+            pdq_numpy.computeJaroszFilterWindowSize(numCols),
+            pdq_numpy.computeJaroszFilterWindowSize(numRows),
+            pdq_numpy.PDQ_NUM_JAROSZ_XY_PASSES,
+        )
+        pdq_numpy.decimateFloat(buffer1, numRows, numCols, buffer64x64)
+        pdq_numpy.dct64To16(buffer64x64, buffer16x64, buffer16x16)
+        buffers = [buffer16x16.copy()]
+        for transform in (
+            pdq_numpy.dct16OriginalToRotate90,
+            pdq_numpy.dct16OriginalToRotate180,
+            pdq_numpy.dct16OriginalToRotate270,
+            pdq_numpy.dct16OriginalToFlipX,
+            pdq_numpy.dct16OriginalToFlipY,
+            pdq_numpy.dct16OriginalToFlipPlus1,
+            pdq_numpy.dct16OriginalToFlipMinus1,
+        ):
+            transform(buffer16x16, buffer16x16Aux)
+            buffers.append(buffer16x16Aux.copy())
+        return buffers
+
+    def test_sample_images(self) -> None:
+        filenames = [f for f, _ in pdq_test.PdqTest().get_data() if os.path.exists(f)]
+        if not filenames:
+            self.skipTest("sample media not available")
+        for filename in filenames:
+            img = PDQHasher.readImage(filename)
+            self.assertBitsMatch(self.dctBuffersOfImage(img))
+
+    def test_synthetic_images(self) -> None:
+        for seed, (width, height) in enumerate(
+            [(64, 64), (100, 37), (512, 512), (700, 300)]
+        ):
+            self.assertBitsMatch(
+                self.dctBuffersOfImage(make_test_image(width, height, seed))
+            )
+
+    def test_ties_and_signed_zeros(self) -> None:
+        rng = random.Random(5)
+        buffers = [
+            numpy.zeros((16, 16)),
+            numpy.full((16, 16), 3.5),
+            numpy.array(
+                [[rng.choice([-0.0, 0.0, 1.0]) for _ in range(16)] for _ in range(16)]
+            ),
+            numpy.array([[rng.randrange(4) for _ in range(16)] for _ in range(16)]),
+            numpy.arange(256.0).reshape(16, 16)[::-1],
+            numpy.array([[rng.gauss(0, 1e6) for _ in range(16)] for _ in range(16)]),
+        ]
+        self.assertBitsMatch(buffers)
+
+    def test_median_matches_torben(self) -> None:
+        rng = random.Random(9)
+        for _ in range(50):
+            m = [[float(rng.randrange(-20, 20)) for _ in range(16)] for _ in range(16)]
+            flat = numpy.array(m).reshape(256)
+            self.assertEqual(
+                numpy.partition(flat, 127)[127], MatrixUtil.torben(m, 16, 16)
+            )
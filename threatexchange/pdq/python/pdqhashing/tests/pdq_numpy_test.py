@@ -0,0 +1,140 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import io
+import random
+
+import numpy
+
+from PIL import Image, ImageDraw
+
+from pdqhashing.hasher.pdq_hasher import PDQHasher
+from pdqhashing.hasher.pdq_numpy_hasher import PDQNumpyHasher
+import unittest
+
+
+def make_test_image(width, height, seed):
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, x1 = sorted(rng.randrange(width) for _ in range(2))
+        y0, y1 = sorted(rng.randrange(height) for _ in range(2))
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x0, y0, x1, y1), fill=fill)
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    return Image.blend(img, noise, 0.3)
+
+
+def to_png_bytes(img):
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    buffer.seek(0)
+    return buffer
+
+
+class PdqNumpyTest(unittest.TestCase):
+    SIZES = [(64, 64), (100, 37), (37, 100), (300, 200), (512, 512), (700, 300)]
+
+    def test_matches_pure_python_hasher(self) -> None:
+        pdq = PDQHasher()
+        pdq_numpy = PDQNumpyHasher()
+        for seed, (width, height) in enumerate(self.SIZES):
+            img = make_test_image(width, height, seed)
+            expected = pdq.fromBufferedImage(to_png_bytes(img))
+            computed = pdq_numpy.fromBufferedImage(to_png_bytes(img))
+            self.assertEqual(computed.getHash(), expected.getHash())
+            self.assertEqual(computed.getQuality(), expected.getQuality())
+
+    def test_grayscale_and_palette_images(self) -> None:
+        pdq = PDQHasher()
+        pdq_numpy = PDQNumpyHasher()
+        img = make_test_image(128, 96, 42)
+        for mode in ("L", "P", "RGBA"):
+            converted = img.convert(mode)
+            expected = pdq.fromBufferedImage(to_png_bytes(converted))
+            computed = pdq_numpy.fromBufferedImage(to_png_bytes(converted))
+            self.assertEqual(computed.getHash(), expected.getHash())
+            self.assertEqual(computed.getQuality(), expected.getQuality())
+
+    def test_dihedral_matches_pure_python_hasher(self) -> None:
+        pdq = PDQHasher()
+        pdq_numpy = PDQNumpyHasher()
+        img = make_test_image(160, 120, 7)
+        expected = pdq.dihedralFromBufferedImage(
+            img, *pdq.allocateBuffers(120, 160), PDQHasher.PDQ_DO_DIH_ALL
+        )
+        computed = pdq_numpy.dihedralFromBufferedImage(
+            img, *pdq_numpy.allocateBuffers(120, 160), PDQHasher.PDQ_DO_DIH_ALL
+        )
+        for name in (
+            "hash",
+            "hashRotate90",
+            "hashRotate180",
+            "hashRotate270",
+            "hashFlipX",
+            "hashFlipY",
+            "hashFlipPlus1",
+            "hashFlipMinus1",
+            "quality",
+        ):
+            self.assertEqual(getattr(computed, name), getattr(expected, name))
+
+    def test_dihedral_from_bytes(self) -> None:
+        pdq = PDQHasher()
+        pdq_numpy = PDQNumpyHasher()
+        img = make_test_image(700, 300, 3)
+        expected = pdq.dihedralFromBytes(to_png_bytes(img))
+        computed = pdq_numpy.dihedralFromBytes(to_png_bytes(img))
+        self.assertEqual(
+            expected.hash, pdq.fromBufferedImage(to_png_bytes(img)).getHash()
+        )
+        for name in ("hash", "hashRotate90", "hashFlipMinus1", "quality"):
+            self.assertEqual(getattr(computed, name), getattr(expected, name))
+
+    def test_from_buffered_images_matches_single_image_hashing(self) -> None:
+        pdq = PDQHasher()
+        pdq_numpy = PDQNumpyHasher()
+        # Repeated sizes exercise the stacked path, distinct ones the grouping.
+        imgs = [
+            make_test_image(width, height, seed)
+            for seed, (width, height) in enumerate(self.SIZES + self.SIZES[:3])
+        ]
+        expected = [pdq.fromBufferedImage(to_png_bytes(img)) for img in imgs]
+        for hasher in (pdq, pdq_numpy):
+            computed = hasher.fromBufferedImages([to_png_bytes(img) for img in imgs])
+            self.assertEqual(len(computed), len(expected))
+            for c, e in zip(computed, expected):
+                self.assertEqual(c.getHash(), e.getHash())
+                self.assertEqual(c.getQuality(), e.getQuality())
+
+    def test_draft_modes(self) -> None:
+        img = make_test_image(2100, 1500, 11)
+        jpeg = io.BytesIO()
+        img.save(jpeg, "JPEG", quality=90)
+        exact = PDQNumpyHasher().fromBufferedImage(io.BytesIO(jpeg.getvalue()))
+        for draftMode in ("RGB", "L"):
+            pdq = PDQHasher(draftMode)
+            pdq_numpy = PDQNumpyHasher(draftMode)
+            expected = pdq.fromBufferedImage(io.BytesIO(jpeg.getvalue()))
+            computed = pdq_numpy.fromBufferedImage(io.BytesIO(jpeg.getvalue()))
+            self.assertEqual(computed.getHash(), expected.getHash())
+            self.assertEqual(computed.getQuality(), expected.getQuality())
+            self.assertLessEqual(
+                computed.getHash().hammingDistance(exact.getHash()), 16
+            )
+        # draft() is a no-op for other formats, so RGB PNGs hash exactly.
+        png = to_png_bytes(img)
+        self.assertEqual(
+            PDQNumpyHasher("L").fromBufferedImage(png).getHash(),
+            PDQNumpyHasher().fromBufferedImage(to_png_bytes(img)).getHash(),
+        )
+
+    def test_buffer_pool_reuses_buffers(self) -> None:
+        pdq_numpy = PDQNumpyHasher()
+        first = pdq_numpy.getBatchBuffers(4, 30, 40)
+        second = pdq_numpy.getBatchBuffers(2, 30, 40)
+        self.assertTrue(numpy.shares_memory(first[0], second[0]))
+        for size in range(PDQNumpyHasher.BUFFER_POOL_MAX_SIZES + 1):
+            pdq_numpy.getBatchBuffers(1, size + 1, size + 1)
+        third = pdq_numpy.getBatchBuffers(2, 30, 40)
+        self.assertFalse(numpy.shares_memory(first[0], third[0]))
@@ -0,0 +1,96 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from pdqhashing.index.mmap_corpus import MMapHashCorpus
+from pdqhashing.tests.pdq_numpy_test import make_test_image
+from pdqhashing.types.hash256 import Hash256
+import unittest
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+class PDQPhotoHasherToolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filenames = []
+        for seed in range(6):
+            filename = os.path.join(self.tempdir.name, "image-{}.png".format(seed))
+            make_test_image(120 + 10 * seed, 90, seed).save(filename)
+            self.filenames.append(filename)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def runTool(self, *args):
+        return subprocess.run(
+            [sys.executable, "-m", "pdqhashing.tools.pdq_photo_hasher_tool"]
+            + list(args),
+            cwd=PACKAGE_ROOT,
+            capture_output=True,
+            text=True,
+        )
+
+    def serialLines(self, filenames):
+        result = self.runTool("--pdq", "--no-timings", "--k", *filenames)
+        return result.stdout.splitlines()
+
+    def test_jobs_output_matches_serial_in_input_order(self) -> None:
+        result = self.runTool("--pdq", "--no-timings", "--jobs", "3", *self.filenames)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        lines = result.stdout.splitlines()
+        self.assertEqual(lines, self.serialLines(self.filenames))
+        self.assertEqual([line.split(",")[2] for line in lines], self.filenames)
+
+    def test_unordered_outputs_same_lines(self) -> None:
+        result = self.runTool(
+            "--pdq", "--no-timings", "--jobs", "3", "--unordered", *self.filenames
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(
+            sorted(result.stdout.splitlines()),
+            sorted(self.serialLines(self.filenames)),
+        )
+
+    def test_binary_output_ids_are_input_positions(self) -> None:
+        corpusFilename = os.path.join(self.tempdir.name, "corpus.pdq")
+        result = self.runTool(
+            "--pdq",
+            "--no-timings",
+            "--jobs",
+            "2",
+            "--unordered",
+            "--output-format",
+            "binary",
+            "--output",
+            corpusFilename,
+            *self.filenames
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        corpus = MMapHashCorpus(corpusFilename)
+        self.assertEqual(corpus.size(), len(self.filenames))
+        expected = {
+            index: Hash256.fromHexString(line.split(",")[0])
+            for index, line in enumerate(self.serialLines(self.filenames))
+        }
+        self.assertEqual(
+            {corpus.getId(i): corpus.getHash(i) for i in range(corpus.size())},
+            expected,
+        )
+
+    def test_unreadable_file_does_not_abort_others(self) -> None:
+        unreadable = os.path.join(self.tempdir.name, "not-an-image.png")
+        with open(unreadable, "w") as f:
+            f.write("not an image")
+        filenames = self.filenames[:3] + [unreadable] + self.filenames[3:]
+        result = self.runTool("--pdq", "--no-timings", "--jobs", "2", "--k", *filenames)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("could not read image file {}".format(unreadable), result.stderr)
+        self.assertEqual(result.stdout.splitlines(), self.serialLines(self.filenames))
+
+
+if __name__ == "__main__":
+    unittest.main()
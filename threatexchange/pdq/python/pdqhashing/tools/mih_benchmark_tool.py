@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# isort:skip_file
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from pdqhashing.index.mih import MIH256
+from pdqhashing.types.hash256 import Hash256
+
+
+class MIHBenchmarkTool:
+    """Times MIH256 radius queries against linear search, and checks that both
+    return the same matches.
+    Example use from within the python directory:
+    python pdqhashing/tools/mih_benchmark_tool.py --haystack-size 100000 -d 31"""
+
+    PROGNAME = "MIHBenchmarkTool"
+
+    @classmethod
+    def main(cls, args):
+        parser = argparse.ArgumentParser(
+            prog=cls.PROGNAME,
+            description="Benchmark MIH256 queries against linear search on "
+            + "random hashes, or on hashes loaded from a hash,metadata file.",
+        )
+        parser.add_argument(
+            "--haystack-size",
+            dest="haystackSize",
+            type=int,
+            default=100000,
+            help="Number of random hashes to index (ignored with --haystack).",
+        )
+        parser.add_argument(
+            "--haystack",
+            dest="haystackFile",
+            type=str,
+            default=None,
+            help="Load the haystack from a file of hash,metadata lines, such "
+            + "as the output of pdq_photo_hasher_tool.",
+        )
+        parser.add_argument(
+            "--num-needles",
+            dest="numNeedles",
+            type=int,
+            default=100,
+            help="Number of queries to run.",
+        )
+        parser.add_argument(
+            "-d",
+            dest="d",
+            type=int,
+            default=31,
+            help="Hamming distance threshold, 0..{}.".format(MIH256.MIH_MAX_D),
+        )
+        parser.add_argument(
+            "--fuzz-bits",
+            dest="fuzzBits",
+            type=int,
+            default=20,
+            help="Needles are haystack hashes with this many random bit flips.",
+        )
+        parser.add_argument(
+            "--seed", dest="seed", type=int, default=1, help="Random seed."
+        )
+        args = parser.parse_args(args[1:])
+
+        random.seed(args.seed)
+        t1 = time.time()
+        if args.haystackFile:
+            mih = MIH256.load(args.haystackFile)
+        else:
+            mih = MIH256()
+            for i in range(args.haystackSize):
+                mih.insert(Hash256(random.getrandbits(256)), i)
+        t2 = time.time()
+        print("haystack_size={},build_seconds={:.6f}".format(mih.size(), t2 - t1))
+
+        haystack = mih.get()
+        needles = [
+            random.choice(haystack).hash.fuzz(args.fuzzBits)
+            for _ in range(args.numNeedles)
+        ]
+
+        t1 = time.time()
+        mihMatches = [mih.queryAll(needle, args.d) for needle in needles]
+        t2 = time.time()
+        mihSeconds = t2 - t1
+
+        t1 = time.time()
+        linearMatches = [mih.bruteForceQueryAll(needle, args.d) for needle in needles]
+        t2 = time.time()
+        linearSeconds = t2 - t1
+
+        numMatches = sum(len(matches) for matches in mihMatches)
+        for a, b in zip(mihMatches, linearMatches):
+            if [id(entry) for entry in a] != [id(entry) for entry in b]:
+                sys.stderr.write(
+                    "{}: MIH and linear search disagree\n".format(cls.PROGNAME)
+                )
+                exit(1)
+
+        print(
+            "d={},num_needles={},num_matches={}".format(
+                args.d, len(needles), numMatches
+            )
+        )
+        print(
+            "mih_seconds_per_query={:.6f},linear_seconds_per_query={:.6f},speedup={:.1f}".format(
+                mihSeconds / len(needles),
+                linearSeconds / len(needles),
+                linearSeconds / mihSeconds if mihSeconds > 0 else float("inf"),
+            )
+        )
+
+
+if __name__ == "__main__":
+    MIHBenchmarkTool.main(sys.argv)
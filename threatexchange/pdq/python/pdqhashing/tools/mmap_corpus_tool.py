@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# isort:skip_file
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from pdqhashing.index.mmap_corpus import MMapHashCorpus
+from pdqhashing.types.hash256 import Hash256
+
+
+class MMapCorpusTool:
+    """Builds and queries on-disk MMapHashCorpus files.
+    Example use from within the python directory:
+    python pdqhashing/tools/pdq_photo_hasher_tool.py --pdq *.jpg > hashes.txt
+    python pdqhashing/tools/mmap_corpus_tool.py build corpus.pdq hashes.txt
+    python pdqhashing/tools/mmap_corpus_tool.py query corpus.pdq -d 31 < needles.txt"""
+
+    PROGNAME = "MMapCorpusTool"
+
+    @classmethod
+    def main(cls, args):
+        parser = argparse.ArgumentParser(
+            prog=cls.PROGNAME,
+            description="Build an on-disk PDQ hash corpus from "
+            + "pdq_photo_hasher_tool output, or scan one for matches.",
+        )
+        subparsers = parser.add_subparsers(dest="command", required=True)
+
+        build = subparsers.add_parser(
+            "build",
+            help="Convert hash,quality,filename lines to a corpus. The ID of "
+            + "each hash is the corpus's next free ID (0 for a new corpus) "
+            + "plus its zero-based line number; each later input starts "
+            + "after the previous one.",
+        )
+        build.add_argument("corpus", type=str, help="Corpus filename.")
+        build.add_argument(
+            "inputs",
+            nargs="*",
+            type=str,
+            help="Hasher-tool output files; stdin if none.",
+        )
+        build.add_argument(
+            "--append",
+            action="store_true",
+            help="Append to an existing corpus instead of overwriting it.",
+        )
+
+        query = subparsers.add_parser(
+            "query",
+            help="Read needle hashes from stdin (one per line, optionally "
+            + "followed by ,anything) and print needle,id,distance per match.",
+        )
+        query.add_argument("corpus", type=str, help="Corpus filename.")
+        query.add_argument(
+            "-d", dest="d", type=int, default=31, help="Hamming distance threshold."
+        )
+        query.add_argument(
+            "--jobs",
+            dest="jobs",
+            type=int,
+            default=1,
+            help="Number of processes to scan with.",
+        )
+        query.add_argument(
+            "--chunk-size",
+            dest="chunkSize",
+            type=int,
+            default=MMapHashCorpus.CHUNK_SIZE,
+            help="Number of hashes per scanned chunk.",
+        )
+        args = parser.parse_args(args[1:])
+
+        if args.command == "build":
+            count = 0
+            if args.inputs:
+                for i, filename in enumerate(args.inputs):
+                    append = args.append or i > 0
+                    firstId = MMapHashCorpus.nextId(args.corpus) if append else 0
+                    with open(filename) as f:
+                        count += MMapHashCorpus.writeFromHasherOutput(
+                            args.corpus, f, append
+                        )
+                    sys.stderr.write(
+                        "{}: IDs for {} start at {}\n".format(
+                            cls.PROGNAME, filename, firstId
+                        )
+                    )
+            else:
+                count = MMapHashCorpus.writeFromHasherOutput(
+                    args.corpus, sys.stdin, args.append
+                )
+            sys.stderr.write("{}: wrote {} hashes\n".format(cls.PROGNAME, count))
+            return
+
+        corpus = MMapHashCorpus(args.corpus)
+        needles = [
+            Hash256.fromHexString(line.split(",", 1)[0].strip())
+            for line in sys.stdin
+            if line.strip()
+        ]
+        t1 = time.time()
+        results = corpus.queryAll(needles, args.d, args.jobs, args.chunkSize)
+        t2 = time.time()
+        for needle, matches in zip(needles, results):
+            for id, distance in matches:
+                print("{},{},{}".format(needle, id, distance))
+        sys.stderr.write(
+            "{}: corpus_size={},num_needles={},jobs={},scan_seconds={:.6f}\n".format(
+                cls.PROGNAME, corpus.size(), len(needles), args.jobs, t2 - t1
+            )
+        )
+
+
+if __name__ == "__main__":
+    MMapCorpusTool.main(sys.argv)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# isort:skip_file
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from pdqhashing.hasher.pdq_hasher import PDQHasher
+
+
+class PDQDraftBenchmarkTool:
+    """Compares hash latency and hash drift of the draftMode decode paths
+    against the exact one.
+    Example use from within the python directory:
+    python pdqhashing/tools/pdq_draft_benchmark_tool.py --numpy photos/*.jpg"""
+
+    PROGNAME = "PDQDraftBenchmarkTool"
+    DRAFT_MODES = [None, "RGB", "L"]
+
+    @classmethod
+    def main(cls, args):
+        parser = argparse.ArgumentParser(
+            prog=cls.PROGNAME,
+            description="Hash JPEGs with each draftMode and report mean "
+            + "latency and Hamming distance to the exact (draftMode=None) hash.",
+        )
+        parser.add_argument(
+            "filenames",
+            nargs="*",
+            type=str,
+            help="JPEG files; if none, synthetic photos are generated.",
+        )
+        parser.add_argument(
+            "--num-synthetic",
+            dest="numSynthetic",
+            type=int,
+            default=10,
+            help="Number of synthetic photos to generate.",
+        )
+        parser.add_argument(
+            "--synthetic-size",
+            dest="syntheticSize",
+            type=str,
+            default="4000x3000",
+            help="WIDTHxHEIGHT of the synthetic photos.",
+        )
+        parser.add_argument(
+            "--numpy",
+            dest="useNumpy",
+            action="store_true",
+            help="Hash with PDQNumpyHasher (requires NumPy).",
+        )
+        args = parser.parse_args(args[1:])
+
+        if args.filenames:
+            images = []
+            for filename in args.filenames:
+                with open(filename, "rb") as f:
+                    images.append(f.read())
+        else:
+            width, height = (int(n) for n in args.syntheticSize.split("x"))
+            images = [
+                cls.makeSyntheticJpeg(width, height, seed)
+                for seed in range(args.numSynthetic)
+            ]
+
+        if args.useNumpy:
+            from pdqhashing.hasher.pdq_numpy_hasher import PDQNumpyHasher
+
+            hasherClass = PDQNumpyHasher
+        else:
+            hasherClass = PDQHasher
+
+        exactHashes = None
+        for draftMode in cls.DRAFT_MODES:
+            hasher = hasherClass(draftMode)
+            hashes = []
+            t1 = time.time()
+            for image in images:
+                hashes.append(hasher.fromBufferedImage(io.BytesIO(image)).getHash())
+            t2 = time.time()
+            if exactHashes is None:
+                exactHashes = hashes
+            distances = [h.hammingDistance(e) for h, e in zip(hashes, exactHashes)]
+            print(
+                "draft_mode={},num_images={},mean_seconds={:.6f},"
+                "mean_distance={:.2f},max_distance={}".format(
+                    draftMode,
+                    len(images),
+                    (t2 - t1) / len(images),
+                    sum(distances) / len(distances),
+                    max(distances),
+                )
+            )
+
+    @classmethod
+    def makeSyntheticJpeg(cls, width, height, seed):
+        """Random overlapping shapes, blurred and with noise, as a
+        photo-like JPEG."""
+        rng = random.Random(seed)
+        img = Image.new("RGB", (width, height))
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x0, x1 = sorted(rng.randrange(width) for _ in range(2))
+            y0, y1 = sorted(rng.randrange(height) for _ in range(2))
+            fill = tuple(rng.randrange(256) for _ in range(3))
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+        img = img.filter(ImageFilter.GaussianBlur(width / 200))
+        noise = Image.effect_noise((width, height), 30).convert("RGB")
+        img = Image.blend(img, noise, 0.15)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    PDQDraftBenchmarkTool.main(sys.argv)
@@ -3,14 +3,21 @@
 # isort:skip_file
 
 import argparse
+import collections
+import json
 import os
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
 
 from pdqhashing.hasher.pdq_hasher import PDQHasher
 from pdqhashing.types.hash256 import Hash256
 
+# Per-process hasher for --jobs mode, set up by PDQPhotoHasherTool.initWorker.
+workerHasher = None
+
 
 class PDQPhotoHasherTool:
     """Tool for computing PDQ hashes of image files (JPEG, PNG, etc.).
@@ -18,6 +25,7 @@ class PDQPhotoHasherTool:
     python tools/pdq_photo_hasher_tool.py ../media/sample_data/pdq/misc-images/b.jpg --pdq"""
 
     PROGNAME = "PDQPhotoHasherTool"
+    CORPUS_WRITE_BATCH_SIZE = 10000
 
     class Context:
         """Helper class for tracking image-to-image deltas"""
@@ -102,8 +110,81 @@ class PDQPhotoHasherTool:
             help="Continue to process next image in case of errors",
         )
 
+        parser.add_argument(
+            "--jobs",
+            dest="jobs",
+            type=int,
+            default=0,
+            help="Hash with this many worker processes (--pdq only). "
+            + "Directories among the filenames are walked recursively.",
+        )
+
+        parser.add_argument(
+            "--unordered",
+            dest="unordered",
+            action="store_true",
+            help="With --jobs, print results as they complete instead of in "
+            + "input order.",
+        )
+
+        parser.add_argument(
+            "--numpy",
+            dest="useNumpy",
+            action="store_true",
+            help="With --jobs, hash with PDQNumpyHasher (requires NumPy).",
+        )
+
+        parser.add_argument(
+            "--output-format",
+            dest="outputFormat",
+            choices=["text", "jsonl", "binary"],
+            default="text",
+            help="With --jobs: text is hash,quality,filename lines; jsonl "
+            + "adds timings; binary writes an MMapHashCorpus to --output whose "
+            + "IDs are zero-based input positions.",
+        )
+
+        parser.add_argument(
+            "--output",
+            dest="outputFilename",
+            type=str,
+            default=None,
+            help="Corpus filename for --output-format binary.",
+        )
+
         args = parser.parse_args()
 
+        if args.jobs > 0:
+            if args.filesOnStdin == bool(args.filenames):
+                parser.print_help()
+                exit(1)
+            if args.doPDQDih or not args.doPDQ:
+                sys.stderr.write(
+                    "{}: --jobs supports --pdq only\n".format(cls.PROGNAME)
+                )
+                exit(1)
+            if (args.outputFormat == "binary") != bool(args.outputFilename):
+                sys.stderr.write(
+                    "{}: --output is required with, and only with, "
+                    "--output-format binary\n".format(cls.PROGNAME)
+                )
+                exit(1)
+            if args.filesOnStdin:
+                filenames = (line.strip() for line in sys.stdin if line.strip())
+            else:
+                filenames = cls.walkFilenames(args.filenames)
+            hadError = cls.processFilesInParallel(
+                filenames,
+                args.jobs,
+                not args.unordered,
+                args.useNumpy,
+                args.outputFormat,
+                args.outputFilename,
+                args.doTimings,
+                args.keepGoingAfterErrors,
+            )
+            exit(1 if hadError else 0)
+
         pdqHasher = PDQHasher()
         context = cls.Context(0, None, False)
         # Iterate over image-file names. One file at a time, compute per-file
@@ -153,6 +234,169 @@ class PDQPhotoHasherTool:
         if context.hadError:
             exit(1)
 
+    @classmethod
+    def walkFilenames(cls, paths):
+        for path in paths:
+            if os.path.isdir(path):
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        yield os.path.join(dirpath, filename)
+            else:
+                yield path
+
+    @classmethod
+    def initWorker(cls, useNumpy):
+        global workerHasher
+        if useNumpy:
+            from pdqhashing.hasher.pdq_numpy_hasher import PDQNumpyHasher
+
+            workerHasher = PDQNumpyHasher()
+        else:
+            workerHasher = PDQHasher()
+
+    @classmethod
+    def hashFileInWorker(cls, index, filename):
+        """Returns (index, filename, hash, quality, hashingMetadata, error),
+        with hash, quality and hashingMetadata None on error."""
+        hashingMetadata = PDQHasher.HashingMetadata()
+        try:
+            hashAndQuality = workerHasher.fromFile(filename, hashingMetadata)
+        except Exception as e:
+            return (index, filename, None, None, None, str(e))
+        return (
+            index,
+            filename,
+            hashAndQuality.getHash(),
+            hashAndQuality.getQuality(),
+            hashingMetadata,
+            None,
+        )
+
+    @classmethod
+    def hashFilesInParallel(cls, filenames, jobs, ordered, useNumpy):
+        """Yields hashFileInWorker results, in input order if ordered and
+        otherwise as they complete. At most 4 files per worker are in flight,
+        so arbitrarily long inputs are streamed."""
+        maxInFlight = 4 * jobs
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=cls.initWorker, initargs=(useNumpy,)
+        ) as executor:
+            pending = collections.deque()
+            for index, filename in enumerate(filenames):
+                if len(pending) >= maxInFlight:
+                    if ordered:
+                        yield pending.popleft().result()
+                    else:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending.remove(future)
+                            yield future.result()
+                pending.append(executor.submit(cls.hashFileInWorker, index, filename))
+            if ordered:
+                while pending:
+                    yield pending.popleft().result()
+            else:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        yield future.result()
+
+    @classmethod
+    def processFilesInParallel(
+        cls,
+        filenames,
+        jobs,
+        ordered,
+        useNumpy,
+        outputFormat,
+        outputFilename,
+        doTimings,
+        keepGoingAfterErrors,
+    ):
+        """--jobs mode. Returns True if any file could not be hashed."""
+        hadError = False
+        numHashed = 0
+        numErrors = 0
+        totalReadSeconds = 0.0
+        totalHashSeconds = 0.0
+        totalPixels = 0
+        corpusPairs = []
+        if outputFormat == "binary":
+            from pdqhashing.index.mmap_corpus import MMapHashCorpus
+
+            MMapHashCorpus.write(outputFilename, [])
+        t1 = time.time()
+        for (
+            index,
+            filename,
+            hash,
+            quality,
+            hashingMetadata,
+            error,
+        ) in cls.hashFilesInParallel(filenames, jobs, ordered, useNumpy):
+            if error is not None:
+                hadError = True
+                numErrors += 1
+                sys.stderr.write(
+                    "{}: could not read image file {}, Error {}\n".format(
+                        cls.PROGNAME, filename, error
+                    )
+                )
+                if keepGoingAfterErrors:
+                    continue
+                else:
+                    exit(1)
+            numHashed += 1
+            totalReadSeconds += hashingMetadata.readSeconds
+            totalHashSeconds += hashingMetadata.hashSeconds
+            totalPixels += hashingMetadata.imageHeightTimesWidth
+            if outputFormat == "text":
+                print("{},{},{}".format(hash, quality, filename))
+            elif outputFormat == "jsonl":
+                print(
+                    json.dumps(
+                        {
+                            "index": index,
+                            "hash": str(hash),
+                            "quality": quality,
+                            "filename": filename,
+                            "dims": hashingMetadata.imageHeightTimesWidth,
+                            "readSeconds": hashingMetadata.readSeconds,
+                            "hashSeconds": hashingMetadata.hashSeconds,
+                        }
+                    )
+                )
+            else:
+                corpusPairs.append((hash, index))
+                if len(corpusPairs) >= cls.CORPUS_WRITE_BATCH_SIZE:
+                    MMapHashCorpus.write(outputFilename, corpusPairs, append=True)
+                    corpusPairs = []
+        if corpusPairs:
+            MMapHashCorpus.write(outputFilename, corpusPairs, append=True)
+        sys.stdout.flush()
+        t2 = time.time()
+
+        if doTimings:
+            wallSeconds = t2 - t1
+            sys.stderr.write(
+                "{}: files={},errors={},jobs={},wallSeconds={:.3f},"
+                "filesPerSecond={:.1f},megapixelsPerSecond={:.2f},"
+                "meanReadSeconds={:.6f},meanHashSeconds={:.6f}\n".format(
+                    cls.PROGNAME,
+                    numHashed,
+                    numErrors,
+                    jobs,
+                    wallSeconds,
+                    numHashed / wallSeconds if wallSeconds > 0 else 0.0,
+                    totalPixels / 1e6 / wallSeconds if wallSeconds > 0 else 0.0,
+                    totalReadSeconds / numHashed if numHashed else 0.0,
+                    totalHashSeconds / numHashed if numHashed else 0.0,
+                )
+            )
+        return hadError
+
     @classmethod
     def processFile(
         cls,
@@ -1,13 +1,31 @@
 #!/usr/bin/env python
 # Copyright (c) Meta Platforms, Inc. and affiliates.
 
+import string
 from random import randint
 
 from pdqhashing.types.exceptions import PDQHashFormatException
 
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+
+    def popcount(x):
+        return bin(x).count("1")
+
 
 class Hash256:
-    """256-bit hashes with Hamming distance"""
+    """256-bit hashes with Hamming distance
+
+    The hash is held as a single 256-bit Python int: bit k of the hash is bit
+    k of the integer, so word i of the classic 16x16-bit layout is bits
+    16*i..16*i+15. Hamming distances are one XOR and one popcount.
+
+    Hashes compare and hash by value, so they can be dict keys and set
+    members; do not mutate one (setBit, clearAll, ...) while it is in a dict
+    or set, or it will no longer be found there."""
+
+    __slots__ = ("value",)
 
     # 16 slots of 16 bits each.
     # See hashing/pdq/README-MIH.md in this repo for why not 8x32 or 32x8, etc.
@@ -15,35 +33,33 @@ class Hash256:
 
     HASH256_HEX_NUM_NYBBLES = 4 * HASH256_NUM_SLOTS
 
-    def __init__(self) -> None:
-        self.w = [0] * self.HASH256_NUM_SLOTS
+    HASH256_NUM_BYTES = 32
+
+    HASH256_ALL_BITS = (1 << 256) - 1
+
+    def __init__(self, value=0) -> None:
+        self.value = value
+
+    @property
+    def w(self):
+        """The 16 16-bit words, least-significant first, as a tuple: assigning
+        to a word raises TypeError. Use setBit/flipBit etc to modify the
+        hash."""
+        return tuple(
+            (self.value >> (16 * i)) & 0xFFFF for i in range(self.HASH256_NUM_SLOTS)
+        )
 
     def getNumWords(self):
         return self.HASH256_NUM_SLOTS
 
     def clone(self):
-        rv = Hash256()
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            rv.w[i] = self.w[i]
-            i += 1
-        return rv
+        return Hash256(self.value)
 
     def __str__(self):
-        i = self.HASH256_NUM_SLOTS - 1
-        result = []
-        while i >= 0:
-            result.append("{:04x}".format(self.w[i] & 0xFFFF))
-            i = i - 1
-        return "".join(result)
+        return "{:064x}".format(self.value)
 
     def __repr__(self):
-        i = self.HASH256_NUM_SLOTS - 1
-        result = []
-        while i >= 0:
-            result.append("{:04x}".format(self.w[i] & 0xFFFF))
-            i = i - 1
-        return "".join(result)
+        return self.__str__()
 
     def toHexString(self):
         return self.__str__()
@@ -52,20 +68,24 @@ class Hash256:
     def fromHexString(cls, s):
         if len(s) != cls.HASH256_HEX_NUM_NYBBLES:
             raise PDQHashFormatException("Incorrect length", s)
+        if not all(c in string.hexdigits for c in s):
+            raise PDQHashFormatException("Incorrect format", s)
+        return Hash256(int(s, 16))
 
-        rv = Hash256()
-        i = cls.HASH256_NUM_SLOTS
-        for x in range(0, len(s), 4):
-            try:
-                i -= 1
-                rv.w[i] = int(s[x : x + 4], 16)
-            except ValueError:
-                raise PDQHashFormatException("Incorrect format", s)
-        return rv
+    def toBytes(self):
+        """32 bytes, most-significant word first (same order as the hex
+        string)."""
+        return self.value.to_bytes(self.HASH256_NUM_BYTES, "big")
+
+    @classmethod
+    def fromBytes(cls, b):
+        if len(b) != cls.HASH256_NUM_BYTES:
+            raise PDQHashFormatException("Incorrect length", b)
+        return Hash256(int.from_bytes(b, "big"))
 
     @classmethod
     def hammingNorm16(cls, h):
-        return cls.bitCount((int(h)) & 0xFFFF)
+        return popcount(int(h) & 0xFFFF)
 
     @classmethod
     def bitCount(cls, x):
@@ -77,123 +97,47 @@ class Hash256:
         return x & 0x0000003F
 
     def clearAll(self):
-        for i in range(self.HASH256_NUM_SLOTS):
-            self.w[i] = 0
+        self.value = 0
 
     def setAll(self):
-        for i in range(self.HASH256_NUM_SLOTS):
-            self.w[i] = 0xFFFF
+        self.value = self.HASH256_ALL_BITS
 
     def hammingNorm(self):
-        n = 0
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            n += self.hammingNorm16(self.w[i])
-            i += 1
-        return n
+        return popcount(self.value)
 
     def hammingDistance(self, that):
-        n = 0
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            n += self.hammingNorm16(int((self.w[i] ^ that.w[i])))
-            i += 1
-        return n
+        return popcount(self.value ^ that.value)
 
     def hammingDistanceLE(self, that, d) -> bool:
-        e = 0
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            e += self.hammingNorm16(int((self.w[i] ^ that.w[i])))
-            if e > d:
-                return False
-            i += 1
-        return True
+        return popcount(self.value ^ that.value) <= d
 
     def setBit(self, k):
-        self.w[(k & 255) >> 4] |= 1 << (k & 15)
+        self.value |= 1 << (k & 255)
 
     def flipBit(self, k):
-        self.w[(k & 255) >> 4] ^= 1 << (k & 15)
+        self.value ^= 1 << (k & 255)
 
     def bitwiseXOR(self, that):
-        rv = Hash256()
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            rv.w[i] = int((self.w[i] ^ that.w[i]))
-            i += 1
-        return rv
+        return Hash256(self.value ^ that.value)
 
     def bitwiseAND(self, that):
-        rv = Hash256()
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            rv.w[i] = int((self.w[i] & that.w[i]))
-            i += 1
-        return rv
+        return Hash256(self.value & that.value)
 
     def bitwiseOR(self, that):
-        rv = Hash256()
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            rv.w[i] = int((self.w[i] | that.w[i]))
-            i += 1
-        return rv
+        return Hash256(self.value | that.value)
 
     def bitwiseNOT(self):
-        rv = Hash256()
-        i = 0
-        while i < self.HASH256_NUM_SLOTS:
-            rv.w[i] = int((~self.w[i])) & 0xFFFF
-            i += 1
-        return rv
+        return Hash256(~self.value & self.HASH256_ALL_BITS)
 
     def dumpBits(self):
-        i = self.HASH256_NUM_SLOTS - 1
-        str = []
-        while i >= 0:
-            word = self.w[i] & 0xFFFF
-            j = 15
-            bits = []
-            while j >= 0:
-                if (word & (1 << j)) != 0:
-                    bits.append("1")
-                else:
-                    bits.append("0")
-                j -= 1
-            str.append(" ".join(bits))
-            i -= 1
-        return "\n".join(str)
+        bits = self.dumpBitsFlat()
+        return "\n".join(" ".join(bits[i : i + 16]) for i in range(0, 256, 16))
 
     def dumpBitsFlat(self):
-        i = self.HASH256_NUM_SLOTS - 1
-        bits = []
-        while i >= 0:
-            word = self.w[i] & 0xFFFF
-            j = 15
-            while j >= 0:
-                if (word & (1 << j)) != 0:
-                    bits.append("1")
-                else:
-                    bits.append("0")
-                j -= 1
-            i -= 1
-        return "".join(bits)
+        return "{:0256b}".format(self.value)
 
     def dumpBitsAcross(self):
-        i = self.HASH256_NUM_SLOTS - 1
-        str = []
-        while i >= 0:
-            word = self.w[i] & 0xFFFF
-            j = 15
-            while j >= 0:
-                if (word & (1 << j)) != 0:
-                    str.append("1")
-                else:
-                    str.append("0")
-                j -= 1
-            i -= 1
-        return " ".join(str)
+        return " ".join(self.dumpBitsFlat())
 
     def dumpWords(self):
         return ",".join(str(v) for v in list(reversed(self.w)))
@@ -212,27 +156,16 @@ class Hash256:
 
     def __eq__(self, other) -> bool:
         if isinstance(other, (Hash256,)):
-            for i in range(self.HASH256_NUM_SLOTS):
-                if self.w[i] != other.w[i]:
-                    return False
-            return True
+            return self.value == other.value
         else:
             return False
 
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    # Ordering compares word 0 first, then word 1, etc.
     def __gt__(self, other) -> bool:
-        # pyre-fixme[16]: `int` has no attribute `__iter__`.
-        for i in self.HASH256_NUM_SLOTS:
-            if self.w[i] > other.w[i]:
-                return True
-            elif self.w[i] < other.w[i]:
-                return False
-        return False
+        return self.w > other.w
 
     def __lt__(self, other) -> bool:
-        # pyre-fixme[16]: `int` has no attribute `__iter__`.
-        for i in self.HASH256_NUM_SLOTS:
-            if self.w[i] < other.w[i]:
-                return True
-            elif self.w[i] > other.w[i]:
-                return False
-        return False
+        return self.w < other.w